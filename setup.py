@@ -42,6 +42,14 @@ setup(
     entry_points={
         'console_scripts': [
             'setup-gce=tortuga.scripts.setup_gce:main',
+            'gce-preemption-watcher='
+            'tortuga.scripts.gce_preemption_watcher:main',
+            'gce-sync-machine-types='
+            'tortuga.scripts.gce_sync_machine_types:main',
+            'gce-boot-telemetry='
+            'tortuga.scripts.gce_boot_telemetry:main',
+            'gce-bake-image='
+            'tortuga.scripts.gce_bake_image:main',
         ]
     }
 )
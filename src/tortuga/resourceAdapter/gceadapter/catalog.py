@@ -0,0 +1,171 @@
+# Copyright 2008-2018 Univa Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import pickle
+import tempfile
+import threading
+import time
+from typing import Dict, Iterable, NamedTuple, Optional
+
+
+#: Name of machine type catalog file (in the Tortuga 'var' directory)
+CATALOG_FILENAME = 'gce-machine-types.pickle'
+
+CATALOG_VERSION = 1
+
+
+class MachineType(NamedTuple):
+    vcpus: int
+    memory_mb: int
+    gpus: int
+
+
+def parse_machine_types(responses: Iterable[dict]) -> Dict[str, MachineType]:
+    """Return machine types from machineTypes().aggregatedList() responses
+
+    Machine types are listed once per zone; zones offering the same
+    machine type report the same shape.
+    """
+
+    result = {}
+
+    for response in responses:
+        for scoped_list in response.get('items', {}).values():
+            for machine_type in scoped_list.get('machineTypes', []):
+                result[machine_type['name']] = MachineType(
+                    vcpus=machine_type['guestCpus'],
+                    memory_mb=machine_type.get('memoryMb', 0),
+                    gpus=sum(
+                        accelerator.get('guestAcceleratorCount', 0)
+                        for accelerator in
+                        machine_type.get('accelerators', [])
+                    ),
+                )
+
+    return result
+
+
+def list_machine_types(svc, project: str) -> Iterable[dict]:
+    """Yield machineTypes().aggregatedList() response pages"""
+
+    request = svc.machineTypes().aggregatedList(project=project)
+
+    while request is not None:
+        response = request.execute()
+
+        yield response
+
+        request = svc.machineTypes().aggregatedList_next(
+            previous_request=request, previous_response=response)
+
+
+class MachineTypeCatalog:
+    """
+    Local cache of the machine types offered by Compute Engine.
+
+    The catalog is a pickled dict written by sync(). It is loaded once and
+    loaded again only after the file has been replaced.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+        self._lock = threading.Lock()
+        self._mtime: Optional[float] = None
+        self._data: Optional[dict] = None
+
+    def _load(self) -> Optional[dict]:
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return None
+
+        with self._lock:
+            if self._mtime == mtime:
+                return self._data
+
+        try:
+            with open(self.path, 'rb') as fp:
+                data = pickle.load(fp)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+
+        if data.get('version') != CATALOG_VERSION:
+            return None
+
+        with self._lock:
+            self._mtime = mtime
+            self._data = data
+
+        return data
+
+    @property
+    def synced_at(self) -> Optional[float]:
+        data = self._load()
+
+        return data['synced_at'] if data else None
+
+    def get(self, name: str) -> Optional[MachineType]:
+        data = self._load()
+        if not data:
+            return None
+
+        value = data['machine_types'].get(name)
+
+        return MachineType(*value) if value else None
+
+    def get_vcpus(self, name: str) -> Optional[int]:
+        machine_type = self.get(name)
+
+        return machine_type.vcpus if machine_type else None
+
+    def save(self, project: str,
+             machine_types: Dict[str, MachineType]) -> None:
+        """Replace catalog file atomically"""
+
+        data = {
+            'version': CATALOG_VERSION,
+            'project': project,
+            'synced_at': time.time(),
+            # plain tuples keep the file independent of this module
+            'machine_types': {
+                name: tuple(value) for name, value in machine_types.items()
+            },
+        }
+
+        dirname = os.path.dirname(self.path) or '.'
+
+        fd, tmpname = tempfile.mkstemp(dir=dirname, prefix='.catalog-')
+
+        try:
+            with os.fdopen(fd, 'wb') as fp:
+                pickle.dump(data, fp, protocol=pickle.HIGHEST_PROTOCOL)
+
+            os.chmod(tmpname, 0o644)
+
+            os.rename(tmpname, self.path)
+        except Exception:
+            os.unlink(tmpname)
+
+            raise
+
+    def sync(self, svc, project: str) -> Dict[str, MachineType]:
+        """Fetch machine types from Compute Engine and save catalog"""
+
+        machine_types = parse_machine_types(list_machine_types(svc, project))
+
+        self.save(project, machine_types)
+
+        return machine_types
@@ -12,21 +12,20 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import copy
+import hashlib
 import json
+import math
 import os.path
 import random
-import subprocess
+import threading
 import time
 import traceback
 import urllib.parse
-from typing import Any, Dict, List, NoReturn, Optional, Tuple
-
-import apiclient
-import gevent
-import googleapiclient.discovery
-from gevent.queue import JoinableQueue
-from google.auth import compute_engine
-from google.oauth2 import service_account
+from typing import (Any, Callable, Dict, List, NoReturn, Optional, Set,
+                    Tuple)
+
+from sqlalchemy.orm import joinedload
 from sqlalchemy.orm.exc import NoResultFound
 from sqlalchemy.orm.session import Session
 
@@ -38,24 +37,59 @@ from tortuga.db.models.nic import Nic
 from tortuga.db.models.node import Node
 from tortuga.db.models.nodeTag import NodeTag
 from tortuga.db.models.softwareProfile import SoftwareProfile
-from tortuga.db.nodesDbHandler import NodesDbHandler
 from tortuga.exceptions.commandFailed import CommandFailed
 from tortuga.exceptions.configurationError import ConfigurationError
 from tortuga.exceptions.invalidArgument import InvalidArgument
-from tortuga.exceptions.nodeNotFound import NodeNotFound
 from tortuga.exceptions.operationFailed import OperationFailed
+from tortuga.exceptions.resourceNotFound import ResourceNotFound
 from tortuga.exceptions.unsupportedOperation import UnsupportedOperation
 from tortuga.node import state
 from tortuga.resourceAdapter.resourceAdapter \
     import (DEFAULT_CONFIGURATION_PROFILE_NAME, ResourceAdapter)
 from tortuga.resourceAdapter.utility import patch_managed_tags
 from tortuga.utility.cloudinit import get_cloud_init_path
+from .catalog import CATALOG_FILENAME, MachineTypeCatalog
+from .hostfacts import is_running_on_gce
+from .lazy_import import LazyModule
+from .machine_types import (get_instance_sizes, get_machine_type_vcpus,
+                            parse_custom_machine_type)
+from .naming import (LIKE_ESCAPE, NameReservations, allocate_node_names,
+                     escape_like, get_name_index, parse_name_format)
+from .operations import (FetchFunction, OperationCache, fetch_operation,
+                         make_operation_handle, parse_operation_handle)
+from .placement import ZonePlacementEngine, is_zone_capacity_error
+from .preemption import PREEMPTED_KEY
+from .registration import AdmissionController, MicroBatcher
+from .scale_sets import (LOCATIONS_FILENAME, TEMPLATES_LOCK_FILENAME,
+                         ScaleSetLocation, ScaleSetLocationStore, file_lock,
+                         find_scale_set_location, get_igm_api)
 from .settings import DEFAULT_SLEEP_TIME, SETTINGS
+from .telemetry import (BAKE_STATUS_KEY, GUEST_ATTRIBUTE_NAMESPACE,
+                        get_guest_attribute)
+
+# Google API client libraries and gevent are imported on first use; they
+# are slow to import and not needed by most users of this module
+apiclient = LazyModule('apiclient')
+gevent = LazyModule('gevent')
+googleapiclient = LazyModule('googleapiclient')
 
 API_VERSION = 'v1'
 
 GCE_URL = 'https://www.googleapis.com/compute/%s/projects/' % (API_VERSION)
 
+# Regional managed instance group distribution policy target shapes
+SCALE_SET_TARGET_SHAPES = ('EVEN', 'BALANCED', 'ANY', 'ANY_SINGLE_ZONE')
+
+# Seconds a resolved configuration profile is used without accessing the
+# database; bounds how long changes made by other processes go unnoticed
+CONFIG_CACHE_TTL = 10
+
+# Seconds the number of vcpus of a node is cached
+NODE_VCPUS_TTL = 300
+
+# Prefix of content-addressed instance templates shared by scale sets
+SHARED_INSTANCE_TEMPLATE_PREFIX = 'tortuga-tmpl-'
+
 EXTERNAL_NETWORK_ACCESS_CONFIG = [
     {
         'type': 'ONE_TO_ONE_NAT',
@@ -68,6 +102,130 @@ def get_instance_name_from_host_name(hostname):
     return hostname.split('.', 1)[0]
 
 
+def get_shared_instance_template_name(properties: dict,
+                                      insertnode_request: dict,
+                                      encryption_key: Any) -> str:
+    """
+    Return name of content-addressed instance template
+
+    The name is derived from a hash of the template properties. The
+    encrypted insertnode request embedded in the startup script differs
+    on every call, so the plaintext request (and the key it is encrypted
+    with) is hashed instead.
+    """
+
+    hashed = copy.deepcopy(properties)
+
+    for item in hashed.get('metadata', {}).get('items', []):
+        if item['key'] == 'startup-script':
+            item['value'] = '\n'.join(
+                line for line in item['value'].splitlines()
+                if not line.startswith('insertnode_request = ')
+            )
+
+    hashed['insertnode_request'] = insertnode_request
+    hashed['encryption_key'] = hashlib.sha256(
+        encryption_key if isinstance(encryption_key, bytes)
+        else str(encryption_key).encode()).hexdigest()
+
+    digest = hashlib.sha256(
+        json.dumps(hashed, sort_keys=True).encode()).hexdigest()
+
+    return '{}{}'.format(SHARED_INSTANCE_TEMPLATE_PREFIX, digest[:32])
+
+
+def is_shared_instance_template(name: str) -> bool:
+    return name.startswith(SHARED_INSTANCE_TEMPLATE_PREFIX)
+
+
+def is_instance_template_not_found(ex: Exception, name: str) -> bool:
+    """Return True if API error is caused by missing instance template"""
+
+    resp = getattr(ex, 'resp', None)
+    if resp is None or resp.status not in (400, 404):
+        return False
+
+    content = getattr(ex, 'content', b'') or b''
+    if isinstance(content, bytes):
+        content = content.decode('utf-8', 'replace')
+
+    return 'instanceTemplates/{}'.format(name) in content
+
+
+def get_config_fingerprint(config: Dict[str, Any]) -> str:
+    """Return hash of (unresolved) resource adapter configuration"""
+
+    return hashlib.sha256(
+        json.dumps(config, sort_keys=True, default=str).encode()
+    ).hexdigest()
+
+
+def get_min_launch_success(count: int,
+                           min_launch_success: Optional[int]) -> int:
+    """Return minimum number of nodes that must launch in best-effort mode
+
+    'min_launch_success' is a percentage of the requested node count. At
+    least one node must launch.
+    """
+
+    if min_launch_success is None:
+        min_launch_success = 0
+
+    return max(1, math.ceil(count * min_launch_success / 100))
+
+
+def is_extra_arg_set(extra_args: Optional[Dict[str, Any]],
+                     name: str) -> bool:
+    """Return True if boolean extra argument is set
+
+    Arguments given without a value (for example, '--extra-arg
+    best_effort') are set; values are parsed as booleans.
+    """
+
+    if not extra_args or name not in extra_args:
+        return False
+
+    value = extra_args[name]
+
+    if value is None or isinstance(value, bool):
+        return value is not False
+
+    return str(value).strip().lower() in ('', '1', 'true', 'yes', 'on')
+
+
+def get_preemptible_count(count: int, preemptible: bool,
+                          preemptible_fraction: Optional[int]) -> int:
+    """Return number of nodes to be launched as preemptible
+
+    'preemptible_fraction' is a percentage of the requested node count;
+    all nodes are preemptible if it is not set.
+    """
+
+    if not preemptible:
+        return 0
+
+    if preemptible_fraction is None:
+        return count
+
+    return min(count, math.ceil(count * preemptible_fraction / 100))
+
+
+def load_nodes(dbSession: Session, node_ids: List[int]) -> List[Node]:
+    """Load nodes (i.e. expired by a commit) in one query"""
+
+    if not node_ids:
+        return []
+
+    return dbSession.query(Node).filter(
+        Node.id.in_(node_ids)
+    ).options(
+        joinedload(Node.hardwareprofile),
+        joinedload(Node.softwareprofile),
+        joinedload(Node.nics),
+        joinedload(Node.instance),
+    ).populate_existing().all()
+
+
 def get_disk_volume_name(instance_name, diskNumber):
     """Return persistent volume name based on instance name and disk number
     """
@@ -82,11 +240,54 @@ class Gce(ResourceAdapter): \
 
     settings = SETTINGS
 
+    # operations started by non-blocking cloudserveraction_* calls; shared
+    # by all adapter instances in this process
+    _operation_cache = OperationCache()
+
+    # zone placement for VM launches; success rates are shared by all
+    # adapter instances in this process
+    _placement = ZonePlacementEngine()
+
+    # (project, name) of shared instance templates known to exist; other
+    # processes may delete them, see create_scale_set()
+    _known_instance_templates: Set[Tuple[str, str]] = set()
+
+    # bumped when configuration profiles are updated in this process;
+    # cached profiles resolved before are reloaded, see get_config()
+    _config_generation = 0
+
+    # combines VM lookups and label updates of concurrently registering
+    # (scale set) VMs into batched API calls
+    _registration_batcher = MicroBatcher()
+
+    # bounds concurrently processed registrations of (scale set) VMs
+    _admission = AdmissionController()
+
+    # node name -> (vcpus, time loaded); entries are dropped when nodes
+    # are added or deleted by this process, after NODE_VCPUS_TTL seconds
+    # (nodes added or deleted by other processes) and when the machine
+    # type catalog has been synced
+    _node_vcpus: Dict[str, Tuple[int, float]] = {}
+    _node_vcpus_synced_at: Optional[float] = None
+    _node_vcpus_lock = threading.Lock()
+
+    # node names allocated by this process, until committed
+    _node_name_reservations = NameReservations()
+
+    # machine type catalogs by path; loaded once per process
+    _catalogs: Dict[str, MachineTypeCatalog] = {}
+
     def __init__(self, addHostSession: Optional[str] = None):
         super().__init__(addHostSession=addHostSession)
 
         self.__running_on_gce: Optional[bool] = None
 
+        # profile name -> resolved configuration; see get_config()
+        self.__config_cache: Dict[Optional[str], dict] = {}
+
+        # (project, region, networks) -> network interface definitions
+        self.__network_interfaces_cache: Dict[tuple, list] = {}
+
     @property
     def is_running_on_gce(self) -> bool:
         if self.__running_on_gce is None:
@@ -118,18 +319,40 @@ class Gce(ResourceAdapter): \
 
         if 'nodeDetails' in addNodesRequest and \
             addNodesRequest['nodeDetails']:
+            self.__invalidate_node_vcpus(
+                [node_detail['name']
+                 for node_detail in addNodesRequest['nodeDetails']
+                 if 'name' in node_detail])
+
             # Instances already exist, create node records
             if 'metadata' in addNodesRequest['nodeDetails'][0] and \
                     'instance_name' in \
                     addNodesRequest['nodeDetails'][0]['metadata']:
-                # inserting nodes based on metadata
-                node = self.__insert_node(gce_session, dbSession,
-                           dbHardwareProfile, dbSoftwareProfile,
-                           addNodesRequest['nodeDetails'][0],
-                           addNodesRequest.get('resource_adapter_configuration')
+                # inserting nodes based on metadata; registrations
+                # beyond the concurrency limit are rejected with a retry
+                # delay (RegistrationThrottled) without holding up the
+                # web service worker
+                queue_timeout = gce_session['config'].get(
+                    'registration_queue_timeout_ms')
+
+                self._admission.configure(
+                    max_concurrent=gce_session['config'].get(
+                        'registration_concurrency'),
+                    max_wait=queue_timeout / 1000.0
+                    if queue_timeout is not None else None,
                 )
 
-                dbSession.commit()
+                with self._admission.admit():
+                    node = self.__insert_node(gce_session, dbSession,
+                               dbHardwareProfile, dbSoftwareProfile,
+                               addNodesRequest['nodeDetails'][0],
+                               addNodesRequest.get('resource_adapter_configuration')
+                    )
+
+                    # each registration is a separate web service request
+                    # with its own database session; GCE calls are
+                    # batched across registrations, the commit is not
+                    dbSession.commit()
 
                 return [node]
 
@@ -146,6 +369,8 @@ class Gce(ResourceAdapter): \
         # a proper context manager implemented.
         self.addHostApi.clear_session_nodes(nodes)
 
+        self.__invalidate_node_vcpus([node.name for node in nodes])
+
         result.extend(nodes)
 
         return result
@@ -179,6 +404,8 @@ class Gce(ResourceAdapter): \
             CommandFailed
         """
 
+        self.__invalidate_node_vcpus([node.name for node in nodes])
+
         # Iterate over list of Node database objects
         for node in nodes:
             self._logger.debug('deleteNode(): node=[%s]', node.name)
@@ -304,7 +531,7 @@ class Gce(ResourceAdapter): \
                 gce_session['config']['zone']
             )
 
-    def __gce_stop_vm(self, svc: googleapiclient.discovery.Resource,
+    def __gce_stop_vm(self, svc: 'googleapiclient.discovery.Resource',
                       vm_name: str, project: str, zone: str): \
             # pylint: disable=no-self-use
         svc.instances().stop(
@@ -318,7 +545,7 @@ class Gce(ResourceAdapter): \
         try:
             return session.query(InstanceMapping).filter(
                 InstanceMapping.instance==instance_name  # noqa
-            ).one().node
+            ).options(joinedload(InstanceMapping.node)).one().node
         except NoResultFound:
             pass
 
@@ -353,12 +580,19 @@ class Gce(ResourceAdapter): \
 
             return None
 
-        instance = self.gce_get_vm(session, instance_name)
+        # VMs of regional scale sets run in any zone of the region; the
+        # startup script reports the zone of the VM
+        zone = nodeDetail['metadata'].get('zone') or \
+            session['config']['zone']
+
+        instance = self.__get_vm_batched(session, instance_name, zone)
+        if not instance:
+            instance = self.__find_vm(session, instance_name)
 
         if not instance:
             self._logger.warning(
                 'Error inserting node [%s]. GCP instance [%s] does not exist',
-                instance_name,
+                nodeDetail['name'], instance_name,
             )
 
             return None
@@ -420,11 +654,22 @@ class Gce(ResourceAdapter): \
             internal_ip,
         )
 
-        self.__set_tortuga_name(session, instance)
+        self.__set_tortuga_name_batched(session, instance)
 
 
+        # zone is required to stop/delete VMs outside the configured zone
         node.instance = InstanceMapping(
             instance=instance_name,
+            instance_metadata=[
+                InstanceMetadata(
+                    key='zone',
+                    value=os.path.basename(instance['zone'])
+                ),
+                InstanceMetadata(
+                    key='project',
+                    value=session['config']['project']
+                ),
+            ],
             resource_adapter_configuration=self.load_resource_adapter_config(
                 dbSession,
                 resourceAdapter
@@ -469,6 +714,15 @@ class Gce(ResourceAdapter): \
                 gce_session['config']['zone']
             )
 
+            if node.instance is not None:
+                # restarted after being preempted; marked again if
+                # preempted again (see PreemptionWatcher)
+                for md in [md for md in node.instance.instance_metadata
+                           if md.key == PREEMPTED_KEY]:
+                    node.instance.instance_metadata.remove(md)
+
+                    self.session.delete(md)
+
     def __gce_start_vm(self, svc, vm_name, project, zone): \
             # pylint: disable=no-self-use
         svc.instances().start(
@@ -477,6 +731,54 @@ class Gce(ResourceAdapter): \
             zone=zone,
         ).execute()
 
+    def get_config(self, profile: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Return resolved resource adapter configuration profile
+
+        Resolved profiles are cached. For CONFIG_CACHE_TTL seconds a cached
+        profile is returned without accessing the database or resolving
+        it again, unless invalidate_config_cache() has been called since.
+        After that, the stored profile is loaded and resolved again only
+        if it has changed (by fingerprint). Callers receive a copy and may
+        modify it.
+
+        :raises ConfigurationError:
+        :raises ResourceNotFound:
+        """
+
+        now = time.monotonic()
+
+        generation = Gce._config_generation
+
+        entry = self.__config_cache.get(profile)
+
+        if entry is None or entry['expires'] <= now or \
+                entry['generation'] != generation:
+            fingerprint = get_config_fingerprint(
+                self._load_config_from_database(profile))
+
+            if entry is None or entry['fingerprint'] != fingerprint:
+                entry = {
+                    'config': super().get_config(profile),
+                    'fingerprint': fingerprint,
+                    'version': entry['version'] + 1 if entry else 1,
+                }
+
+                self.__config_cache[profile] = entry
+
+            entry['expires'] = now + CONFIG_CACHE_TTL
+            entry['generation'] = generation
+
+        return copy.deepcopy(entry['config'])
+
+    @classmethod
+    def invalidate_config_cache(cls) -> None:
+        """Have all adapter instances in this process check their cached
+        configuration profiles on next use; call after updating a profile
+        """
+
+        cls._config_generation += 1
+
     def process_config(self, config: Dict[str, Any]) -> None:
         #
         # Sanity check scopes
@@ -503,6 +805,20 @@ class Gce(ResourceAdapter): \
                     config['region'])
             )
 
+        # candidate zones for compute nodes; all must be in the same region
+        # as the network configuration is regional
+        config['zones'] = config.get('zones') or [config['zone']]
+
+        for zone in config['zones']:
+            if not zone.startswith(config['region'] + '-'):
+                raise ConfigurationError(
+                    'Zone [{}] is not in region [{}]'.format(
+                        zone, config['region'])
+                )
+
+        if config.get('scale_set_regional'):
+            self.__process_scale_set_zones(config)
+
         if 'network' in config:
             network_defs = config['network']
 
@@ -518,6 +834,33 @@ class Gce(ResourceAdapter): \
         # convert networks definition into list of tuples
         config['networks'] = self.__parse_network_adapter_config(network_defs)
 
+    def __process_scale_set_zones(self, config: Dict[str, Any]) -> None: \
+            # pylint: disable=no-self-use
+        """
+        Validate regional scale set settings
+
+        :raises ConfigurationError:
+        """
+        zones = config.get('scale_set_zones') or []
+
+        for zone in zones:
+            if not zone.startswith(config['region'] + '-'):
+                raise ConfigurationError(
+                    'Scale set zone [{}] is not in region [{}]'.format(
+                        zone, config['region'])
+                )
+
+        config['scale_set_zones'] = zones
+
+        target_shape = config.get('scale_set_target_shape') or 'EVEN'
+        if target_shape.upper() not in SCALE_SET_TARGET_SHAPES:
+            raise ConfigurationError(
+                'Invalid scale set target shape [{}]; must be one of'
+                ' {}'.format(target_shape, ', '.join(SCALE_SET_TARGET_SHAPES))
+            )
+
+        config['scale_set_target_shape'] = target_shape.upper()
+
     def _validate_scopes(self, scopes: List[str]) -> None:
         for url in scopes:
             url_result = urllib.parse.urlparse(url)
@@ -553,7 +896,8 @@ class Gce(ResourceAdapter): \
         }
 
     def generate_startup_script(self, configDict: dict,
-                                insertnode_request: Optional[bytes] = None) \
+                                insertnode_request: Optional[bytes] = None,
+                                bake_image: bool = False) \
             -> Optional[str]:
         """
         Build a node/instance-specific startup script that will initialize
@@ -561,6 +905,8 @@ class Gce(ResourceAdapter): \
 
         :param configDict: resource adapter configuration settings
         :param insertnode_request: encrypted insertnode_request, optional
+        :param bake_image: prepare VM for image creation instead of
+                           bootstrapping it (see bake_image())
 
         :return: full startup script as a `str`, or `None` if template
                  not found
@@ -596,6 +942,7 @@ class Gce(ResourceAdapter): \
             if configDict.get('dns_options') else None,
             'dns_nameservers': _get_encoded_list(
                 configDict['dns_nameservers']),
+            'bake_image': str(bake_image),
         }
 
         with open(templateFileName) as fp:
@@ -613,6 +960,9 @@ override_dns_domain = %(override_dns_domain)s
 dns_options = %(dns_options)s
 dns_search = %(dns_domain)s
 dns_nameservers = %(dns_nameservers)s
+
+# Image baking
+bake_image = %(bake_image)s
 ''' % (config)
                     if insertnode_request is not None:
                         result += '''\
@@ -680,18 +1030,72 @@ insertnode_request = None
         return [
             self.__init_new_node(
                 session,
-                self.__generate_node_name(
-                    session, dbSession, dbHardwareProfile
-                ),
+                node_name,
                 dbHardwareProfile,
                 dbSoftwareProfile,
                 metadata={
                     'vcpus': vcpus,
                     'tags': tags,
                 },
-            ) for _ in range(count)
+            ) for node_name in self.__generate_node_names(
+                session, dbSession, dbHardwareProfile, count)
         ]
 
+    def __generate_node_names(self, session: dict, dbSession: Session,
+                              hardwareprofile: HardwareProfile,
+                              count: int) -> List[str]:
+        """Return 'count' unique node names
+
+        The first name is generated by addHostApi; further names continue
+        from its index, skipping names in use, so the result matches
+        generating names one at a time without a database round trip per
+        node. Name formats without a '#N' token are handled by addHostApi.
+
+        Names are reserved until committed (see __addActiveNodes()), so
+        concurrent requests in this process do not allocate the same names.
+        """
+
+        name_format = parse_name_format(hardwareprofile.nameFormat)
+        if name_format is None:
+            return [
+                self.__generate_node_name(session, dbSession, hardwareprofile)
+                for _ in range(count)
+            ]
+
+        reservations = self._node_name_reservations
+
+        with reservations.lock:
+            existing = [
+                name for name, in dbSession.query(Node.name).filter(
+                    Node.name.like(escape_like(name_format.prefix) + '%',
+                                   escape=LIKE_ESCAPE))
+            ] + reservations.names()
+
+            first = self.__generate_node_name(
+                session, dbSession, hardwareprofile)
+
+            names = allocate_node_names(
+                name_format, count, existing,
+                start=get_name_index(name_format, first.split('.', 1)[0]),
+                randomize=session['config']['randomize_hostname'],
+                domain=self.__get_node_name_domain(session)
+            )
+
+            reservations.reserve(names)
+
+        return names
+
+    def __get_node_name_domain(self, session: dict) -> Optional[str]:
+        """Return DNS domain of generated node names, if any"""
+
+        if session['config']['override_dns_domain']:
+            return self.private_dns_zone
+
+        if '.' in self.installer_public_hostname:
+            return self.installer_public_hostname.split('.', 1)[1]
+
+        return None
+
     def __generate_node_name(self, session: dict, dbSession: Session,
                              hardwareprofile: HardwareProfile) -> str:
         fqdn = self.addHostApi.generate_node_name(
@@ -788,6 +1192,13 @@ insertnode_request = None
                            node_requests: List[dict],
                            addNodesRequest: dict):
         """Launch Google Compute Engine instance for each node request
+
+        Instances are spread over the candidate zones ('zones' setting) by
+        the placement engine. Launches failing because a zone is out of
+        capacity are retried in the remaining zones.
+
+        Node request 'status' is set to 'success' or 'error' for each
+        instance that was launched.
         """
 
         self._logger.debug('__launch_instances()')
@@ -806,28 +1217,88 @@ insertnode_request = None
             )
         )
 
-        for node_request in node_requests:
-            node_request['instance_name'] = get_instance_name_from_host_name(
-                node_request['node'].name)
+        zones = self._placement.plan(
+            session['config']['zones'], len(node_requests))
 
-            try:
-                metadata = self.__get_instance_metadata(session, node_request)
-            except Exception:
-                self._logger.exception(
-                    'Error getting metadata for instance [%s] (%s)',
-                    node_request['instance_name'],
-                    node_request['node'].name
-                    )
+        # mixed capacity: only the first 'preemptible_fraction' percent of
+        # the nodes are launched as preemptible
+        preemptible_count = get_preemptible_count(
+            len(node_requests),
+            common_launch_args.get('preemptible', False),
+            session['config'].get('preemptible_fraction')
+        )
 
-                raise
+        for idx, (node_request, zone) in \
+                enumerate(zip(node_requests, zones)):
+            node_request['zone'] = zone
+            node_request['attempted_zones'] = []
+            node_request['preemptible'] = idx < preemptible_count
+
+        # resource adapter configuration is the same for all nodes in the
+        # request; load it once
+        adapter_cfg = self.load_resource_adapter_config(
+            dbSession,
+            addNodesRequest.get('resource_adapter_configuration')
+        )
+
+        pending_node_requests = node_requests
+
+        while pending_node_requests:
+            for node_request in pending_node_requests:
+                self.__launch_node_request(
+                    session, node_request, common_launch_args, adapter_cfg)
+
+            # Wait for instances to launch
+            self.__wait_for_instances(session, pending_node_requests)
+
+            pending_node_requests = self.__get_retry_node_requests(
+                session, pending_node_requests)
+
+    def __launch_node_request(self, session: dict, node_request: dict,
+                              common_launch_args: Dict[str, Any],
+                              adapter_cfg: Any) -> None:
+        """Launch instance for node request in node_request['zone']
+
+        The instance mapping is attached to the node; it is inserted along
+        with the mappings of all other nodes when the request is committed.
+        """
+
+        zone_session = self.__get_session_for_zone(
+            session, node_request['zone'])
+
+        node_request['session'] = zone_session
+        node_request['attempted_zones'].append(node_request['zone'])
+
+        node_request['instance_name'] = get_instance_name_from_host_name(
+            node_request['node'].name)
 
-            # Start the Compute Engine instance here
+        try:
+            metadata = self.__get_instance_metadata(
+                zone_session, node_request)
+        except Exception:
+            self._logger.exception(
+                'Error getting metadata for instance [%s] (%s)',
+                node_request['instance_name'],
+                node_request['node'].name
+                )
+
+            raise
+
+        # Start the Compute Engine instance here
 
+        if 'persistent_disks' in node_request:
+            # relaunch; disk changes have already been processed
+            persistent_disks = node_request['persistent_disks']
+        else:
             #
             # Persistent disks must be created before the instances
             #
             persistent_disks = self.__process_added_disk_changes(
-                session, node_request)
+                zone_session, node_request)
+
+            # data disks are zonal; the instance cannot be moved to another
+            # zone once they have been created
+            node_request['zonal_disks'] = len(persistent_disks) > 1
 
             #
             # 'disksize' setting is ignored if disks/partitions are defined
@@ -838,60 +1309,178 @@ insertnode_request = None
                     'sizeGb': session['config']['disksize'],
                 })
 
-            #
-            # Now create the instances...
-            #
-            try:
-                node_request['response'] = self.__launch_instance(
-                    session,
-                    node_request['instance_name'],
-                    metadata,
-                    common_launch_args,
-                    persistent_disks=persistent_disks
+            node_request['persistent_disks'] = persistent_disks
+
+        #
+        # Now create the instances...
+        #
+        launch_args = dict(
+            common_launch_args, preemptible=node_request['preemptible'])
+
+        try:
+            node_request['response'] = self.__launch_instance(
+                zone_session,
+                node_request['instance_name'],
+                metadata,
+                launch_args,
+                persistent_disks=persistent_disks
+            )
+
+        except Exception:
+            self._logger.error(
+                'Error launching instance [%s]',
+                node_request['instance_name']
                 )
 
-            except Exception:
-                self._logger.error(
-                    'Error launching instance [%s]',
-                    node_request['instance_name']
-                    )
+            raise
 
-                raise
+        zone = node_request['response']['zone'].split('/')[-1]
 
-            instance_metadata = [
-                InstanceMetadata(
-                    key='zone',
-                    value=node_request['response']['zone'].split('/')[-1]
-                ),
-                InstanceMetadata(
-                    key='project',
-                    value=session['config']['project']
-                ),
-            ]
+        # store metadata indicating whether vm was launched as preemptible
+        scheduling = 'preemptible' if node_request['preemptible'] \
+            else 'standard'
 
-            if common_launch_args.get('preemptible', False):
-                # store metadata indicating vm was launched as preemptible
-                instance_metadata.append(
-                    InstanceMetadata(
-                        key='gcp:scheduling',
-                        value='preemptible'
-                    )
+        if node_request['node'].instance is not None:
+            # relaunch in another zone or with standard scheduling; update
+            # existing mapping
+            for md in node_request['node'].instance.instance_metadata:
+                if md.key == 'zone':
+                    md.value = zone
+                elif md.key == 'gcp:scheduling':
+                    md.value = scheduling
+
+            return
+
+        instance_metadata = [
+            InstanceMetadata(
+                key='zone',
+                value=zone
+            ),
+            InstanceMetadata(
+                key='project',
+                value=session['config']['project']
+            ),
+            InstanceMetadata(
+                key='gcp:scheduling',
+                value=scheduling
+            ),
+        ]
+
+        # Update persistent mapping of node -> instance
+        node_request['node'].instance = InstanceMapping(
+            instance=node_request['instance_name'],
+            instance_metadata=instance_metadata,
+            resource_adapter_configuration=adapter_cfg
+        )
+
+    def __get_retry_node_requests(self, session: dict,
+                                  node_requests: List[dict]) -> List[dict]:
+        """
+        Return failed node requests to be relaunched. Launches that failed
+        due to lack of zone capacity are retried in another zone, unless
+        zonal data disks have been created for them. Failed preemptible
+        launches fall back to standard scheduling once all zones have been
+        tried, if 'preemptible_fallback' is enabled.
+
+        Instances of relaunched requests are deleted first, as instance
+        names are derived from node names.
+        """
+
+        retry_node_requests = []
+
+        for node_request in node_requests:
+            if node_request['status'] != 'error':
+                continue
+
+            zone = None
+
+            if is_zone_capacity_error(node_request.get('result')) and \
+                    not node_request.get('zonal_disks'):
+                zone = self._placement.next_zone(
+                    session['config']['zones'],
+                    exclude=node_request['attempted_zones']
                 )
 
-            adapter_cfg = self.load_resource_adapter_config(
-                dbSession,
-                addNodesRequest.get('resource_adapter_configuration')
-            )
+            if zone is not None:
+                self._logger.info(
+                    'Zone [%s] out of capacity; relaunching instance [%s]'
+                    ' in zone [%s]', node_request['zone'],
+                    node_request['instance_name'], zone
+                )
+            elif node_request['preemptible'] and \
+                    session['config'].get('preemptible_fallback', False):
+                # data disks pin the instance to its zone
+                zone = None if node_request.get('zonal_disks') else \
+                    self._placement.next_zone(session['config']['zones'])
+
+                if zone is None:
+                    zone = node_request['zone']
+
+                self._logger.info(
+                    'Preemptible launch failed; relaunching instance [%s]'
+                    ' as standard VM in zone [%s]',
+                    node_request['instance_name'], zone
+                )
 
-            # Update persistent mapping of node -> instance
-            node_request['node'].instance = InstanceMapping(
-                instance=node_request['instance_name'],
-                instance_metadata=instance_metadata,
-                resource_adapter_configuration=adapter_cfg
-            )
+                node_request['preemptible'] = False
+                node_request['attempted_zones'] = []
+            else:
+                continue
+
+            node_request['zone'] = zone
+            node_request['status'] = 'pending'
+
+            retry_node_requests.append(node_request)
+
+        self.__delete_failed_instances(retry_node_requests)
+
+        for node_request in retry_node_requests:
+            for key in ('response', 'result', 'message'):
+                node_request.pop(key, None)
+
+        return retry_node_requests
+
+    def __delete_failed_instances(self, node_requests: List[dict]) -> None:
+        """Delete instances (partially) created by failed launches and
+        wait for the deletes to complete
+        """
 
-        # Wait for instances to launch
-        self.__wait_for_instances(session, node_requests)
+        operations = []
+
+        for node_request in node_requests:
+            zone_session = node_request['session']
+
+            try:
+                response = zone_session['connection'].svc.instances().delete(
+                    project=zone_session['config']['project'],
+                    zone=zone_session['config']['zone'],
+                    instance=node_request['instance_name'],
+                ).execute()
+
+                operations.append((zone_session, response))
+            except apiclient.errors.HttpError as ex:
+                # not created at all
+                if ex.resp.status != 404:
+                    raise
+
+        for zone_session, response in operations:
+            _blocking_call(
+                zone_session['connection'].svc,
+                zone_session['config']['project'],
+                response,
+                polling_interval=zone_session['config']['sleeptime'])
+
+    def __get_session_for_zone(self, session: dict, zone: str) -> dict: \
+            # pylint: disable=no-self-use
+        """Return copy of GCE session with config['zone'] set to zone"""
+
+        if zone == session['config']['zone']:
+            return session
+
+        zone_session = dict(session)
+        zone_session['config'] = dict(session['config'], zone=zone)
+
+        return zone_session
 
     def __get_common_launch_args(
             self, session: dict, *,
@@ -1023,8 +1612,20 @@ insertnode_request = None
             node_request['message'] = message
 
     def __wait_for_instance(self, session: dict, pending_node_request: dict):
+        # use session for the zone the instance was launched in
+        session = pending_node_request.get('session', session)
+
         try:
-            if gevent_wait_for_instance(session, pending_node_request):
+            launched = gevent_wait_for_instance(session, pending_node_request)
+
+            self._placement.record(
+                session['config']['zone'],
+                launched,
+                capacity_error=is_zone_capacity_error(
+                    pending_node_request.get('result'))
+            )
+
+            if launched:
                 # VM launched successfully
                 try:
                     self.__instance_post_launch(session, pending_node_request)
@@ -1076,7 +1677,8 @@ insertnode_request = None
                 message=str(exc)
             )
 
-    def wait_worker(self, session: dict, queue: JoinableQueue) -> NoReturn:
+    def wait_worker(self, session: dict,
+                    queue: 'gevent.queue.JoinableQueue') -> NoReturn:
         # greenlet to wait on queue and process VM launches
         while True:
             pending_node_request = queue.get()
@@ -1089,12 +1691,12 @@ insertnode_request = None
     def __wait_for_instances(self, session: dict,
                              node_request_queue: List[dict]) -> None:
         """
-        Raises:
-            CommandFailed
+        Wait for launched instances; node request 'status' is set to
+        'success' or 'error'
         """
         self._logger.debug('__wait_for_instances()')
 
-        queue = JoinableQueue()
+        queue = gevent.queue.JoinableQueue()
 
         launch_requests = len(node_request_queue)
         worker_thread_count = 10 if launch_requests > 10 else launch_requests
@@ -1112,14 +1714,6 @@ insertnode_request = None
 
         queue.join()
 
-        # Raise exception if any instances failed
-        for node_request in node_request_queue:
-            if node_request['status'] == 'error':
-                self._logger.error('Message: %s', node_request['message'])
-
-                raise CommandFailed(
-                    'Fatal error launching one or more instances')
-
     def __instance_post_launch(self, session: dict, node_request: dict) \
             -> None:
         """Called after VM has been successfully launched and is in running
@@ -1179,19 +1773,131 @@ insertnode_request = None
             body=instances_set_labels_request_body,
         ).execute()
 
-    def __get_instance_internal_ip(self, instance: dict) -> Optional[str]: \
-            # pylint: disable=no-self-use
-        for network_interface in instance['networkInterfaces']:
-            return network_interface['networkIP']
+    def __get_vm_batched(self, session: dict, instance_name: str,
+                         zone: str) -> Optional[dict]:
+        """Retrieve VM; lookups of concurrently registering VMs in the same
+        zone are combined into one instances().list() call
+        """
 
-        return None
+        svc = session['connection'].svc
+        project = session['config']['project']
+
+        def list_instances(items: Dict[str, Any]) -> Dict[str, dict]:
+            result = {}
+
+            request = svc.instances().list(
+                project=project,
+                zone=zone,
+                filter=' OR '.join(
+                    '(name = "{}")'.format(name) for name in sorted(items))
+            )
+
+            while request is not None:
+                response = request.execute()
+
+                for instance in response.get('items', []):
+                    result[instance['name']] = instance
+
+                request = svc.instances().list_next(
+                    previous_request=request, previous_response=response)
+
+            return result
+
+        return self._registration_batcher.submit(
+            ('get', project, zone), instance_name, None, list_instances)
+
+    def __find_vm(self, session: dict, instance_name: str) \
+            -> Optional[dict]:
+        """Retrieve VM in any zone of the project"""
+
+        svc = session['connection'].svc
+
+        request = svc.instances().aggregatedList(
+            project=session['config']['project'],
+            filter='name = "{}"'.format(instance_name)
+        )
+
+        while request is not None:
+            response = request.execute()
+
+            for scoped_list in response.get('items', {}).values():
+                for instance in scoped_list.get('instances', []):
+                    if instance['name'] == instance_name:
+                        return instance
+
+            request = svc.instances().aggregatedList_next(
+                previous_request=request, previous_response=response)
+
+        return None
+
+    def __set_tortuga_name_batched(self, session: dict, vm_inst: dict):
+        """Set 'tortuga-name' label; label updates of concurrently
+        registering VMs in the same zone are sent in one batch request
+        """
+
+        svc = session['connection'].svc
+        project = session['config']['project']
+        zone = os.path.basename(vm_inst['zone'])
+
+        def set_labels(items: Dict[str, dict]) -> Dict[str, Exception]:
+            errors = {}
+
+            def callback(request_id, response, exception): \
+                    # pylint: disable=unused-argument
+                if exception is not None:
+                    errors[request_id] = exception
+
+            batch = svc.new_batch_http_request(callback=callback)
+
+            for name, instance in items.items():
+                batch.add(
+                    svc.instances().setLabels(
+                        project=project,
+                        instance=name,
+                        zone=zone,
+                        body={
+                            'labelFingerprint':
+                                instance.get('labelFingerprint'),
+                            'labels': dict(instance.get('labels', {}),
+                                           **{'tortuga-name': name}),
+                        },
+                    ),
+                    request_id=name
+                )
+
+            batch.execute()
+
+            return errors
+
+        error = self._registration_batcher.submit(
+            ('setLabels', project, zone), vm_inst['name'], vm_inst,
+            set_labels)
+
+        if error is not None:
+            raise error
+
+    def __get_instance_internal_ip(self, instance: dict) -> Optional[str]: \
+            # pylint: disable=no-self-use
+        for network_interface in instance['networkInterfaces']:
+            return network_interface['networkIP']
+
+        return None
 
     def __addActiveNodes(self, session: dict, dbSession: Session,
                          addNodesRequest: dict,
                          dbHardwareProfile: HardwareProfile,
-                         dbSoftwareProfile: SoftwareProfile) -> List[Node]:
+                         dbSoftwareProfile: SoftwareProfile, *,
+                         top_up: bool = True) -> List[Node]:
         """
         Create active nodes
+
+        In best-effort mode, the nodes that launched successfully are
+        returned as long as the minimum success threshold is met. Failed
+        slots are optionally replaced (see __top_up()) before returning,
+        so replacements are part of the result of the request.
+
+        Raises:
+            CommandFailed
         """
 
         self._logger.debug('__addActiveNodes()')
@@ -1209,8 +1915,16 @@ insertnode_request = None
             count=count
         )
 
-        dbSession.add_all(nodes)
-        dbSession.commit()
+        names = [node.name for node in nodes]
+
+        try:
+            dbSession.add_all(nodes)
+            dbSession.commit()
+        finally:
+            # committed names are seen by the database query of concurrent
+            # requests; names of a failed commit are free again
+            with self._node_name_reservations.lock:
+                self._node_name_reservations.release(names)
 
         self._logger.debug('Initialized node(s): %s', format_node_list(nodes))
 
@@ -1237,9 +1951,92 @@ insertnode_request = None
 
             raise
 
-        return self.__post_launch_action(
+        result = self.__post_launch_action(
             dbSession, session, node_request_queue)
 
+        if len(result) == count:
+            return result
+
+        for node_request in node_request_queue:
+            if node_request['status'] == 'error':
+                self._logger.error('Message: %s', node_request['message'])
+
+        best_effort = session['config'].get('best_effort_launch', False) or \
+            is_extra_arg_set(addNodesRequest.get('extra_args'), 'best_effort')
+
+        if not best_effort or \
+                len(result) < get_min_launch_success(
+                    count, session['config'].get('min_launch_success')):
+            raise CommandFailed(
+                'Fatal error launching one or more instances')
+
+        self._logger.warning(
+            'Best-effort launch: continuing with %d of %d requested'
+            ' node(s)', len(result), count
+        )
+
+        if top_up and session['config'].get('launch_top_up', False):
+            result.extend(self.__top_up(
+                session, dbSession, addNodesRequest, dbHardwareProfile,
+                dbSoftwareProfile, count - len(result)
+            ))
+
+        return result
+
+    def __top_up(self, session: dict, dbSession: Session,
+                 addNodesRequest: dict,
+                 dbHardwareProfile: HardwareProfile,
+                 dbSoftwareProfile: SoftwareProfile,
+                 count: int) -> List[Node]:
+        """
+        Launch replacements for failed node launches, in up to
+        'launch_top_up_attempts' rounds. Failed rounds are logged; the
+        request succeeds with the nodes launched so far.
+
+        :return: replacement nodes
+        """
+
+        self._logger.info('Launching %d replacement node(s)', count)
+
+        attempts = session['config'].get('launch_top_up_attempts', 3)
+
+        result: List[Node] = []
+
+        for attempt in range(attempts):
+            request = dict(addNodesRequest, count=count)
+
+            try:
+                nodes = self.__addActiveNodes(
+                    session, dbSession, request,
+                    dbHardwareProfile, dbSoftwareProfile, top_up=False
+                )
+            except Exception:  # noqa pylint: disable=broad-except
+                self._logger.exception(
+                    'Error launching replacement node(s) (attempt %d'
+                    ' of %d)', attempt + 1, attempts
+                )
+
+                continue
+
+            result.extend(nodes)
+
+            count -= len(nodes)
+
+            self._logger.info(
+                'Launched %d replacement node(s); %d remaining',
+                len(nodes), count
+            )
+
+            if count <= 0:
+                return result
+
+        self._logger.error(
+            'Unable to launch %d replacement node(s) after %d attempts',
+            count, attempts
+        )
+
+        return result
+
     def __post_launch_action(self, dbSession: Session, session: dict,
                              node_request_queue: List[dict]):
         count = len(node_request_queue)
@@ -1247,7 +2044,8 @@ insertnode_request = None
         result = []
         completed = 0
 
-        # Find all instances that failed to launch and clean them up
+        # Find all instances that failed to launch and clean them up. All
+        # deletes and updates are flushed in a single commit.
 
         for node_request in node_request_queue:
             if node_request['status'] != 'success':
@@ -1270,12 +2068,29 @@ insertnode_request = None
 
                 # Mark node as 'Provisioned' after being successfully launched
                 node_request['node'].state = state.NODE_STATE_PROVISIONED
-                self.fire_provisioned_event(node_request['node'])
 
                 completed += 1
 
+        start = time.perf_counter()
+
+        # instance mappings, metadata and nics of the nodes are inserted by
+        # the same commit (cascaded from the nodes)
+        node_ids = [node.id for node in result]
+
         dbSession.commit()
 
+        elapsed = time.perf_counter() - start
+
+        # Events are fired once the nodes are committed; the nodes expired
+        # by the commit are reloaded in one query rather than one per node
+        for node in load_nodes(dbSession, node_ids):
+            self.fire_provisioned_event(node)
+
+        self._logger.debug(
+            'Committed %d node(s) in %.1fms (%.2fms/node)',
+            count, elapsed * 1000, elapsed * 1000 / count if count else 0
+        )
+
         if completed and completed < count:
             warnmsg = ('only %d of %d requested instances launched'
                        ' successfully' % (completed, count))
@@ -1305,6 +2120,9 @@ insertnode_request = None
         metadata.append(('tortuga_installer_public_ipaddress',
                          self.installer_public_ipaddress))
 
+        # allows the startup script to report bootstrap step timings
+        metadata.append(('enable-guest-attributes', 'TRUE'))
+
         return metadata
 
     def __get_disk_type_resource_url(self, project: str, zone: str, ssd: bool):
@@ -1442,11 +2260,20 @@ insertnode_request = None
         config = session['config']
         normalized_name = f"scale-set-{name}"
 
+        # Find the instance template used by the managed instance group
+        # before it goes away
+        igm = self.get_scale_set(name, resourceAdapterProfile)
+        instance_template_name = \
+            os.path.basename(igm['instanceTemplate']) \
+            if igm and igm.get('instanceTemplate') else normalized_name
+
         try:
-            initial_response = connection.svc.instanceGroupManagers().delete(
-                project=config['project'],
-                zone=config['zone'],
-                instanceGroupManager=normalized_name
+            igm_api, location = self.__get_instance_group_manager_api(
+                session, normalized_name)
+
+            initial_response = igm_api.delete(
+                instanceGroupManager=normalized_name,
+                **location
             ).execute()
             # Wait for this to exist before continuing
             result = _blocking_call(
@@ -1458,19 +2285,140 @@ insertnode_request = None
             if not str(ex).startswith("AutoScalingGroup name not found"):
                 raise
         finally:
+            self.scale_set_locations.discard(
+                config['project'], normalized_name)
+
+            if instance_template_name == normalized_name:
+                try:
+                    # If the instance template was created specifically for
+                    # this scale set (i.e., its name is
+                    # 'scale-set-{instancegroupname}') then delete it
+                    connection.svc.instanceTemplates().delete(
+                        project=config['project'],
+                        instanceTemplate=normalized_name
+                    ).execute()
+                except apiclient.errors.HttpError as ex:
+                    if ex.resp.status != 404:
+                        raise
+            elif is_shared_instance_template(instance_template_name):
+                self.__release_instance_template(
+                    session, instance_template_name)
+
+    def __release_instance_template(self, session: dict,
+                                    instance_template_name: str) -> bool:
+        """
+        Delete shared (content-addressed) instance template if no managed
+        instance group references it anymore. GCE refuses to delete
+        templates still in use, so references are not counted.
+
+        :return: True if the template was deleted
+        """
+        connection = session['connection']
+        project = session['config']['project']
+
+        with self.__lock_instance_templates():
             try:
-                # If the instance template was created specifically for this
-                # scale set (i.e., its name is 'scale-set-{instancegroupname}')
-                # then delete it
                 connection.svc.instanceTemplates().delete(
-                    project=config['project'],
-                    instanceTemplate=normalized_name
+                    project=project,
+                    instanceTemplate=instance_template_name
                 ).execute()
-            except Exception as ex:
-                if not str(ex).startswith(
-                        "Launch configuration name not found"):
+            except apiclient.errors.HttpError as ex:
+                # 400: still used by another instance group; 404: already
+                # deleted
+                if ex.resp.status == 404:
+                    Gce._known_instance_templates.discard(
+                        (project, instance_template_name))
+                elif ex.resp.status != 400:
                     raise
 
+                self._logger.debug(
+                    'Instance template [%s] not deleted: %s',
+                    instance_template_name, ex)
+
+                return False
+
+        self._logger.debug(
+            'Deleted unused instance template [%s]', instance_template_name)
+
+        Gce._known_instance_templates.discard(
+            (project, instance_template_name))
+
+        return True
+
+    @property
+    def scale_set_locations(self) -> ScaleSetLocationStore:
+        """Locations of managed instance groups backing scale sets"""
+
+        return ScaleSetLocationStore(
+            os.path.join(self._cm.getRoot(), 'var', LOCATIONS_FILENAME))
+
+    def __get_scale_set_location(self, session: dict, igm_name: str, *,
+                                 create: bool = False) -> ScaleSetLocation:
+        """
+        Return location of managed instance group backing a scale set.
+
+        Existing scale sets keep the location they were created in, even
+        if 'scale_set_regional' was changed since. New scale sets are
+        regional if 'scale_set_regional' is enabled, otherwise zonal.
+        """
+        config = session['config']
+
+        if not create:
+            location = self.scale_set_locations.get(
+                config['project'], igm_name)
+            if location is not None:
+                return location
+
+            # scale sets created before locations were recorded
+            location = find_scale_set_location(
+                session['connection'].svc, config['project'], igm_name)
+            if location is not None:
+                self.scale_set_locations.set(
+                    config['project'], igm_name, location)
+
+                return location
+
+        if config.get('scale_set_regional'):
+            return ScaleSetLocation(regional=True, location=config['region'])
+
+        return ScaleSetLocation(regional=False, location=config['zone'])
+
+    def __get_instance_group_manager_api(self, session: dict,
+                                         igm_name: str, *,
+                                         create: bool = False) \
+            -> Tuple[Any, Dict[str, str]]:
+        """
+        Return managed instance group collection and location arguments
+        for scale set
+        """
+        return get_igm_api(
+            session['connection'].svc,
+            session['config']['project'],
+            self.__get_scale_set_location(session, igm_name, create=create)
+        )
+
+    def get_scale_set(self, name: str,
+                      resourceAdapterProfile: str) -> Optional[dict]:
+        """
+        Return managed instance group backing the scale set, or None if it
+        does not exist (yet).
+        """
+        session = self.get_gce_session(resourceAdapterProfile)
+
+        igm_api, location = self.__get_instance_group_manager_api(
+            session, f'scale-set-{name}')
+
+        try:
+            return igm_api.get(
+                instanceGroupManager=f'scale-set-{name}',
+                **location
+            ).execute()
+        except apiclient.errors.HttpError as ex:
+            if ex.resp.status != 404:
+                raise
+
+        return None
+
     def update_scale_set(self,
               name: str,
               resourceAdapterProfile: str,
@@ -1487,14 +2435,14 @@ insertnode_request = None
         session = self.get_gce_session(
             resourceAdapterProfile
         )
-        connection = session['connection']
-        config = session['config']
 
-        connection.svc.instanceGroupManagers().resize(
-            project=config['project'],
-            zone=config['zone'],
+        igm_api, location = self.__get_instance_group_manager_api(
+            session, normalized_name)
+
+        igm_api.resize(
             instanceGroupManager=normalized_name,
-            size=desiredCount).execute()
+            size=desiredCount,
+            **location).execute()
 
     def create_instance_template(self,
               name: str,
@@ -1565,6 +2513,22 @@ insertnode_request = None
             disk["initializeParams"]["diskType"] = \
                 os.path.basename(disk["initializeParams"]["diskType"])
 
+        reuse = session['config'].get('reuse_instance_templates', False)
+        if reuse:
+            # Name the template after its content so that scale sets with
+            # identical settings share one template
+            name = get_shared_instance_template_name(
+                instance, insertnode_request, self._cm.get_encryption_key())
+
+            if self.__instance_template_exists(session, name):
+                self._logger.debug(
+                    'Reusing existing instance template [%s]', name)
+
+                return {
+                    "name": name,
+                    "properties": instance,
+                }
+
         instanceTemplate = {
             "name": name,
             "properties": instance,
@@ -1580,6 +2544,19 @@ insertnode_request = None
                     session['config']['project'],
                     initial_response,
                     polling_interval=session['config']['sleeptime'])
+        except apiclient.errors.HttpError as ex:
+            if reuse and ex.resp.status == 409:
+                # created concurrently by another request
+                Gce._known_instance_templates.add(
+                    (session['config']['project'], name))
+
+                return instanceTemplate
+
+            connection.svc.instanceTemplates().delete(
+                project=session['config']['project'],
+                instanceTemplate=name
+            ).execute()
+            raise ex
         except Exception as ex:
             connection.svc.instanceTemplates().delete(
                 project=session['config']['project'],
@@ -1587,8 +2564,204 @@ insertnode_request = None
             ).execute()
             raise ex
 
+        if reuse:
+            Gce._known_instance_templates.add(
+                (session['config']['project'], name))
+
         return instanceTemplate
 
+    def bake_image(self, name: str, resourceAdapterProfile: str, *,
+                   timeout: int = 1800) -> str:
+        """
+        Create image containing the Tortuga CA, Puppet and git from the
+        image configured in the resource adapter profile. Nodes launched
+        from this image skip package installation.
+
+        A temporary VM is launched from the configured image, stopped
+        by the startup script once packages are installed, and deleted
+        after the image has been created from its boot disk.
+
+        :return: URL of new image
+        :raises OperationFailed:
+        """
+        self._logger.debug('bake_image(): name=[%s]', name)
+
+        session = self.get_gce_session(resourceAdapterProfile)
+
+        config = session['config']
+        svc = session['connection'].svc
+
+        startup_script = self.generate_startup_script(
+            config, bake_image=True)
+        if startup_script is None:
+            raise OperationFailed(
+                'Startup script template [{}] does not exist'.format(
+                    config['startup_script_template']))
+
+        metadata = self.__get_metadata(session)
+        metadata.append(('startup-script', startup_script))
+
+        common_launch_args = self.__get_common_launch_args(session)
+
+        # packages are installed the same way on any machine shape
+        common_launch_args['preemptible'] = False
+        common_launch_args.pop('accelerators', None)
+
+        instance = self.__get_instance_properties(
+            session, metadata, common_launch_args,
+            persistent_disks=[{'sizeGb': config['disksize']}])
+
+        instance_name = '{}-bake'.format(name)
+
+        instance['name'] = instance_name
+
+        self._logger.info(
+            'Launching VM [%s] to bake image [%s]', instance_name, name)
+
+        response = _blocking_call(
+            svc, config['project'],
+            svc.instances().insert(
+                project=config['project'],
+                zone=config['zone'],
+                body=instance,
+            ).execute(),
+            polling_interval=config['sleeptime'])
+
+        if 'error' in response:
+            raise OperationFailed(
+                'Error launching VM [{}]: {}'.format(
+                    instance_name, response['error']))
+
+        try:
+            # the startup script stops the VM on failure as well; fail as
+            # soon as it reports one
+            vm = self.__wait_for_vm_status(
+                session, instance_name, 'TERMINATED', timeout,
+                check=lambda: self.__check_bake_status(
+                    session, instance_name))
+
+            response = _blocking_call(
+                svc, config['project'],
+                svc.images().insert(
+                    project=config['project'],
+                    body={
+                        'name': name,
+                        'sourceDisk': vm['disks'][0]['source'],
+                        'labels': {'tortuga-bootstrap': 'prebaked'},
+                    }
+                ).execute(),
+                polling_interval=config['sleeptime'])
+
+            if 'error' in response:
+                raise OperationFailed(
+                    'Error creating image [{}]: {}'.format(
+                        name, response['error']))
+        finally:
+            self._logger.debug('Deleting VM [%s]', instance_name)
+
+            try:
+                svc.instances().delete(
+                    project=config['project'],
+                    zone=config['zone'],
+                    instance=instance_name,
+                ).execute()
+            except Exception:  # pylint: disable=broad-except
+                # must not replace the error that caused baking to fail
+                self._logger.exception(
+                    'Error deleting VM [%s]; it must be deleted manually',
+                    instance_name)
+
+        return response['targetLink']
+
+    def __check_bake_status(self, session: dict,
+                            instance_name: str) -> None:
+        """
+        :raises OperationFailed: startup script reported baking failure
+        """
+
+        try:
+            response = session['connection'].svc.instances() \
+                .getGuestAttributes(
+                    project=session['config']['project'],
+                    zone=session['config']['zone'],
+                    instance=instance_name,
+                    queryPath=GUEST_ATTRIBUTE_NAMESPACE + '/',
+                ).execute()
+        except apiclient.errors.HttpError as ex:
+            # not written yet
+            self._logger.debug(
+                'Unable to get guest attributes of [%s]: %s',
+                instance_name, ex)
+
+            return
+
+        value = get_guest_attribute(
+            response, GUEST_ATTRIBUTE_NAMESPACE, BAKE_STATUS_KEY)
+
+        if value and value.startswith('failed'):
+            raise OperationFailed(
+                'Baking VM [{}] {}'.format(instance_name, value))
+
+    def __wait_for_vm_status(self, session: dict, instance_name: str,
+                             status: str, timeout: int,
+                             check: Optional[Callable[[], None]] = None) \
+            -> dict:
+        """
+        :param check: called on each poll; raises to stop waiting
+        :raises OperationFailed: VM did not reach status within timeout
+        """
+
+        deadline = time.monotonic() + timeout
+
+        while True:
+            vm = session['connection'].svc.instances().get(
+                project=session['config']['project'],
+                zone=session['config']['zone'],
+                instance=instance_name,
+            ).execute()
+
+            if check is not None:
+                check()
+
+            if vm['status'] == status:
+                return vm
+
+            if time.monotonic() >= deadline:
+                raise OperationFailed(
+                    'Timed out waiting for VM [{}] to reach status'
+                    ' [{}]'.format(instance_name, status))
+
+            time.sleep(session['config']['sleeptime'])
+
+    def __lock_instance_templates(self):
+        """Return context manager serializing use (by managed instance
+        group inserts) and deletion of shared instance templates across
+        all processes
+        """
+
+        return file_lock(os.path.join(
+            self._cm.getRoot(), 'var', TEMPLATES_LOCK_FILENAME))
+
+    def __instance_template_exists(self, session: dict, name: str) -> bool:
+        project = session['config']['project']
+
+        if (project, name) in Gce._known_instance_templates:
+            return True
+
+        try:
+            session['connection'].svc.instanceTemplates().get(
+                project=project, instanceTemplate=name
+            ).execute()
+        except apiclient.errors.HttpError as ex:
+            if ex.resp.status != 404:
+                raise
+
+            return False
+
+        Gce._known_instance_templates.add((project, name))
+
+        return True
+
     def create_scale_set(self,
               name: str,
               resourceAdapterProfile: str,
@@ -1596,12 +2769,17 @@ insertnode_request = None
               hardwareProfile: str=None,
               softwareProfile: str=None,
               instance_template_name: str=None,
-              adapter_args: dict={}):
+              adapter_args: dict={}) -> dict:
         """
         Create a scale set in GCE
 
         If instance_template_name is not provided, we create an instance
-        template specifically for this scale set.
+        template specifically for this scale set, or reuse an existing
+        template with identical content if 'reuse_instance_templates' is
+        enabled.
+
+        The managed instance group insert operation is returned without
+        waiting for it to complete. Use get_scale_set() to follow progress.
 
         :raises InvalidArgument:
         """
@@ -1615,24 +2793,63 @@ insertnode_request = None
         # Set up GCE session
         session = self.get_gce_session(resourceAdapterProfile)
         config = session['config']
-        connection = session['connection']
 
-        # If no instance template is provided, create one specifically for this
-        # scale set.
-        template_created = False
-        if instance_template_name:
-            # TODO: confirm that provided instance template exists
-            pass
-        else:
-            instance_template = self.create_instance_template(
-                name,
-                resourceAdapterProfile,
-                hardwareProfile,
-                softwareProfile,
-                adapter_args
-            )
-            template_created = True
-            instance_template_name = instance_template['name']
+        igm_api, location = self.__get_instance_group_manager_api(
+            session, name, create=True)
+
+        # A shared instance template may be deleted by another process
+        # releasing it between being looked up and being used by the
+        # managed instance group; it is then created again.
+        for attempt in range(2):
+            # If no instance template is provided, create one specifically
+            # for this scale set.
+            template_created = False
+            template_name = instance_template_name
+            if not template_name:
+                instance_template = self.create_instance_template(
+                    name,
+                    resourceAdapterProfile,
+                    hardwareProfile,
+                    softwareProfile,
+                    adapter_args
+                )
+                template_created = True
+                template_name = instance_template['name']
+
+            try:
+                response = self.__insert_scale_set(
+                    session, igm_api, location, name, desiredCount,
+                    template_name, template_created)
+            except apiclient.errors.HttpError as ex:
+                if attempt or not template_created or \
+                        not is_shared_instance_template(template_name) or \
+                        not is_instance_template_not_found(
+                            ex, template_name):
+                    raise
+
+                self._logger.warning(
+                    'Instance template [%s] was deleted; creating it'
+                    ' again', template_name)
+
+                Gce._known_instance_templates.discard(
+                    (config['project'], template_name))
+
+                continue
+
+            break
+
+        self.scale_set_locations.set(
+            config['project'], name,
+            self.__get_scale_set_location(session, name, create=True))
+
+        return response
+
+    def __insert_scale_set(self, session: dict, igm_api, location: dict,
+                           name: str, desiredCount: int,
+                           instance_template_name: str,
+                           template_created: bool) -> dict:
+        config = session['config']
+        connection = session['connection']
 
         # Set up instance group dict
         instanceGroup = {
@@ -1649,20 +2866,44 @@ insertnode_request = None
             "targetSize": desiredCount
         }
 
-        try:
-            connection.svc.instanceGroupManagers().insert(
-                project=config['project'],
+        if config.get('scale_set_regional'):
+            # Spread instances over the zones of the region
+            instanceGroup['distributionPolicy'] = {
+                'targetShape': config['scale_set_target_shape'],
+            }
+
+            if config['scale_set_zones']:
+                instanceGroup['distributionPolicy']['zones'] = [
+                    {'zone': 'zones/{}'.format(zone)}
+                    for zone in config['scale_set_zones']
+                ]
+
+        def insert() -> dict:
+            return igm_api.insert(
                 body=instanceGroup,
-                zone=config['zone']
+                **location
             ).execute()
+
+        try:
+            if is_shared_instance_template(instance_template_name):
+                # shared instance templates are not deleted (by any
+                # process) while being referenced by the insert
+                with self.__lock_instance_templates():
+                    return insert()
+
+            return insert()
         except Exception as ex:
             # Cleanup on failure - if we created an instance template
             # specifically for this scale set, then delete it
             if template_created:
-                connection.svc.instanceTemplates().delete(
-                    project=config['project'],
-                    instanceTemplate=instance_template_name
-                ).execute()
+                if is_shared_instance_template(instance_template_name):
+                    self.__release_instance_template(
+                        session, instance_template_name)
+                else:
+                    connection.svc.instanceTemplates().delete(
+                        project=config['project'],
+                        instanceTemplate=instance_template_name
+                    ).execute()
             raise ex
 
     def __launch_instance(self, session: dict, instance_name: str,
@@ -1701,9 +2942,25 @@ insertnode_request = None
         Parse network(s) from config, return list of dicts containing
         network interface spec
 
+        Definitions are computed once per adapter instance for each
+        (project, region, networks) combination.
+
         :raises ConfigurationError:
         """
 
+        key = (project, region, tuple(networks))
+
+        if key not in self.__network_interfaces_cache:
+            self.__network_interfaces_cache[key] = \
+                self.__build_network_interface_definitions(
+                    project, region, networks)
+
+        return copy.deepcopy(self.__network_interfaces_cache[key])
+
+    def __build_network_interface_definitions(self, project: str,
+                                              region: str,
+                                              networks: List[str]) -> list:
+
         network_interfaces = []
 
         primary_intfc = None
@@ -1937,26 +3194,142 @@ insertnode_request = None
         :returntype: int
 
         """
-        #
-        # Default to zero, because if for some reason the node can't be found
-        # (i.e. it was deleted in the background), then it will not be using
-        # any cpus
-        #
-        vcpus = 0
 
-        try:
-            configDict = self.get_node_resource_adapter_config(
-                NodesDbHandler().getNode(self.session, name)
-            )
+        result = self.__get_nodes_vcpus([name])
+        if name not in result:
+            raise ResourceNotFound('Node [{}] not found'.format(name))
+
+        return result[name]
+
+    def get_nodes_vcpus(self, names: List[str]) -> Dict[str, int]:
+        """
+        Return {node name: vcpus} for nodes
+
+        Nodes not found in the cache are loaded in one query, and the
+        resource adapter configuration is resolved once per profile.
+        Nodes that cannot be found (i.e. deleted in the background) are
+        reported with zero vcpus, because they are not using any cpus.
+        """
+
+        result = self.__get_nodes_vcpus(names)
+
+        for name in names:
+            result.setdefault(name, 0)
+
+        return result
+
+    def __get_nodes_vcpus(self, names: List[str]) -> Dict[str, int]:
+        """Return {node name: vcpus} for nodes that exist"""
+
+        synced_at = self.machine_type_catalog.synced_at
+
+        now = time.monotonic()
+
+        with self._node_vcpus_lock:
+            if Gce._node_vcpus_synced_at != synced_at:
+                # machine types may have changed
+                self._node_vcpus.clear()
+
+                Gce._node_vcpus_synced_at = synced_at
+
+            result = {}
+
+            for name in names:
+                entry = self._node_vcpus.get(name)
+                if entry is None:
+                    continue
+
+                if now - entry[1] >= NODE_VCPUS_TTL:
+                    del self._node_vcpus[name]
+
+                    continue
+
+                result[name] = entry[0]
+
+        missing = [name for name in names if name not in result]
+        if not missing:
+            return result
+
+        nodes = self.session.query(Node).filter(
+            Node.name.in_(missing)
+        ).options(
+            joinedload(Node.instance).joinedload(
+                InstanceMapping.resource_adapter_configuration)
+        ).all()
+
+        configs: Dict[Optional[str], dict] = {}
+        loaded = {}
+
+        for node in nodes:
+            profile = node.instance.resource_adapter_configuration.name \
+                if node.instance and \
+                node.instance.resource_adapter_configuration else None
+
+            if profile not in configs:
+                configs[profile] = \
+                    self.get_node_resource_adapter_config(node)
+
+            configDict = configs[profile]
 
             vcpus = configDict.get('vcpus', 0)
             if not vcpus:
                 vcpus = self.get_instance_size_mapping(configDict['type'])
 
-        except NodeNotFound:
-            pass
+            loaded[node.name] = vcpus
+
+        with self._node_vcpus_lock:
+            self._node_vcpus.update(
+                (name, (vcpus, now)) for name, vcpus in loaded.items())
+
+        result.update(loaded)
+
+        return result
+
+    def __invalidate_node_vcpus(self, names: List[str]) -> None:
+        with self._node_vcpus_lock:
+            for name in names:
+                self._node_vcpus.pop(name, None)
+
+    @property
+    def machine_type_catalog(self) -> MachineTypeCatalog:
+        """Machine type catalog synced by 'gce-sync-machine-types'"""
+
+        path = os.path.join(self._cm.getRoot(), 'var', CATALOG_FILENAME)
+
+        catalog = self._catalogs.get(path)
+        if catalog is None:
+            catalog = self._catalogs.setdefault(
+                path, MachineTypeCatalog(path))
+
+        return catalog
+
+    def get_instance_size_mapping(self, value: str) -> Optional[int]:
+        """
+        Return number of vcpus of machine type
+
+        Custom machine types ('custom-<vcpus>-<memory>') are parsed from
+        the name. Other machine types are looked up in the machine type
+        catalog and then in a table read once from gce-instance-sizes.csv.
+        """
+
+        vcpus = parse_custom_machine_type(value)
+        if vcpus is not None:
+            return vcpus
+
+        vcpus = self.machine_type_catalog.get_vcpus(value)
+        if vcpus is not None:
+            return vcpus
 
-        return vcpus
+        vcpus = get_machine_type_vcpus(
+            value,
+            get_instance_sizes(os.path.join(
+                self._cm.getKitConfigBase(), 'gce-instance-sizes.csv'))
+        )
+
+        if vcpus is not None:
+            return vcpus
+
+        return super().get_instance_size_mapping(value)
 
     def __gce_get_image_by_name(self, svc, image_project: str,
                                 image_name: str) -> str:
@@ -2092,44 +3465,139 @@ insertnode_request = None
                             node.name, result['errors'])
 
     def cloudserveraction_stop(self, cloudconnectorprofile_id: str,
-                               cloudserver_id: str, **kwargs):
-        cfg = self.get_config(cloudconnectorprofile_id)
-        session = gceAuthorize_from_json(cfg.get('json_keyfile'))
-        project, zone, instance_name = \
-            self._get_instance_name_from_cloudserver_id(cloudserver_id)
-        response = session.svc.instances().stop(
-            project=project, zone=zone, instance=instance_name).execute()
-        _blocking_call(session.svc, project, response)
+                               cloudserver_id: str, wait: bool = True,
+                               **kwargs) -> Optional[str]:
+        return self.__cloudserveraction(
+            'stop', cloudconnectorprofile_id, cloudserver_id, wait=wait)
 
     def cloudserveraction_start(self, cloudconnectorprofile_id: str,
-                                cloudserver_id: str, **kwargs):
-        cfg = self.get_config(cloudconnectorprofile_id)
-        session = gceAuthorize_from_json(cfg.get('json_keyfile'))
-        project, zone, instance_name = \
-            self._get_instance_name_from_cloudserver_id(cloudserver_id)
-        response = session.svc.instances().start(
-            project=project, zone=zone, instance=instance_name).execute()
-        _blocking_call(session.svc, project, response)
+                                cloudserver_id: str, wait: bool = True,
+                                **kwargs) -> Optional[str]:
+        return self.__cloudserveraction(
+            'start', cloudconnectorprofile_id, cloudserver_id, wait=wait)
 
     def cloudserveraction_restart(self, cloudconnectorprofile_id: str,
-                                  cloudserver_id: str, **kwargs):
-        cfg = self.get_config(cloudconnectorprofile_id)
-        session = gceAuthorize_from_json(cfg.get('json_keyfile'))
-        project, zone, instance_name = \
-            self._get_instance_name_from_cloudserver_id(cloudserver_id)
-        response = session.svc.instances().reset(
-            project=project, zone=zone, instance=instance_name).execute()
-        _blocking_call(session.svc, project, response)
+                                  cloudserver_id: str, wait: bool = True,
+                                  **kwargs) -> Optional[str]:
+        return self.__cloudserveraction(
+            'reset', cloudconnectorprofile_id, cloudserver_id, wait=wait)
 
     def cloudserveraction_delete(self, cloudconnectorprofile_id: str,
-                                 cloudserver_id: str, **kwargs):
+                                 cloudserver_id: str, wait: bool = True,
+                                 **kwargs) -> Optional[str]:
+        return self.__cloudserveraction(
+            'delete', cloudconnectorprofile_id, cloudserver_id, wait=wait)
+
+    def __cloudserveraction(self, action: str, cloudconnectorprofile_id: str,
+                            cloudserver_id: str, *,
+                            wait: bool = True) -> Optional[str]:
+        """Issue instance action ('stop', 'start', 'reset' or 'delete')
+
+        If 'wait' is False, return immediately with an operation id that
+        can be passed to cloudserveraction_status(). Otherwise block until
+        Compute Engine reports the operation as DONE and return None.
+        """
+
         cfg = self.get_config(cloudconnectorprofile_id)
         session = gceAuthorize_from_json(cfg.get('json_keyfile'))
         project, zone, instance_name = \
             self._get_instance_name_from_cloudserver_id(cloudserver_id)
-        response = session.svc.instances().delete(
+
+        response = getattr(session.svc.instances(), action)(
             project=project, zone=zone, instance=instance_name).execute()
-        _blocking_call(session.svc, project, response)
+
+        if wait:
+            _blocking_call(session.svc, project, response)
+
+            return None
+
+        operation_id = make_operation_handle(
+            project, zone, response['name'])
+
+        self._operation_cache.add(
+            operation_id, response,
+            fetch=self.__get_operation_fetch_function(
+                cfg, project, zone, response['name']))
+
+        self._logger.debug(
+            'Instance [%s] action [%s] started: operation [%s]',
+            instance_name, action, operation_id
+        )
+
+        return operation_id
+
+    def cloudserveraction_status(self, cloudconnectorprofile_id: str,
+                                 operation_id: str, **kwargs) -> dict:
+        """
+        Return status of operation started by a non-blocking
+        cloudserveraction_* call.
+
+        Compute Engine is queried at most once per polling interval for
+        each operation; the cached result is returned otherwise.
+
+        :raises InvalidArgument: malformed operation id
+        """
+
+        try:
+            project, zone, operation_name = \
+                parse_operation_handle(operation_id)
+        except ValueError as exc:
+            raise InvalidArgument(str(exc))
+
+        # checked and read atomically; the operation may expire or be
+        # refreshed by the poller at any time
+        operation = self._operation_cache.get_current(operation_id)
+
+        if operation is None:
+            cfg = self.get_config(cloudconnectorprofile_id)
+
+            fetch = self.__get_operation_fetch_function(
+                cfg, project, zone, operation_name)
+
+            operation = fetch()
+
+            self._operation_cache.update(operation_id, operation, fetch=fetch)
+
+        return {
+            'id': operation_id,
+            'status': operation.get('status'),
+            'progress': operation.get('progress', 0),
+            'error': operation.get('error'),
+        }
+
+    def subscribe_cloudserveraction(self, operation_id: str,
+                                    callback: Callable[[str, dict], None]) \
+            -> None:
+        """Register callback to be called when the operation completes
+
+        Completion is detected by a background poller (and by
+        cloudserveraction_status()); the callback receives the operation
+        id and the final Compute Engine operation.
+
+        :raises InvalidArgument: unknown or expired operation id
+        """
+
+        try:
+            self._operation_cache.subscribe(operation_id, callback)
+        except KeyError:
+            raise InvalidArgument(
+                'Unknown operation id: {}'.format(operation_id))
+
+    @staticmethod
+    def __get_operation_fetch_function(cfg: dict, project: str,
+                                       zone: Optional[str],
+                                       operation_name: str) \
+            -> FetchFunction:
+        # called from the operation poller thread, which must not use
+        # this (request-scoped) adapter
+        json_keyfile = cfg.get('json_keyfile')
+
+        def fetch() -> dict:
+            return fetch_operation(
+                gceAuthorize_from_json(json_keyfile).svc, project, zone,
+                operation_name)
+
+        return fetch
 
     def _get_instance_name_from_cloudserver_id(
             self, cloudserver_id) -> Tuple[str, str, str]:
@@ -2162,11 +3630,45 @@ class GoogleComputeEngine:
         self._svc = value
 
 
+# Compute Engine clients are not thread-safe (httplib2); clients are
+# cached per thread
+_compute_clients = threading.local()
+
+
 def gceAuthorize_from_json(json_filename: Optional[str] = None) \
         -> GoogleComputeEngine:
     """Returns GCE session object
+
+    Clients are reused by later calls from the same thread with the same
+    credentials file, as long as the file has not been modified. The
+    client of a modified file replaces the previous one.
     """
 
+    try:
+        mtime = os.path.getmtime(json_filename) if json_filename else None
+    except OSError:
+        mtime = None
+
+    # credentials file -> (mtime, client)
+    clients = getattr(_compute_clients, 'clients', None)
+    if clients is None:
+        clients = _compute_clients.clients = {}
+
+    entry = clients.get(json_filename)
+
+    if entry is None or entry[0] != mtime:
+        entry = clients[json_filename] = \
+            (mtime, _build_compute_client(json_filename))
+
+    return entry[1]
+
+
+def _build_compute_client(json_filename: Optional[str]) \
+        -> GoogleComputeEngine:
+    # pylint: disable=import-outside-toplevel
+    from google.auth import compute_engine
+    from google.oauth2 import service_account
+
     url = 'https://www.googleapis.com/auth/compute'
 
     # Only try and load the file if it exists
@@ -2190,7 +3692,7 @@ def _blocking_call(gce_service, project_id, response,
     while status != 'DONE' and response:
         operation_id = response['name']
 
-        # Identify if this is a per-zone resource
+        # Identify if this is a per-zone or per-region resource
         if 'zone' in response:
             zone_name = response['zone'].split('/')[-1]
 
@@ -2199,6 +3701,14 @@ def _blocking_call(gce_service, project_id, response,
                 operation=operation_id,
                 zone=zone_name
             ).execute()
+        elif 'region' in response:
+            region_name = response['region'].split('/')[-1]
+
+            response = gce_service.regionOperations().get(
+                project=project_id,
+                operation=operation_id,
+                region=region_name
+            ).execute()
         else:
             response = gce_service.globalOperations().get(
                 project=project_id, operation=operation_id
@@ -2228,7 +3738,7 @@ def _gevent_blocking_call(gce_service, project_id, response,
     while status != 'DONE' and response:
         operation_id = response['name']
 
-        # Identify if this is a per-zone resource
+        # Identify if this is a per-zone or per-region resource
         if 'zone' in response:
             zone_name = response['zone'].split('/')[-1]
 
@@ -2237,6 +3747,14 @@ def _gevent_blocking_call(gce_service, project_id, response,
                 operation=operation_id,
                 zone=zone_name
             ).execute()
+        elif 'region' in response:
+            region_name = response['region'].split('/')[-1]
+
+            response = gce_service.regionOperations().get(
+                project=project_id,
+                operation=operation_id,
+                region=region_name
+            ).execute()
         else:
             response = gce_service.globalOperations().get(
                 project=project_id, operation=operation_id
@@ -2279,14 +3797,6 @@ def gevent_wait_for_instance(session, pending_node_request):
     return pending_node_request['status'] == 'success'
 
 
-def is_running_on_gce() -> bool:
-    p = subprocess.Popen('dmidecode -s bios-vendor', shell=True,
-                         stdout=subprocess.PIPE)
-    stdout, _ = p.communicate()
-
-    return stdout.rstrip() == 'Google'
-
-
 def _get_encoded_list(items):
     """Return Python list encoded in a string"""
     return '[' + ', '.join(['\'%s\'' % (item) for item in items]) + ']' \
@@ -0,0 +1,145 @@
+# Copyright 2008-2018 Univa Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import os
+import subprocess
+import tempfile
+import threading
+from typing import Optional, Sequence
+
+
+#: Facts about the installer host, shared by all processes. The file is
+#: ignored after a reboot (boot id mismatch).
+HOST_FACTS_PATH = '/opt/tortuga/var/gce-host-facts.json'
+
+DMI_PATHS = (
+    '/sys/class/dmi/id/bios_vendor',
+    '/sys/class/dmi/id/product_name',
+)
+
+BOOT_ID_PATH = '/proc/sys/kernel/random/boot_id'
+
+_running_on_gce: Optional[bool] = None
+_lock = threading.Lock()
+
+
+def _read_file(path: str) -> Optional[str]:
+    try:
+        with open(path) as fp:
+            return fp.read().strip()
+    except (OSError, UnicodeDecodeError):
+        return None
+
+
+def read_dmi(paths: Sequence[str] = DMI_PATHS) -> Optional[bool]:
+    """Return True if DMI data in sysfs identifies a Google VM, None if
+    DMI data is not readable
+    """
+
+    values = [value for value in (_read_file(path) for path in paths)
+              if value is not None]
+
+    if not values:
+        return None
+
+    return any(value.startswith('Google') for value in values)
+
+
+def run_dmidecode() -> bool:
+    try:
+        stdout = subprocess.run(
+            ['dmidecode', '-s', 'bios-vendor'],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            check=False,
+        ).stdout
+    except OSError:
+        return False
+
+    return stdout.decode(errors='replace').strip() == 'Google'
+
+
+def _load_facts(path: str) -> dict:
+    try:
+        with open(path) as fp:
+            facts = json.load(fp)
+    except (OSError, ValueError):
+        return {}
+
+    return facts if isinstance(facts, dict) else {}
+
+
+def _save_facts(path: str, facts: dict) -> None:
+    try:
+        fd, tmpname = tempfile.mkstemp(
+            dir=os.path.dirname(path), prefix='.host-facts-')
+    except OSError:
+        # not writable (i.e. unprivileged CLI user)
+        return
+
+    try:
+        with os.fdopen(fd, 'w') as fp:
+            json.dump(facts, fp)
+
+        os.chmod(tmpname, 0o644)
+
+        os.rename(tmpname, path)
+    except OSError:
+        os.unlink(tmpname)
+
+
+def detect_running_on_gce(*, path: str = HOST_FACTS_PATH,
+                          dmi_paths: Sequence[str] = DMI_PATHS,
+                          boot_id_path: str = BOOT_ID_PATH) -> bool:
+    """
+    Return True if this host is a Compute Engine VM
+
+    The result is read from the host facts file if it was written since
+    the last boot. Otherwise, DMI data is read from sysfs (falling back to
+    'dmidecode') and the result is saved.
+    """
+
+    boot_id = _read_file(boot_id_path)
+
+    facts = _load_facts(path)
+
+    if boot_id is not None and facts.get('boot_id') == boot_id and \
+            isinstance(facts.get('running_on_gce'), bool):
+        return facts['running_on_gce']
+
+    result = read_dmi(dmi_paths)
+    if result is None:
+        result = run_dmidecode()
+
+    if boot_id is not None:
+        facts.update(boot_id=boot_id, running_on_gce=result)
+
+        _save_facts(path, facts)
+
+    return result
+
+
+def is_running_on_gce() -> bool:
+    """Return True if this host is a Compute Engine VM; detected once per
+    process
+    """
+
+    global _running_on_gce  # pylint: disable=global-statement
+
+    with _lock:
+        if _running_on_gce is None:
+            _running_on_gce = detect_running_on_gce()
+
+        return _running_on_gce
@@ -0,0 +1,53 @@
+# Copyright 2008-2018 Univa Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import importlib
+from types import ModuleType
+
+
+class LazyModule:
+    """
+    Stand-in for a module that is imported on first attribute access.
+
+    Submodules are imported on demand as well, so that
+    'LazyModule("googleapiclient").errors.HttpError' works whether or not
+    'googleapiclient.errors' has been imported already.
+    """
+
+    def __init__(self, name: str):
+        self.__name = name
+        self.__module = None
+
+    def __load(self) -> ModuleType:
+        if self.__module is None:
+            self.__module = importlib.import_module(self.__name)
+
+        return self.__module
+
+    def __getattr__(self, attr: str):
+        module = self.__load()
+
+        try:
+            return getattr(module, attr)
+        except AttributeError:
+            try:
+                return importlib.import_module(
+                    '{}.{}'.format(self.__name, attr))
+            except ImportError:
+                raise AttributeError(
+                    'module {!r} has no attribute {!r}'.format(
+                        self.__name, attr)) from None
+
+    def __repr__(self) -> str:
+        return '<lazy module {!r}>'.format(self.__name)
@@ -0,0 +1,89 @@
+# Copyright 2008-2018 Univa Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import csv
+import os
+import re
+import threading
+from typing import Dict, Optional, Tuple
+
+
+# custom machine types: '[<series>-]custom-<vcpus>-<memory MB>[-ext]'
+CUSTOM_MACHINE_TYPE = re.compile(r'^(?:[a-z0-9]+-)?custom-(\d+)-(\d+)(-ext)?$')
+
+_tables: Dict[str, Tuple[float, Dict[str, int]]] = {}
+_tables_lock = threading.Lock()
+
+
+def parse_custom_machine_type(machine_type: str) -> Optional[int]:
+    """Return number of vcpus of custom machine type, or None"""
+
+    match = CUSTOM_MACHINE_TYPE.match(machine_type)
+
+    return int(match.group(1)) if match else None
+
+
+def read_instance_sizes(path: str) -> Dict[str, int]:
+    """Parse '<machine type>,<vcpus>' lines of instance sizes file"""
+
+    result = {}
+
+    with open(path) as fp:
+        for row in csv.reader(fp):
+            if len(row) < 2 or row[0].lstrip().startswith('#'):
+                continue
+
+            try:
+                result[row[0].strip()] = int(row[1])
+            except ValueError:
+                continue
+
+    return result
+
+
+def get_instance_sizes(path: str) -> Dict[str, int]:
+    """
+    Return machine type to vcpus table from instance sizes file
+
+    The file is parsed once and parsed again only after it has been
+    modified. An empty table is returned if the file does not exist.
+    """
+
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return {}
+
+    with _tables_lock:
+        cached = _tables.get(path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+
+    table = read_instance_sizes(path)
+
+    with _tables_lock:
+        _tables[path] = (mtime, table)
+
+    return table
+
+
+def get_machine_type_vcpus(machine_type: str,
+                           table: Dict[str, int]) -> Optional[int]:
+    """Return vcpus of machine type, or None if unknown"""
+
+    vcpus = parse_custom_machine_type(machine_type)
+    if vcpus is not None:
+        return vcpus
+
+    return table.get(machine_type)
@@ -0,0 +1,178 @@
+# Copyright 2008-2018 Univa Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import random
+import re
+import string
+import threading
+import time
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+
+# '#NN' in hardware profile name format is replaced by a zero-padded index
+NAME_FORMAT_TOKEN = re.compile(r'#(N+)')
+
+# Length of random suffix appended when 'randomize_hostname' is enabled
+RANDOM_SUFFIX_LENGTH = 5
+
+# Seconds allocated node names are reserved; long enough for the nodes to
+# be committed
+RESERVATION_TTL = 600
+
+# Escape character of LIKE patterns built by escape_like()
+LIKE_ESCAPE = '\\'
+
+
+class NameFormat(NamedTuple):
+    prefix: str
+    width: int
+    suffix: str
+
+
+def parse_name_format(name_format: Optional[str]) -> Optional[NameFormat]:
+    """Return parsed name format or None if it has no (single) '#N' token
+    """
+
+    if not name_format:
+        return None
+
+    tokens = NAME_FORMAT_TOKEN.findall(name_format)
+    if len(tokens) != 1:
+        return None
+
+    prefix, suffix = NAME_FORMAT_TOKEN.split(name_format)[::2]
+
+    return NameFormat(prefix, len(tokens[0]), suffix)
+
+
+def escape_like(value: str) -> str:
+    """Return value with LIKE wildcards escaped (using LIKE_ESCAPE)"""
+
+    return re.sub(r'([%_\\])', r'\\\1', value)
+
+
+def get_name_index(name_format: NameFormat, hostname: str) -> Optional[int]:
+    """Return index of host name generated from name format, or None"""
+
+    match = re.match(
+        r'{}(\d+){}(-[a-z]{{{}}})?$'.format(
+            re.escape(name_format.prefix),
+            re.escape(name_format.suffix),
+            RANDOM_SUFFIX_LENGTH
+        ),
+        hostname
+    )
+
+    return int(match.group(1)) if match else None
+
+
+def allocate_node_names(name_format: NameFormat, count: int,
+                        existing: Iterable[str], *,
+                        start: Optional[int] = None,
+                        randomize: bool = False,
+                        domain: Optional[str] = None,
+                        rng: random.Random = None) -> List[str]:
+    """
+    Return 'count' unique node names
+
+    Indexes start at 'start' (the index of the name generated by Tortuga
+    for the next node), or after the highest index in use by 'existing'
+    node names (which may be host names or FQDNs). Indexes in use are
+    skipped. If 'randomize' is set, a random suffix is appended to every
+    host name.
+    """
+
+    rng = rng or random.Random()
+
+    existing_hostnames = {name.split('.', 1)[0] for name in existing}
+
+    indexes = {
+        index for index in (
+            get_name_index(name_format, hostname)
+            for hostname in existing_hostnames
+        ) if index is not None
+    }
+
+    next_index = start if start is not None else \
+        max(indexes, default=0) + 1
+
+    result = []
+
+    while len(result) < count:
+        index = next_index
+
+        next_index += 1
+
+        if index in indexes:
+            continue
+
+        hostname = '{}{:0{}d}{}'.format(
+            name_format.prefix, index, name_format.width,
+            name_format.suffix)
+
+        if randomize:
+            hostname += '-' + ''.join(
+                rng.choice(string.ascii_lowercase)
+                for _ in range(RANDOM_SUFFIX_LENGTH))
+
+        if hostname in existing_hostnames:
+            continue
+
+        existing_hostnames.add(hostname)
+
+        result.append(
+            '{}.{}'.format(hostname, domain) if domain else hostname)
+
+    return result
+
+
+class NameReservations:
+    """
+    Node names allocated in this process that may not have been committed
+    yet. Allocation, reservation and release are serialized using 'lock',
+    so concurrent requests do not allocate the same names.
+
+    Names are released once the nodes have been committed (or the commit
+    failed). Names of requests that fail before that expire after 'ttl'
+    seconds.
+    """
+
+    def __init__(self, ttl: float = RESERVATION_TTL):
+        self.ttl = ttl
+
+        self.lock = threading.Lock()
+
+        # name -> time reserved
+        self._names: Dict[str, float] = {}
+
+    def names(self) -> List[str]:
+        """Return names reserved during the last 'ttl' seconds"""
+
+        now = time.monotonic()
+
+        self._names = {
+            name: reserved for name, reserved in self._names.items()
+            if now - reserved < self.ttl
+        }
+
+        return list(self._names)
+
+    def reserve(self, names: Iterable[str]) -> None:
+        now = time.monotonic()
+
+        self._names.update((name, now) for name in names)
+
+    def release(self, names: Iterable[str]) -> None:
+        for name in names:
+            self._names.pop(name, None)
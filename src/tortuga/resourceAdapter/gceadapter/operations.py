@@ -0,0 +1,274 @@
+# Copyright 2008-2018 Univa Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import logging
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+OperationCallback = Callable[[str, dict], None]
+
+FetchFunction = Callable[[], dict]
+
+
+def make_operation_handle(project: str, zone: Optional[str],
+                          operation_name: str) -> str:
+    """Return opaque handle for a Compute Engine operation
+
+    Handles are in the same form as cloud server ids:
+
+        gcp:<project>:<zone>:<operation-name>
+
+    Global operations use an empty zone.
+    """
+
+    return 'gcp:{}:{}:{}'.format(project, zone or '', operation_name)
+
+
+def parse_operation_handle(handle: str) -> Tuple[str, Optional[str], str]:
+    """Return (project, zone, operation name) from operation handle
+
+    :raises ValueError: malformed handle
+    """
+
+    id_parts = handle.split(':')
+    if len(id_parts) != 4 or id_parts[0].lower() not in ('gcp', 'gce'):
+        raise ValueError('Invalid operation id: {}'.format(handle))
+
+    return id_parts[1], id_parts[2] or None, id_parts[3]
+
+
+def fetch_operation(svc, project: str, zone: Optional[str],
+                    operation_name: str) -> dict:
+    """Return zone operation, or global operation if zone is None"""
+
+    if zone:
+        return svc.zoneOperations().get(
+            project=project, zone=zone, operation=operation_name
+        ).execute()
+
+    return svc.globalOperations().get(
+        project=project, operation=operation_name
+    ).execute()
+
+
+class OperationCache:
+    """
+    Thread-safe cache of Compute Engine operations started on behalf of
+    callers that do not wait for completion.
+
+    Entries are refreshed from GCE at most once every 'refresh_interval'
+    seconds, regardless of how often clients poll, and are evicted 'ttl'
+    seconds after they were added, whether or not the operation has
+    completed.
+
+    Operations with subscribers are refreshed by a background poller
+    thread (using the 'fetch' function given for the operation), so
+    completion callbacks fire without clients polling for status. The
+    poller exits when no subscriptions are left.
+    """
+
+    def __init__(self, *, ttl: int = 3600, refresh_interval: int = 5):
+        self.ttl = ttl
+        self.refresh_interval = refresh_interval
+
+        self._lock = threading.Lock()
+        self._operations: Dict[str, dict] = {}
+        self._subscribers: Dict[str, List[OperationCallback]] = {}
+        self._poller: Optional[threading.Thread] = None
+
+    def add(self, handle: str, operation: dict, *,
+            fetch: Optional[FetchFunction] = None) -> None:
+        with self._lock:
+            self._expire()
+
+            self._operations[handle] = {
+                'operation': operation,
+                'fetch': fetch,
+                'created': time.monotonic(),
+                'refreshed': time.monotonic(),
+                'completed': None,
+            }
+
+        if operation.get('status') == 'DONE':
+            self._complete(handle, operation)
+
+    def get(self, handle: str) -> Optional[dict]:
+        with self._lock:
+            self._expire()
+
+            entry = self._operations.get(handle)
+
+            return entry['operation'] if entry else None
+
+    def needs_refresh(self, handle: str) -> bool:
+        """Return True if cached operation is not DONE and the cached copy is
+        older than the refresh interval
+        """
+
+        with self._lock:
+            self._expire()
+
+            entry = self._operations.get(handle)
+
+            return entry is None or self._is_stale(entry)
+
+    def get_current(self, handle: str) -> Optional[dict]:
+        """Return cached operation, or None if it is unknown or needs to
+        be refreshed (see needs_refresh())
+        """
+
+        with self._lock:
+            self._expire()
+
+            entry = self._operations.get(handle)
+            if entry is None or self._is_stale(entry):
+                return None
+
+            return entry['operation']
+
+    def _is_stale(self, entry: dict) -> bool:
+        if entry['operation'].get('status') == 'DONE':
+            return False
+
+        return time.monotonic() - entry['refreshed'] >= \
+            self.refresh_interval
+
+    def update(self, handle: str, operation: dict, *,
+               fetch: Optional[FetchFunction] = None) -> None:
+        with self._lock:
+            self._expire()
+
+            entry = self._operations.setdefault(handle, {
+                'fetch': None,
+                'created': time.monotonic(),
+                'completed': None,
+            })
+
+            entry['operation'] = operation
+            entry['refreshed'] = time.monotonic()
+
+            if fetch is not None:
+                entry['fetch'] = fetch
+
+        if operation.get('status') == 'DONE':
+            self._complete(handle, operation)
+
+    def subscribe(self, handle: str, callback: OperationCallback) -> None:
+        """Register callback to be called once the operation is DONE
+
+        The callback is called immediately if the operation has already
+        completed.
+
+        :raises KeyError: operation not in cache (unknown or expired)
+        """
+
+        with self._lock:
+            self._expire()
+
+            entry = self._operations.get(handle)
+            if entry is None:
+                raise KeyError(handle)
+
+            if entry['completed'] is None:
+                self._subscribers.setdefault(handle, []).append(callback)
+
+                if self._poller is None:
+                    self._poller = threading.Thread(
+                        target=self._poll, name='gce-operation-poller',
+                        daemon=True)
+
+                    self._poller.start()
+
+                return
+
+            operation = entry['operation']
+
+        self._notify(callback, handle, operation)
+
+    def poll_once(self) -> int:
+        """Refresh operations with subscribers; return number refreshed"""
+
+        now = time.monotonic()
+
+        with self._lock:
+            self._expire()
+
+            due = [
+                (handle, self._operations[handle]['fetch'])
+                for handle in self._subscribers
+                if self._operations[handle]['fetch'] is not None and
+                now - self._operations[handle]['refreshed'] >=
+                self.refresh_interval
+            ]
+
+        for handle, fetch in due:
+            try:
+                operation = fetch()
+            except Exception as ex:  # noqa pylint: disable=broad-except
+                logger.warning(
+                    'Error refreshing operation [%s]: %s', handle, ex)
+
+                continue
+
+            self.update(handle, operation)
+
+        return len(due)
+
+    def _poll(self) -> None:
+        while True:
+            time.sleep(self.refresh_interval)
+
+            with self._lock:
+                if not self._subscribers:
+                    self._poller = None
+
+                    return
+
+            self.poll_once()
+
+    def _complete(self, handle: str, operation: dict) -> None:
+        with self._lock:
+            entry = self._operations.get(handle)
+            if entry is not None and entry['completed'] is None:
+                entry['completed'] = time.monotonic()
+
+            callbacks = self._subscribers.pop(handle, [])
+
+        for callback in callbacks:
+            self._notify(callback, handle, operation)
+
+    def _notify(self, callback: OperationCallback, handle: str,
+                operation: dict) -> None: \
+            # pylint: disable=no-self-use
+        try:
+            callback(handle, operation)
+        except Exception:  # noqa pylint: disable=broad-except
+            logger.exception(
+                'Error in completion callback for operation [%s]', handle)
+
+    def _expire(self) -> None:
+        # must be called with lock held
+        now = time.monotonic()
+
+        for handle in [handle for handle, entry in self._operations.items()
+                       if now - entry['created'] > self.ttl]:
+            del self._operations[handle]
+
+            if self._subscribers.pop(handle, None):
+                logger.warning(
+                    'Operation [%s] expired before completing', handle)
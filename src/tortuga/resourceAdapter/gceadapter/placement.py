@@ -0,0 +1,148 @@
+# Copyright 2008-2018 Univa Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+
+
+# Compute Engine error codes indicating the zone is out of capacity. VM
+# launches failing with one of these are retried in another zone.
+ZONE_CAPACITY_ERRORS = (
+    'ZONE_RESOURCE_POOL_EXHAUSTED',
+    'ZONE_RESOURCE_POOL_EXHAUSTED_WITH_DETAILS',
+)
+
+
+def is_zone_capacity_error(result: Optional[dict]) -> bool:
+    """Return True if failed operation result reports a zone capacity error
+    """
+
+    if not result or 'error' not in result:
+        return False
+
+    return any(error.get('code') in ZONE_CAPACITY_ERRORS
+               for error in result['error'].get('errors', []))
+
+
+class ZonePlacementEngine:
+    """
+    Spreads VM launches over candidate zones.
+
+    Each zone has a score, an exponentially weighted moving average of
+    recent launch outcomes (1.0 = every launch succeeded). Zones that have
+    not been used yet start with a perfect score. Launches are distributed
+    in proportion to zone scores. A zone reporting a capacity error is
+    additionally avoided for 'cooldown' seconds, unless no other zone is
+    available.
+    """
+
+    def __init__(self, *, decay: float = 0.8, min_score: float = 0.05,
+                 cooldown: int = 300):
+        self.decay = decay
+        self.min_score = min_score
+        self.cooldown = cooldown
+
+        self._lock = threading.Lock()
+        self._scores: Dict[str, float] = {}
+        self._exhausted_until: Dict[str, float] = {}
+
+    def record(self, zone: str, success: bool, *,
+               capacity_error: bool = False) -> None:
+        """Record outcome of VM launch in zone"""
+
+        with self._lock:
+            score = self._scores.get(zone, 1.0) * self.decay
+
+            if success:
+                score += 1.0 - self.decay
+
+                self._exhausted_until.pop(zone, None)
+            elif capacity_error:
+                self._exhausted_until[zone] = \
+                    time.monotonic() + self.cooldown
+
+            self._scores[zone] = score
+
+    def success_rate(self, zone: str) -> float:
+        with self._lock:
+            return self._scores.get(zone, 1.0)
+
+    def _weight(self, zone: str, now: float) -> float:
+        # must be called with lock held
+        if self._exhausted_until.get(zone, 0) > now:
+            return 0.0
+
+        return max(self._scores.get(zone, 1.0), self.min_score)
+
+    def plan(self, zones: List[str], count: int) -> List[str]:
+        """Return list of 'count' zones, one per VM to be launched"""
+
+        if not zones or count <= 0:
+            return []
+
+        with self._lock:
+            now = time.monotonic()
+
+            weights = [self._weight(zone, now) for zone in zones]
+
+        if not any(weights):
+            # every zone recently ran out of capacity; try all of them
+            weights = [1.0] * len(zones)
+
+        total = sum(weights)
+
+        # largest remainder apportionment
+        quotas = [count * weight / total for weight in weights]
+        allocation = [int(quota) for quota in quotas]
+
+        by_remainder = sorted(
+            range(len(zones)),
+            key=lambda idx: (quotas[idx] - allocation[idx], weights[idx]),
+            reverse=True
+        )
+
+        for idx in by_remainder[:count - sum(allocation)]:
+            allocation[idx] += 1
+
+        # interleave zones so that a partial batch is still spread out
+        result: List[str] = []
+
+        while len(result) < count:
+            for idx, zone in enumerate(zones):
+                if allocation[idx]:
+                    allocation[idx] -= 1
+                    result.append(zone)
+
+        return result
+
+    def next_zone(self, zones: List[str],
+                  exclude: Iterable[str] = ()) -> Optional[str]:
+        """Return best scoring zone not in 'exclude', or None; zones that
+        recently ran out of capacity are not returned
+        """
+
+        exclude = set(exclude)
+
+        with self._lock:
+            now = time.monotonic()
+
+            candidates = [(weight, zone) for weight, zone in (
+                (self._weight(zone, now), zone)
+                for zone in zones if zone not in exclude) if weight > 0]
+
+        if not candidates:
+            return None
+
+        return max(candidates, key=lambda candidate: candidate[0])[1]
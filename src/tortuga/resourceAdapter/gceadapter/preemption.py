@@ -0,0 +1,290 @@
+# Copyright 2008-2018 Univa Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import datetime
+import logging
+import os.path
+import time
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy.orm import joinedload
+from sqlalchemy.orm.session import Session
+
+from tortuga.db.models.instanceMapping import InstanceMapping
+from tortuga.db.models.instanceMetadata import InstanceMetadata
+from tortuga.db.models.node import Node
+
+
+logger = logging.getLogger(__name__)
+
+PREEMPTED_OPERATION_TYPE = 'compute.instances.preempted'
+
+# InstanceMetadata key marking nodes backed by preempted VMs (value is
+# the epoch time of the preemption). The VM still exists (in TERMINATED
+# state) and can be restarted; the marker is removed by Gce.startupNode().
+PREEMPTED_KEY = 'gcp:preempted'
+
+PreemptedCallback = Callable[[List[Node]], None]
+
+
+def parse_timestamp(value: str) -> Optional[float]:
+    """Return RFC3339 timestamp reported by Compute Engine as epoch time
+    """
+
+    try:
+        if value.endswith('Z'):
+            base, tz = value[:-1], datetime.timezone.utc
+        else:
+            base, offset = value[:-6], value[-6:]
+
+            if offset[0] not in '+-':
+                return None
+
+            hours, minutes = offset[1:].split(':')
+
+            delta = datetime.timedelta(
+                hours=int(hours), minutes=int(minutes))
+
+            tz = datetime.timezone(delta if offset[0] == '+' else -delta)
+
+        fmt = '%Y-%m-%dT%H:%M:%S.%f' if '.' in base else '%Y-%m-%dT%H:%M:%S'
+
+        return datetime.datetime.strptime(base, fmt).replace(
+            tzinfo=tz).timestamp()
+    except (ValueError, IndexError):
+        return None
+
+
+def get_operation_timestamp(operation: dict) -> Optional[float]:
+    return parse_timestamp(
+        operation.get('endTime') or operation.get('insertTime') or '')
+
+
+def get_instance_mapping_column() -> str:
+    """Return name of InstanceMetadata attribute referencing
+    InstanceMapping
+    """
+
+    (_, remote), = InstanceMapping.instance_metadata.property.\
+        local_remote_pairs
+
+    return remote.key
+
+
+class PreemptionWatcher:
+    """
+    Detects preempted VMs by listing 'compute.instances.preempted' zone
+    operations in every project and zone containing preemptible nodes
+    (according to InstanceMetadata).
+
+    Affected nodes are marked in one database commit per pass. If
+    'on_preempted' is set, it is called with the preempted nodes, for
+    example to restart them or to request replacement capacity.
+
+    Each pass lists operations (newest first) back to 'lookback' seconds
+    before the previous pass; older preemptions are ignored, as the VM
+    may have been restarted since. Operation ids are remembered for the
+    same period only.
+
+    stats['detection_latency'] holds the delay between GCE preempting a
+    VM and the watcher noticing it, for the most recent pass.
+    """
+
+    def __init__(self, adapter, dbSession: Session, *,
+                 on_preempted: Optional[PreemptedCallback] = None,
+                 lookback: int = 600):
+        self._adapter = adapter
+        self._session = dbSession
+        self._on_preempted = on_preempted
+        self._lookback = lookback
+        self._since = time.time() - lookback
+
+        # operation id -> time of operations already processed
+        self._seen: Dict[str, float] = {}
+
+        self.stats = {
+            'passes': 0,
+            'operations_listed': 0,
+            'preempted': 0,
+            'detection_latency': [],
+            'last_pass_duration': None,
+        }
+
+    def get_locations(self) -> Dict[str, Set[Tuple[str, str]]]:
+        """Return {profile: {(project, zone), ...}} of preemptible nodes"""
+
+        mappings = self._session.query(InstanceMapping).join(
+            InstanceMapping.instance_metadata
+        ).filter(
+            InstanceMetadata.key == 'gcp:scheduling',
+            InstanceMetadata.value == 'preemptible'
+        ).options(
+            joinedload(InstanceMapping.instance_metadata),
+            joinedload(InstanceMapping.resource_adapter_configuration)
+        ).all()
+
+        locations: Dict[str, Set[Tuple[str, str]]] = {}
+
+        for mapping in mappings:
+            if mapping.resource_adapter_configuration is None:
+                continue
+
+            md = {item.key: item.value for item in mapping.instance_metadata}
+            if 'project' not in md or 'zone' not in md:
+                continue
+
+            locations.setdefault(
+                mapping.resource_adapter_configuration.name, set()
+            ).add((md['project'], md['zone']))
+
+        return locations
+
+    def list_preempted(self, svc, project: str, zone: str) -> List[dict]:
+        """Return preempted operations in zone not seen before"""
+
+        result = []
+
+        request = svc.zoneOperations().list(
+            project=project,
+            zone=zone,
+            filter='operationType = "{}"'.format(PREEMPTED_OPERATION_TYPE),
+            orderBy='creationTimestamp desc'
+        )
+
+        while request is not None:
+            response = request.execute()
+
+            for operation in response.get('items', []):
+                self.stats['operations_listed'] += 1
+
+                timestamp = get_operation_timestamp(operation)
+                if timestamp is not None and timestamp < self._since:
+                    # remaining operations are older
+                    return result
+
+                if operation['id'] in self._seen:
+                    continue
+
+                self._seen[operation['id']] = timestamp \
+                    if timestamp is not None else time.time()
+
+                result.append(operation)
+
+            request = svc.zoneOperations().list_next(
+                previous_request=request, previous_response=response)
+
+        return result
+
+    def run_once(self) -> List[Node]:
+        """Check all locations once; return newly preempted nodes"""
+
+        start = time.time()
+
+        operations = []
+
+        for profile, locations in self.get_locations().items():
+            svc = self._adapter.get_gce_session(profile)['connection'].svc
+
+            for project, zone in sorted(locations):
+                try:
+                    operations.extend(
+                        self.list_preempted(svc, project, zone))
+                except Exception:  # noqa pylint: disable=broad-except
+                    logger.exception(
+                        'Error listing operations in project [%s] zone [%s]',
+                        project, zone
+                    )
+
+        nodes = self.mark_preempted(operations)
+
+        now = time.time()
+
+        # the next pass lists operations back to 'lookback' seconds before
+        # this one; operations older than that are not listed again
+        self._since = max(self._since, start - self._lookback)
+
+        self._seen = {
+            operation_id: timestamp
+            for operation_id, timestamp in self._seen.items()
+            if timestamp >= self._since
+        }
+
+        latencies = []
+        for operation in operations:
+            timestamp = get_operation_timestamp(operation)
+            if timestamp is not None:
+                latencies.append(now - timestamp)
+
+        self.stats['passes'] += 1
+        self.stats['preempted'] += len(nodes)
+        self.stats['detection_latency'] = latencies
+        self.stats['last_pass_duration'] = now - start
+
+        if nodes and self._on_preempted is not None:
+            self._on_preempted(nodes)
+
+        return nodes
+
+    def mark_preempted(self, operations: List[dict]) -> List[Node]:
+        """Mark nodes backed by preempted VMs using one bulk insert of
+        PREEMPTED_KEY metadata and one commit
+
+        Nodes already marked are skipped; the marker is removed when they
+        are restarted.
+        """
+
+        preempted: Dict[str, float] = {}
+
+        for operation in operations:
+            if not operation.get('targetLink'):
+                continue
+
+            timestamp = get_operation_timestamp(operation)
+
+            preempted[os.path.basename(operation['targetLink'])] = \
+                timestamp if timestamp is not None else time.time()
+
+        if not preempted:
+            return []
+
+        mappings = self._session.query(InstanceMapping).filter(
+            InstanceMapping.instance.in_(preempted.keys()),
+            ~InstanceMapping.instance_metadata.any(
+                InstanceMetadata.key == PREEMPTED_KEY)
+        ).options(joinedload(InstanceMapping.node)).all()
+
+        if not mappings:
+            return []
+
+        nodes = [mapping.node for mapping in mappings]
+
+        logger.info(
+            'Detected %d preempted node(s): %s',
+            len(nodes), ' '.join(node.name for node in nodes)
+        )
+
+        column = get_instance_mapping_column()
+
+        self._session.bulk_insert_mappings(InstanceMetadata, [
+            {
+                column: mapping.id,
+                'key': PREEMPTED_KEY,
+                'value': str(int(preempted[mapping.instance])),
+            }
+            for mapping in mappings
+        ])
+
+        self._session.commit()
+
+        return nodes
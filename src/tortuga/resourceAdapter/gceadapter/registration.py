@@ -0,0 +1,255 @@
+# Copyright 2008-2018 Univa Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import contextlib
+import threading
+import time
+from typing import (Any, Callable, Dict, Hashable, Iterator, List,
+                    Optional)
+
+from tortuga.exceptions.operationFailed import OperationFailed
+
+
+#: Seconds the first request of a batch waits for others to join
+DEFAULT_BATCH_WINDOW = 0.05
+
+#: Maximum number of requests per batch
+DEFAULT_MAX_BATCH = 50
+
+#: Default maximum number of concurrently processed registrations
+DEFAULT_MAX_CONCURRENT = 20
+
+#: Default number of seconds a registration may wait for admission; by
+#: default registrations beyond the limit are rejected immediately
+DEFAULT_MAX_WAIT = 0
+
+#: Upper bound (seconds) on the admission wait; registrations are handled
+#: by web service workers, which must not be held up
+MAX_WAIT = 1.0
+
+BatchFunction = Callable[[Dict[str, Any]], Dict[str, Any]]
+
+
+class _Batch:
+    def __init__(self):
+        self.items: Dict[str, Any] = {}
+        self.full = threading.Event()
+        self.done = threading.Event()
+        self.result: Dict[str, Any] = {}
+        self.error: Optional[Exception] = None
+
+
+class MicroBatcher:
+    """
+    Combines concurrent requests for the same key (for example, VM lookups
+    in one project and zone) into a single call.
+
+    The first request for a key opens a batch and waits up to 'window'
+    seconds (or until 'max_batch' requests have joined) before calling the
+    batch function with all items, on behalf of every request in the
+    batch. The batch function returns results keyed by item name. If it
+    raises, the exception is raised in every request of the batch.
+    """
+
+    def __init__(self, *, window: float = DEFAULT_BATCH_WINDOW,
+                 max_batch: int = DEFAULT_MAX_BATCH):
+        self.window = window
+        self.max_batch = max_batch
+
+        self._lock = threading.Lock()
+        self._open: Dict[Hashable, _Batch] = {}
+
+        self.stats = {
+            'requests': 0,
+            'batches': 0,
+        }
+
+    def submit(self, key: Hashable, name: str, item: Any,
+               func: BatchFunction) -> Any:
+        """Add item to open batch for key; return result for 'name'"""
+
+        with self._lock:
+            self.stats['requests'] += 1
+
+            batch = self._open.get(key)
+
+            leader = batch is None
+            if leader:
+                batch = _Batch()
+                self._open[key] = batch
+
+            batch.items[name] = item
+
+            if len(batch.items) >= self.max_batch:
+                # close batch; later requests open a new one
+                del self._open[key]
+
+                batch.full.set()
+
+        if leader:
+            self._run(key, batch, func)
+        else:
+            batch.done.wait()
+
+        if batch.error is not None:
+            raise batch.error
+
+        return batch.result.get(name)
+
+    def _run(self, key: Hashable, batch: _Batch,
+             func: BatchFunction) -> None:
+        batch.full.wait(self.window)
+
+        with self._lock:
+            if self._open.get(key) is batch:
+                del self._open[key]
+
+            self.stats['batches'] += 1
+
+        try:
+            batch.result = func(batch.items)
+        except Exception as ex:  # pylint: disable=broad-except
+            batch.error = ex
+        finally:
+            batch.done.set()
+
+
+class RegistrationThrottled(OperationFailed):
+    """
+    Raised when a registration is not admitted in time. The retry delay
+    (seconds) is available as 'retry_after', for the webservice to return
+    as Retry-After header or 'retry_after' field of the error response.
+    """
+
+    def __init__(self, retry_after: int):
+        super().__init__(
+            'Too many concurrent node registrations;'
+            ' retry after {} seconds'.format(retry_after))
+
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Bounds the number of concurrently processed node registrations.
+
+    Registrations beyond 'max_concurrent' are rejected with
+    RegistrationThrottled, after waiting at most 'max_wait' seconds (no
+    more than MAX_WAIT) for a slot. The retry delay is estimated from the
+    number of rejected registrations still due to retry and the average
+    registration time, so that retries of a boot storm are spread out at
+    the rate the adapter can handle.
+    """
+
+    def __init__(self, *, max_concurrent: int = DEFAULT_MAX_CONCURRENT,
+                 max_wait: float = DEFAULT_MAX_WAIT,
+                 min_retry_after: int = 1, max_retry_after: int = 120):
+        self.max_concurrent = max_concurrent
+        self.max_wait = min(max_wait, MAX_WAIT)
+        self.min_retry_after = min_retry_after
+        self.max_retry_after = max_retry_after
+
+        self._cond = threading.Condition()
+        self._active = 0
+        self._avg_duration: Optional[float] = None
+
+        # times rejected registrations were asked to retry at
+        self._retries: List[float] = []
+
+        self.stats = {
+            'admitted': 0,
+            'throttled': 0,
+            'max_queue_wait': 0.0,
+        }
+
+    def configure(self, *, max_concurrent: Optional[int] = None,
+                  max_wait: Optional[float] = None) -> None:
+        with self._cond:
+            if max_concurrent is not None:
+                self.max_concurrent = max(1, max_concurrent)
+
+            if max_wait is not None:
+                self.max_wait = min(max_wait, MAX_WAIT)
+
+            # limit may have been raised
+            self._cond.notify_all()
+
+    def get_retry_after(self) -> int:
+        """Return estimated seconds until a new registration is admitted
+        """
+
+        with self._cond:
+            return self._get_retry_after(time.monotonic())
+
+    def _get_retry_after(self, now: float) -> int:
+        # must be called with lock held
+        self._retries = [due for due in self._retries if due > now]
+
+        avg_duration = self._avg_duration or 1.0
+
+        estimate = (len(self._retries) + 1) * avg_duration / \
+            self.max_concurrent
+
+        return int(min(max(estimate, self.min_retry_after),
+                       self.max_retry_after))
+
+    @contextlib.contextmanager
+    def admit(self) -> Iterator[None]:
+        """
+        Raises:
+            RegistrationThrottled
+        """
+
+        start = time.monotonic()
+        deadline = start + self.max_wait
+
+        with self._cond:
+            while self._active >= self.max_concurrent:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+
+                self._cond.wait(remaining)
+
+            now = time.monotonic()
+
+            if self._active >= self.max_concurrent:
+                self.stats['throttled'] += 1
+
+                retry_after = self._get_retry_after(now)
+
+                self._retries.append(now + retry_after)
+
+                raise RegistrationThrottled(retry_after)
+
+            self._active += 1
+            self.stats['admitted'] += 1
+            self.stats['max_queue_wait'] = max(
+                self.stats['max_queue_wait'], now - start)
+
+        started = time.monotonic()
+
+        try:
+            yield
+        finally:
+            duration = time.monotonic() - started
+
+            with self._cond:
+                self._active -= 1
+
+                self._avg_duration = duration \
+                    if self._avg_duration is None \
+                    else 0.8 * self._avg_duration + 0.2 * duration
+
+                self._cond.notify()
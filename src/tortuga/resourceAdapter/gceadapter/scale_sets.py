@@ -0,0 +1,171 @@
+# Copyright 2008-2018 Univa Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import contextlib
+import fcntl
+import json
+import os
+import tempfile
+from typing import Any, Dict, Iterator, NamedTuple, Optional, Tuple
+
+
+#: Name of scale set location file (in the Tortuga 'var' directory)
+LOCATIONS_FILENAME = 'gce-scale-sets.json'
+
+#: Name of lock file serializing use and deletion of shared instance
+#: templates (in the Tortuga 'var' directory)
+TEMPLATES_LOCK_FILENAME = 'gce-instance-templates.lock'
+
+
+@contextlib.contextmanager
+def file_lock(path: str) -> Iterator[None]:
+    """Hold exclusive lock on file; serializes all processes and threads
+    locking the same path
+    """
+
+    with open(path, 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+
+        yield
+
+
+class ScaleSetLocation(NamedTuple):
+    """Kind (regional or zonal) and region or zone of a managed instance
+    group
+    """
+    regional: bool
+    location: str
+
+
+def parse_scope(scope: str) -> Optional[ScaleSetLocation]:
+    """Return location of 'zones/<zone>' or 'regions/<region>' scope of
+    aggregatedList() responses
+    """
+
+    kind, _, name = scope.partition('/')
+
+    if kind == 'regions' and name:
+        return ScaleSetLocation(regional=True, location=name)
+
+    if kind == 'zones' and name:
+        return ScaleSetLocation(regional=False, location=name)
+
+    return None
+
+
+def find_scale_set_location(svc, project: str,
+                            igm_name: str) -> Optional[ScaleSetLocation]:
+    """Return location of managed instance group in any zone or region,
+    or None if it does not exist
+    """
+
+    request = svc.instanceGroupManagers().aggregatedList(
+        project=project, filter='name = "{}"'.format(igm_name))
+
+    while request is not None:
+        response = request.execute()
+
+        for scope, scoped_list in response.get('items', {}).items():
+            for igm in scoped_list.get('instanceGroupManagers', []):
+                if igm.get('name') == igm_name:
+                    return parse_scope(scope)
+
+        request = svc.instanceGroupManagers().aggregatedList_next(
+            previous_request=request, previous_response=response)
+
+    return None
+
+
+def get_igm_api(svc, project: str, location: ScaleSetLocation) \
+        -> Tuple[Any, Dict[str, str]]:
+    """Return managed instance group collection and location arguments"""
+
+    if location.regional:
+        return svc.regionInstanceGroupManagers(), {
+            'project': project,
+            'region': location.location,
+        }
+
+    return svc.instanceGroupManagers(), {
+        'project': project,
+        'zone': location.location,
+    }
+
+
+class ScaleSetLocationStore:
+    """
+    Locations of managed instance groups backing scale sets, recorded when
+    scale sets are created. Scale sets keep their location when the
+    'scale_set_regional' setting of their profile is changed.
+
+    The file is shared by all processes; updates are serialized using an
+    exclusive lock on '<path>.lock'.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    @staticmethod
+    def _key(project: str, igm_name: str) -> str:
+        return '{}/{}'.format(project, igm_name)
+
+    def _load(self) -> Dict[str, list]:
+        try:
+            with open(self.path) as fp:
+                data = json.load(fp)
+        except (OSError, ValueError):
+            return {}
+
+        return data if isinstance(data, dict) else {}
+
+    def _save(self, data: Dict[str, list]) -> None:
+        fd, tmpname = tempfile.mkstemp(
+            dir=os.path.dirname(self.path) or '.', prefix='.scale-sets-')
+
+        try:
+            with os.fdopen(fd, 'w') as fp:
+                json.dump(data, fp)
+
+            os.chmod(tmpname, 0o644)
+
+            os.rename(tmpname, self.path)
+        except Exception:
+            os.unlink(tmpname)
+
+            raise
+
+    def _update(self, key: str, value: Optional[list]) -> None:
+        with file_lock(self.path + '.lock'):
+            data = self._load()
+
+            if value is None:
+                if data.pop(key, None) is None:
+                    return
+            else:
+                data[key] = value
+
+            self._save(data)
+
+    def get(self, project: str,
+            igm_name: str) -> Optional[ScaleSetLocation]:
+        value = self._load().get(self._key(project, igm_name))
+
+        return ScaleSetLocation(*value) if value else None
+
+    def set(self, project: str, igm_name: str,
+            location: ScaleSetLocation) -> None:
+        self._update(self._key(project, igm_name), list(location))
+
+    def discard(self, project: str, igm_name: str) -> None:
+        self._update(self._key(project, igm_name), None)
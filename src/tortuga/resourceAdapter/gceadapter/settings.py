@@ -19,6 +19,18 @@ from tortuga.resourceAdapterConfiguration import settings
 # avoid thrashing
 DEFAULT_SLEEP_TIME = 5
 
+
+class PercentageSetting(settings.IntegerSetting):
+    """Integer setting in the range 0-100"""
+
+    def validate(self, value):
+        super().validate(value)
+
+        if not 0 <= int(value) <= 100:
+            raise settings.SettingValidationError(
+                'Percentage must be between 0 and 100: {}'.format(value))
+
+
 GROUP_INSTANCES = {
     'group': 'Instances',
     'group_order': 0
@@ -39,6 +51,10 @@ GROUP_PREEMPTIBLE = {
     'group': 'Preemptible',
     'group_order': 4
 }
+GROUP_SCALE_SETS = {
+    'group': 'Scale Sets',
+    'group_order': 5
+}
 GROUP_COST = {
     'group': 'Cost Sync',
     'group_order': 9
@@ -60,6 +76,17 @@ SETTINGS = {
         description='Zone in which compute resources are created',
         **GROUP_INSTANCES
     ),
+    'zones': settings.StringSetting(
+        display_name='Zones',
+        description='Candidate zones in which compute nodes are created. '
+                    'Nodes are spread over these zones based on recent '
+                    'launch success, and launches failing due to lack of '
+                    'zone capacity are retried in other zones. All zones '
+                    'must be in the same region as "zone". Defaults to '
+                    '"zone".',
+        list=True,
+        **GROUP_INSTANCES
+    ),
     'type': settings.StringSetting(
         display_name='Type',
         required=True,
@@ -141,6 +168,63 @@ SETTINGS = {
         default='True',
         **GROUP_INSTANCES
     ),
+    'reuse_instance_templates': settings.BooleanSetting(
+        display_name='Reuse Instance Templates',
+        description='Share instance templates between scale sets with '
+                    'identical settings. Templates are named after a hash '
+                    'of their content and deleted when no longer used.',
+        default='False',
+        **GROUP_INSTANCES
+    ),
+    'best_effort_launch': settings.BooleanSetting(
+        display_name='Best-effort Launch',
+        description='Return the nodes that launched successfully instead '
+                    'of failing the request when some VMs fail to launch',
+        default='False',
+        **GROUP_INSTANCES
+    ),
+    'min_launch_success': PercentageSetting(
+        display_name='Minimum Launch Success',
+        description='Percentage of requested nodes that must launch '
+                    'successfully in best-effort mode. At least one node '
+                    'must launch.',
+        requires=['best_effort_launch'],
+        default='0',
+        **GROUP_INSTANCES
+    ),
+    'launch_top_up': settings.BooleanSetting(
+        display_name='Replace Failed Launches',
+        description='In best-effort mode, launch replacements for failed '
+                    'nodes before the request completes, until the '
+                    'requested count is reached',
+        requires=['best_effort_launch'],
+        default='False',
+        **GROUP_INSTANCES
+    ),
+    'launch_top_up_attempts': settings.IntegerSetting(
+        display_name='Replacement Attempts',
+        description='Maximum number of replacement rounds',
+        requires=['launch_top_up'],
+        default='3',
+        advanced=True,
+        **GROUP_INSTANCES
+    ),
+    'registration_concurrency': settings.IntegerSetting(
+        display_name='Registration Concurrency',
+        description='Maximum number of VM registrations (scale set VMs '
+                    'calling back into Tortuga) processed concurrently',
+        default='20',
+        advanced=True,
+        **GROUP_SCALE_SETS
+    ),
+    'registration_queue_timeout_ms': settings.IntegerSetting(
+        display_name='Registration Queue Timeout',
+        description='Milliseconds (at most 1000) a VM registration waits '
+                    'for admission before the VM is asked to retry later',
+        default='0',
+        advanced=True,
+        **GROUP_SCALE_SETS
+    ),
     'service_account_email': settings.StringSetting(
         display_name='Service Account Email',
         description='Email address of the service account to be '
@@ -222,6 +306,50 @@ SETTINGS = {
         display='Launch instances as preemptible.',
         **GROUP_PREEMPTIBLE
     ),
+    'preemptible_fraction': PercentageSetting(
+        display_name='Preemptible Fraction',
+        description='Percentage of the nodes in a preemptible add-nodes '
+                    'request that are launched as preemptible; the '
+                    'remaining nodes are launched as standard VMs. '
+                    'Defaults to 100.',
+        **GROUP_PREEMPTIBLE
+    ),
+    'preemptible_fallback': settings.BooleanSetting(
+        display_name='Preemptible Fallback',
+        description='Relaunch nodes that failed to launch as preemptible '
+                    'as standard VMs',
+        default='False',
+        **GROUP_PREEMPTIBLE
+    ),
+
+    #
+    # Scale sets
+    #
+    'scale_set_regional': settings.BooleanSetting(
+        display_name='Regional Scale Sets',
+        description='Create scale sets as regional managed instance groups '
+                    'spanning multiple zones of the region containing '
+                    '"zone"',
+        default='False',
+        **GROUP_SCALE_SETS
+    ),
+    'scale_set_zones': settings.StringSetting(
+        display_name='Scale Set Zones',
+        description='Zones over which regional scale set instances are '
+                    'distributed. All zones of the region are used if not '
+                    'set.',
+        requires=['scale_set_regional'],
+        list=True,
+        **GROUP_SCALE_SETS
+    ),
+    'scale_set_target_shape': settings.StringSetting(
+        display_name='Scale Set Target Shape',
+        description='Distribution of regional scale set instances across '
+                    'zones: EVEN, BALANCED, ANY or ANY_SINGLE_ZONE',
+        requires=['scale_set_regional'],
+        default='EVEN',
+        **GROUP_SCALE_SETS
+    ),
 
     #
     # Settings for Navops Launch 2.0
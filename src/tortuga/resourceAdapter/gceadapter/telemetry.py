@@ -0,0 +1,352 @@
+# Copyright 2008-2018 Univa Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import bisect
+import json
+import logging
+import time
+from typing import Dict, Hashable, Iterable, List, Optional, Tuple
+
+from sqlalchemy.orm import joinedload
+from sqlalchemy.orm.session import Session
+
+from tortuga.db.models.instanceMapping import InstanceMapping
+from tortuga.db.models.instanceMetadata import InstanceMetadata
+from tortuga.resourceAdapter.gceadapter.preemption import parse_timestamp
+
+
+logger = logging.getLogger(__name__)
+
+#: Boot phases reported by the startup script, in order
+BOOT_PHASES = (
+    'started',
+    'metadata_fetched',
+    'ca_trusted',
+    'registered',
+    'puppet_installed',
+    'puppet_done',
+)
+
+#: Guest attribute namespace and keys written by the startup script
+GUEST_ATTRIBUTE_NAMESPACE = 'tortuga'
+BOOT_PHASES_KEY = 'boot-phases'
+BOOTSTRAP_MODE_KEY = 'bootstrap-mode'
+BAKE_STATUS_KEY = 'bake-status'
+
+#: Bootstrap mode of VMs not reporting one
+DEFAULT_BOOTSTRAP_MODE = 'standard'
+
+#: InstanceMetadata keys holding seconds from VM creation to each phase
+METADATA_PREFIX = 'gcp:boot:'
+
+#: Set once telemetry of a VM has been collected
+COLLECTED_KEY = METADATA_PREFIX + 'collected'
+
+#: Bootstrap mode ('standard' or 'prebaked') reported by the startup script
+MODE_KEY = METADATA_PREFIX + 'mode'
+
+#: Time (epoch) the boot phases of a VM could first not be retrieved
+FIRST_ERROR_KEY = METADATA_PREFIX + 'first_error'
+
+#: VMs that did not complete booting within this many seconds of being
+#: created (or, if the VM cannot be retrieved, of the first failed check)
+#: are not checked again
+COLLECT_TIMEOUT = 3600
+
+#: Upper bounds (seconds) of histogram buckets
+BUCKETS = (10, 20, 30, 45, 60, 90, 120, 180, 240, 300, 450, 600, 900,
+           1200, 1800, 3600)
+
+
+def get_guest_attribute(response: dict, namespace: str,
+                        key: str) -> Optional[str]:
+    """Return value from instances().getGuestAttributes() response"""
+
+    for item in response.get('queryValue', {}).get('items', []):
+        if item.get('namespace') == namespace and item.get('key') == key:
+            return item.get('value')
+
+    return None
+
+
+def parse_boot_phases(value: str) -> Dict[str, float]:
+    """Return {phase: epoch time} reported by the startup script; unknown
+    phases and malformed values are ignored
+    """
+
+    try:
+        phases = json.loads(value)
+    except ValueError:
+        return {}
+
+    if not isinstance(phases, dict):
+        return {}
+
+    return {
+        phase: float(timestamp) for phase, timestamp in phases.items()
+        if phase in BOOT_PHASES and isinstance(timestamp, (int, float))
+    }
+
+
+def get_boot_latencies(created: float,
+                       phases: Dict[str, float]) -> Dict[str, float]:
+    """Return seconds from VM creation to each phase"""
+
+    return {
+        phase: round(max(timestamp - created, 0.0), 3)
+        for phase, timestamp in phases.items()
+    }
+
+
+class LatencyHistogram:
+    """Counts latencies in fixed buckets (see BUCKETS)"""
+
+    def __init__(self):
+        # last bucket counts latencies above the largest bound
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.max: Optional[float] = None
+
+    def add(self, value: float) -> None:
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.count += 1
+        self.max = value if self.max is None else max(self.max, value)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        """Return upper bound of bucket containing percentile; the
+        maximum for the overflow bucket
+        """
+
+        if not self.count:
+            return None
+
+        rank = pct / 100.0 * self.count
+
+        total = 0
+        for idx, count in enumerate(self.counts):
+            total += count
+
+            if count and total >= rank:
+                return float(BUCKETS[idx]) if idx < len(BUCKETS) \
+                    else self.max
+
+        return self.max
+
+
+def build_histograms(records: Iterable[Tuple[Hashable,
+                                             Dict[str, float]]]) \
+        -> Dict[Hashable, Dict[str, LatencyHistogram]]:
+    """Return {key: {phase: histogram}} from (key, latencies) records,
+    where key is, for example, a (profile, bootstrap mode) tuple
+    """
+
+    result: Dict[Hashable, Dict[str, LatencyHistogram]] = {}
+
+    for key, latencies in records:
+        histograms = result.setdefault(key, {})
+
+        for phase, value in latencies.items():
+            histograms.setdefault(phase, LatencyHistogram()).add(value)
+
+    return result
+
+
+class BootTelemetryCollector:
+    """
+    Copies boot phases reported by the startup script (through the
+    'tortuga/boot-phases' guest attribute) to InstanceMetadata as
+    'gcp:boot:<phase>' records holding seconds since the VM was created.
+
+    VMs are checked until the last phase has been reported, or until
+    COLLECT_TIMEOUT seconds after creation. VMs that cannot be retrieved
+    (for example, deleted VMs) are checked until COLLECT_TIMEOUT seconds
+    after the first failed check.
+    """
+
+    def __init__(self, adapter, dbSession: Session):
+        self._adapter = adapter
+        self._session = dbSession
+
+        self.stats = {
+            'checked': 0,
+            'collected': 0,
+            'errors': 0,
+        }
+
+    def get_pending(self) -> List[InstanceMapping]:
+        # 'gcp:scheduling' is recorded for all VMs launched by this adapter
+        return self._session.query(InstanceMapping).filter(
+            InstanceMapping.instance_metadata.any(
+                InstanceMetadata.key == 'gcp:scheduling'),
+            ~InstanceMapping.instance_metadata.any(
+                InstanceMetadata.key == COLLECTED_KEY)
+        ).options(
+            joinedload(InstanceMapping.instance_metadata),
+            joinedload(InstanceMapping.resource_adapter_configuration)
+        ).all()
+
+    def get_phases(self, svc, project: str, zone: str,
+                   instance: str) -> Tuple[Optional[float],
+                                           Dict[str, float],
+                                           Optional[str]]:
+        """Return VM creation time, reported boot phases and bootstrap
+        mode
+        """
+
+        vm = svc.instances().get(
+            project=project, zone=zone, instance=instance).execute()
+
+        created = parse_timestamp(vm.get('creationTimestamp', ''))
+
+        response = svc.instances().getGuestAttributes(
+            project=project, zone=zone, instance=instance,
+            queryPath=GUEST_ATTRIBUTE_NAMESPACE + '/'
+        ).execute()
+
+        value = get_guest_attribute(
+            response, GUEST_ATTRIBUTE_NAMESPACE, BOOT_PHASES_KEY)
+
+        mode = get_guest_attribute(
+            response, GUEST_ATTRIBUTE_NAMESPACE, BOOTSTRAP_MODE_KEY)
+
+        return created, parse_boot_phases(value) if value else {}, mode
+
+    def collect_once(self) -> int:
+        """Check pending VMs once; return number of VMs completed"""
+
+        completed = 0
+
+        now = time.time()
+
+        services = {}
+
+        for mapping in self.get_pending():
+            if mapping.resource_adapter_configuration is None:
+                continue
+
+            md = {item.key: item for item in mapping.instance_metadata}
+            if 'project' not in md or 'zone' not in md:
+                continue
+
+            profile = mapping.resource_adapter_configuration.name
+
+            svc = services.get(profile)
+            if svc is None:
+                svc = services[profile] = self._adapter.get_gce_session(
+                    profile)['connection'].svc
+
+            self.stats['checked'] += 1
+
+            try:
+                created, phases, mode = self.get_phases(
+                    svc, md['project'].value, md['zone'].value,
+                    mapping.instance)
+            except Exception as ex:  # noqa pylint: disable=broad-except
+                # guest attributes not written yet, or VM deleted
+                logger.debug('Unable to get boot phases of [%s]: %s',
+                             mapping.instance, ex)
+
+                self.stats['errors'] += 1
+
+                first_error = md.get(FIRST_ERROR_KEY)
+                if first_error is None:
+                    mapping.instance_metadata.append(
+                        InstanceMetadata(key=FIRST_ERROR_KEY,
+                                         value=str(int(now))))
+                elif now - float(first_error.value) > COLLECT_TIMEOUT:
+                    mapping.instance_metadata.append(
+                        InstanceMetadata(key=COLLECTED_KEY,
+                                         value=str(int(now))))
+
+                    completed += 1
+
+                continue
+
+            if created is None:
+                continue
+
+            values = {
+                METADATA_PREFIX + phase: str(value)
+                for phase, value in get_boot_latencies(
+                    created, phases).items()
+            }
+
+            if mode:
+                values[MODE_KEY] = mode
+
+            for key, value in values.items():
+                if key in md:
+                    md[key].value = value
+                else:
+                    mapping.instance_metadata.append(
+                        InstanceMetadata(key=key, value=value))
+
+            if BOOT_PHASES[-1] in phases or now - created > COLLECT_TIMEOUT:
+                mapping.instance_metadata.append(
+                    InstanceMetadata(key=COLLECTED_KEY, value=str(int(now))))
+
+                completed += 1
+
+        self._session.commit()
+
+        self.stats['collected'] += completed
+
+        return completed
+
+    def get_records(self) -> List[Tuple[str, str, Dict[str, float]]]:
+        """Return (profile, bootstrap mode, {phase: latency}) of VMs with
+        boot telemetry
+        """
+
+        mappings = self._session.query(InstanceMapping).join(
+            InstanceMapping.instance_metadata
+        ).filter(
+            InstanceMetadata.key.like(METADATA_PREFIX + '%')
+        ).options(
+            joinedload(InstanceMapping.instance_metadata),
+            joinedload(InstanceMapping.resource_adapter_configuration)
+        ).distinct().all()
+
+        records = []
+
+        for mapping in mappings:
+            if mapping.resource_adapter_configuration is None:
+                continue
+
+            mode = DEFAULT_BOOTSTRAP_MODE
+            latencies = {}
+
+            for item in mapping.instance_metadata:
+                phase = item.key[len(METADATA_PREFIX):]
+
+                if item.key == MODE_KEY:
+                    mode = item.value
+                elif item.key.startswith(METADATA_PREFIX) and \
+                        phase in BOOT_PHASES:
+                    latencies[phase] = float(item.value)
+
+            records.append(
+                (mapping.resource_adapter_configuration.name, mode,
+                 latencies))
+
+        return records
+
+    def get_histograms(self) \
+            -> Dict[Tuple[str, str], Dict[str, LatencyHistogram]]:
+        """Return {(profile, bootstrap mode): {phase: histogram}}"""
+
+        return build_histograms(
+            ((profile, mode), latencies)
+            for profile, mode, latencies in self.get_records()
+        )
@@ -0,0 +1,84 @@
+# Copyright 2008-2018 Univa Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from tortuga.cli.tortugaCli import TortugaCli
+from tortuga.db.dbManager import DbManager
+from tortuga.resourceAdapter.gceadapter.telemetry import (
+    BOOT_PHASES, BootTelemetryCollector)
+from tortuga.resourceAdapter.resourceAdapterFactory import get_api
+
+
+class GceBootTelemetryCli(TortugaCli):
+    adapter_type = 'GCP'
+
+    def parseArgs(self, usage=None):
+        option_group_name = _('Telemetry options')
+        self.addOptionGroup(option_group_name, '')
+
+        self.addOptionToGroup(option_group_name,
+                              '--no-collect', dest='collect',
+                              default=True, action='store_false',
+                              help='Report previously collected telemetry'
+                                   ' only')
+
+        self.addOptionToGroup(option_group_name,
+                              '-r', '--resource-adapter-configuration',
+                              dest='resource_adapter_configuration',
+                              help='Report only nodes launched using this'
+                                   ' resource adapter configuration profile')
+
+        super().parseArgs(usage=usage)
+
+    def runCommand(self):
+        self.parseArgs()
+        args = self.getArgs()
+
+        with DbManager().session() as session:
+            adapter = get_api(self.adapter_type)
+            adapter.session = session
+
+            collector = BootTelemetryCollector(adapter, session)
+
+            if args.collect:
+                completed = collector.collect_once()
+
+                print('Checked {} VM(s); boot completed for {}'.format(
+                    collector.stats['checked'], completed))
+
+            histograms = collector.get_histograms()
+
+        # nodes launched from prebaked images are reported separately to
+        # compare boot times of both bootstrap modes
+        for profile, mode in sorted(histograms):
+            if args.resource_adapter_configuration and \
+                    profile != args.resource_adapter_configuration:
+                continue
+
+            print('\nResource adapter configuration [{}], bootstrap mode'
+                  ' [{}]'.format(profile, mode))
+            print('  {:<18} {:>6} {:>8} {:>8} {:>8}'.format(
+                'phase', 'count', 'p50', 'p90', 'max'))
+
+            for phase in BOOT_PHASES:
+                histogram = histograms[(profile, mode)].get(phase)
+                if histogram is None:
+                    continue
+
+                print('  {:<18} {:>6} {:>7.0f}s {:>7.0f}s {:>7.0f}s'.format(
+                    phase, histogram.count, histogram.percentile(50),
+                    histogram.percentile(90), histogram.max))
+
+
+def main():
+    GceBootTelemetryCli().run()
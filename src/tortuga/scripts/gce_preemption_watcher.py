@@ -0,0 +1,92 @@
+# Copyright 2008-2018 Univa Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import time
+from typing import List
+
+from tortuga.cli.tortugaCli import TortugaCli
+from tortuga.db.dbManager import DbManager
+from tortuga.db.models.node import Node
+from tortuga.resourceAdapter.gceadapter.preemption import PreemptionWatcher
+from tortuga.resourceAdapter.resourceAdapterFactory import get_api
+
+
+class GcePreemptionWatcherCli(TortugaCli):
+    adapter_type = 'GCP'
+
+    def parseArgs(self, usage=None):
+        option_group_name = _('Watcher options')
+        self.addOptionGroup(option_group_name, '')
+
+        self.addOptionToGroup(option_group_name,
+                              '--interval', dest='interval', type=int,
+                              default=30,
+                              help='Seconds between checks (default: 30)')
+
+        self.addOptionToGroup(option_group_name,
+                              '--once', dest='once',
+                              default=False, action='store_true',
+                              help='Check once and exit')
+
+        self.addOptionToGroup(option_group_name,
+                              '--restart', dest='restart',
+                              default=False, action='store_true',
+                              help='Restart preempted VMs to recover'
+                                   ' capacity')
+
+        super().parseArgs(usage=usage)
+
+    def runCommand(self):
+        self.parseArgs()
+        args = self.getArgs()
+
+        with DbManager().session() as session:
+            adapter = get_api(self.adapter_type)
+            adapter.session = session
+
+            def restart(nodes: List[Node]):
+                print('Restarting {} preempted node(s)'.format(len(nodes)))
+
+                adapter.startupNode(nodes)
+
+                # preemption markers are removed by startupNode()
+                session.commit()
+
+            watcher = PreemptionWatcher(
+                adapter, session,
+                on_preempted=restart if args.restart else None
+            )
+
+            while True:
+                nodes = watcher.run_once()
+
+                for node in nodes:
+                    print('Node preempted: {}'.format(node.name))
+
+                latencies = watcher.stats['detection_latency']
+                if latencies:
+                    print('Detected {} preemption(s) in {:.2f}s; detection'
+                          ' latency max {:.1f}s'.format(
+                              len(latencies),
+                              watcher.stats['last_pass_duration'],
+                              max(latencies)))
+
+                if args.once:
+                    break
+
+                time.sleep(args.interval)
+
+
+def main():
+    GcePreemptionWatcherCli().run()
@@ -0,0 +1,61 @@
+# Copyright 2008-2018 Univa Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from tortuga.cli.tortugaCli import TortugaCli
+from tortuga.db.dbManager import DbManager
+from tortuga.resourceAdapter.resourceAdapter import \
+    DEFAULT_CONFIGURATION_PROFILE_NAME
+from tortuga.resourceAdapter.resourceAdapterFactory import get_api
+
+
+class GceSyncMachineTypesCli(TortugaCli):
+    adapter_type = 'GCP'
+
+    def parseArgs(self, usage=None):
+        option_group_name = _('Sync options')
+        self.addOptionGroup(option_group_name, '')
+
+        self.addOptionToGroup(option_group_name,
+                              '-r', '--resource-adapter-configuration',
+                              dest='resource_adapter_configuration',
+                              default=DEFAULT_CONFIGURATION_PROFILE_NAME,
+                              help='Resource adapter configuration profile'
+                                   ' used to query Compute Engine')
+
+        super().parseArgs(usage=usage)
+
+    def runCommand(self):
+        self.parseArgs()
+        args = self.getArgs()
+
+        with DbManager().session() as session:
+            adapter = get_api(self.adapter_type)
+            adapter.session = session
+
+            gce_session = adapter.get_gce_session(
+                args.resource_adapter_configuration)
+
+            catalog = adapter.machine_type_catalog
+
+            machine_types = catalog.sync(
+                gce_session['connection'].svc,
+                gce_session['config']['project']
+            )
+
+        print('Synced {} machine type(s) to {}'.format(
+            len(machine_types), catalog.path))
+
+
+def main():
+    GceSyncMachineTypesCli().run()
@@ -0,0 +1,133 @@
+# Copyright 2008-2018 Univa Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import mock
+import pytest
+
+from tortuga_kits.gceadapter.events import pool as pool_module
+from tortuga_kits.gceadapter.events.pool import AdapterPool
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    clock = Clock()
+
+    with mock.patch.object(pool_module.time, 'monotonic', new=clock):
+        yield clock
+
+
+def get_pool(**kwargs) -> AdapterPool:
+    return AdapterPool(mock.Mock(side_effect=lambda: mock.Mock()),
+                       mock.Mock(side_effect=lambda: mock.Mock()),
+                       **kwargs)
+
+
+def test_checkout_reuses_adapter_and_session(clock):
+    pool = get_pool()
+
+    adapter = pool.get()
+
+    assert adapter.session is pool.session
+
+    clock.now += 1
+
+    assert pool.get() is adapter
+
+    # transaction of the previous event is ended before reuse
+    adapter.session.rollback.assert_called_once_with()
+
+    assert pool.stats['sessions_created'] == 1
+    assert pool.stats['adapters_created'] == 1
+    assert pool.stats['reuses'] == 1
+
+
+def test_max_uses(clock):
+    pool = get_pool(max_uses=2)
+
+    adapter = pool.get()
+    assert pool.get() is adapter
+
+    new_adapter = pool.get()
+
+    assert new_adapter is not adapter
+    assert new_adapter.session is not adapter.session
+
+    adapter.session.close.assert_called_once_with()
+
+
+def test_max_age(clock):
+    pool = get_pool(max_age=60)
+
+    adapter = pool.get()
+
+    clock.now += 60
+
+    assert pool.get() is not adapter
+
+    adapter.session.close.assert_called_once_with()
+
+
+def test_health_check(clock):
+    pool = get_pool(health_check_interval=30)
+
+    adapter = pool.get()
+
+    # not checked while recently used
+    clock.now += 10
+    assert pool.get() is adapter
+    adapter.session.execute.assert_not_called()
+
+    adapter.session.execute.side_effect = Exception('connection lost')
+
+    clock.now += 30
+
+    assert pool.get() is not adapter
+
+    assert pool.stats['health_check_failures'] == 1
+
+
+def test_adapter_not_installed(clock):
+    session_factory = mock.Mock(side_effect=lambda: mock.Mock())
+
+    pool = AdapterPool(mock.Mock(side_effect=Exception('not installed')),
+                       session_factory)
+
+    with pytest.raises(Exception):
+        pool.get()
+
+    with pytest.raises(Exception):
+        pool.get()
+
+    # session is kept
+    assert session_factory.call_count == 1
+
+
+def test_recycle(clock):
+    pool = get_pool()
+
+    adapter = pool.get()
+
+    pool.recycle()
+
+    adapter.session.close.assert_called_once_with()
+
+    assert pool.get() is not adapter
@@ -0,0 +1,116 @@
+# Copyright 2008-2018 Univa Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Committing launched nodes (instance mappings, instance metadata and nics)
+to a SQLite database and reloading them in one query
+"""
+
+import pytest
+import sqlalchemy.event
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from tortuga.db.models.base import ModelBase
+from tortuga.db.models.hardwareProfile import HardwareProfile
+from tortuga.db.models.instanceMapping import InstanceMapping
+from tortuga.db.models.instanceMetadata import InstanceMetadata
+from tortuga.db.models.nic import Nic
+from tortuga.db.models.node import Node
+from tortuga.db.models.softwareProfile import SoftwareProfile
+from tortuga.resourceAdapter.gceadapter.gce import load_nodes
+
+
+NODE_COUNT = 1000
+
+
+@pytest.fixture
+def dbSession():
+    engine = create_engine('sqlite://')
+
+    ModelBase.metadata.create_all(engine)
+
+    session = sessionmaker(bind=engine)()
+
+    yield session
+
+    session.close()
+
+
+def launch_nodes(dbSession, count):
+    hardwareprofile = HardwareProfile(name='compute')
+    softwareprofile = SoftwareProfile(name='compute', type='compute')
+
+    nodes = [
+        Node(name='compute-{:04d}.example.com'.format(idx),
+             state='Launching',
+             hardwareprofile=hardwareprofile,
+             softwareprofile=softwareprofile)
+        for idx in range(count)
+    ]
+
+    # nodes are committed before their instances are launched
+    dbSession.add_all(nodes)
+    dbSession.commit()
+
+    for idx, node in enumerate(nodes):
+        node.instance = InstanceMapping(
+            instance='compute-{:04d}'.format(idx),
+            instance_metadata=[
+                InstanceMetadata(key='zone', value='us-east1-b'),
+                InstanceMetadata(key='project', value='project'),
+                InstanceMetadata(key='gcp:scheduling', value='standard'),
+            ]
+        )
+
+        node.nics.append(
+            Nic(ip='10.{}.{}.{}'.format(
+                idx // 65536, idx // 256 % 256, idx % 256), boot=True))
+
+        node.state = 'Provisioned'
+
+    return nodes
+
+
+def test_load_nodes(dbSession):
+    nodes = launch_nodes(dbSession, NODE_COUNT)
+
+    node_ids = [node.id for node in nodes]
+
+    dbSession.commit()
+
+    statements = []
+
+    sqlalchemy.event.listen(
+        dbSession.bind, 'before_cursor_execute',
+        lambda *args: statements.append(args[2]))
+
+    loaded = load_nodes(dbSession, node_ids)
+
+    # relationships used by the provisioned event are not lazy loaded
+    assert all(node.instance.instance == node.name.split('.', 1)[0]
+               for node in loaded)
+
+    # independent of the number of nodes
+    assert len(statements) < 10
+
+    assert len(loaded) == NODE_COUNT
+
+    assert dbSession.query(InstanceMapping).count() == NODE_COUNT
+    assert dbSession.query(InstanceMetadata).count() == 3 * NODE_COUNT
+    assert dbSession.query(Nic).count() == NODE_COUNT
+
+
+def test_load_nodes_empty(dbSession):
+    assert load_nodes(dbSession, []) == []
@@ -0,0 +1,88 @@
+# Copyright 2008-2018 Univa Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import os
+
+from tortuga.resourceAdapter.gceadapter.catalog import (
+    MachineType, MachineTypeCatalog, parse_machine_types)
+
+
+FIXTURE = os.path.join(
+    os.path.dirname(__file__), 'data', 'machineTypes-aggregatedList.json')
+
+
+class FakeRequest:
+    def __init__(self, response):
+        self.response = response
+
+    def execute(self):
+        return self.response
+
+
+class FakeMachineTypes:
+    def __init__(self, response):
+        self.response = response
+
+    def aggregatedList(self, project):  # pylint: disable=unused-argument
+        return FakeRequest(self.response)
+
+    def aggregatedList_next(self, previous_request, previous_response): \
+            # pylint: disable=unused-argument
+        return None
+
+
+class FakeSvc:
+    def __init__(self, response):
+        self._machine_types = FakeMachineTypes(response)
+
+    def machineTypes(self):
+        return self._machine_types
+
+
+def load_fixture():
+    with open(FIXTURE) as fp:
+        return json.load(fp)
+
+
+def test_parse_machine_types():
+    result = parse_machine_types([load_fixture()])
+
+    assert result == {
+        'n1-standard-4': MachineType(4, 15360, 0),
+        'e2-medium': MachineType(2, 4096, 0),
+        'a2-highgpu-2g': MachineType(24, 174080, 2),
+    }
+
+
+def test_catalog_sync(tmpdir):
+    path = str(tmpdir.join('gce-machine-types.pickle'))
+
+    catalog = MachineTypeCatalog(path)
+
+    assert catalog.get('n1-standard-4') is None
+    assert catalog.synced_at is None
+
+    catalog.sync(FakeSvc(load_fixture()), 'myproject')
+
+    assert catalog.get_vcpus('n1-standard-4') == 4
+    assert catalog.get('a2-highgpu-2g').gpus == 2
+    assert catalog.get_vcpus('unknown') is None
+    assert catalog.synced_at is not None
+
+    # another process reads the same file
+    assert MachineTypeCatalog(path).get_vcpus('e2-medium') == 2
+
+    assert [name for name in os.listdir(str(tmpdir))] == \
+        ['gce-machine-types.pickle']
@@ -0,0 +1,210 @@
+# Copyright 2008-2018 Univa Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Debouncing of scale set update events; the coalescer thread is not
+started, due resizes are released explicitly
+"""
+
+import mock
+import pytest
+
+from tortuga_kits.gceadapter.events import coalescer as coalescer_module
+from tortuga_kits.gceadapter.events.coalescer import ResizeCoalescer
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    clock = Clock()
+
+    with mock.patch.object(coalescer_module.time, 'monotonic', new=clock):
+        yield clock
+
+
+def get_ssr(desired: int, ssr_id: str = 'ss1') -> mock.Mock:
+    return mock.Mock(id=ssr_id, desired_nodes=desired)
+
+
+def get_coalescer():
+    released = []
+
+    coalescer = ResizeCoalescer(
+        lambda ssr, on_error: released.append((ssr.id, ssr.desired_nodes)),
+        window=2.0, max_delay=10.0)
+
+    return coalescer, released
+
+
+def test_window(clock):
+    coalescer, released = get_coalescer()
+
+    coalescer.submit(get_ssr(1))
+
+    clock.now += 1.0
+
+    coalescer.submit(get_ssr(2))
+
+    # window restarts with every update
+    clock.now += 1.5
+    assert coalescer.release_due(clock.now) == 0
+
+    clock.now += 0.5
+    assert coalescer.release_due(clock.now) == 1
+
+    assert released == [('ss1', 2)]
+
+    assert coalescer.stats['resizes_saved'] == 1
+    assert coalescer.stats['resizes_released'] == 1
+
+
+def test_max_delay(clock):
+    coalescer, released = get_coalescer()
+
+    # updated more often than the window
+    for desired in range(1, 11):
+        coalescer.submit(get_ssr(desired))
+
+        assert coalescer.release_due(clock.now) == 0
+
+        clock.now += 1.0
+
+    # held for max_delay since the first update
+    assert coalescer.release_due(clock.now) == 1
+
+    assert released == [('ss1', 10)]
+
+
+def test_scale_sets_released_independently(clock):
+    coalescer, released = get_coalescer()
+
+    coalescer.submit(get_ssr(1, 'ss1'))
+
+    clock.now += 1.0
+
+    coalescer.submit(get_ssr(5, 'ss2'))
+
+    clock.now += 1.0
+    assert coalescer.release_due(clock.now) == 1
+
+    clock.now += 1.0
+    assert coalescer.release_due(clock.now) == 1
+
+    assert released == [('ss1', 1), ('ss2', 5)]
+
+
+def test_stale_update_dropped(clock):
+    coalescer, released = get_coalescer()
+
+    seq1 = coalescer.next_sequence('ss1')
+    seq2 = coalescer.next_sequence('ss1')
+
+    # handled out of order
+    coalescer.submit(get_ssr(2), sequence=seq2)
+    coalescer.submit(get_ssr(1), sequence=seq1)
+
+    clock.now += 2.0
+    coalescer.release_due(clock.now)
+
+    assert released == [('ss1', 2)]
+
+    assert coalescer.stats['stale_dropped'] == 1
+
+
+def test_update_older_than_released_dropped(clock):
+    coalescer, released = get_coalescer()
+
+    seq1 = coalescer.next_sequence('ss1')
+    seq2 = coalescer.next_sequence('ss1')
+
+    coalescer.submit(get_ssr(2), sequence=seq2)
+
+    clock.now += 2.0
+    coalescer.release_due(clock.now)
+
+    coalescer.submit(get_ssr(1), sequence=seq1)
+
+    clock.now += 2.0
+    assert coalescer.release_due(clock.now) == 0
+
+    assert released == [('ss1', 2)]
+
+    assert coalescer.stats['stale_dropped'] == 1
+
+
+def test_forget(clock):
+    coalescer, released = get_coalescer()
+
+    coalescer.submit(get_ssr(1))
+
+    coalescer.forget('ss1')
+
+    clock.now += 2.0
+    assert coalescer.release_due(clock.now) == 0
+
+    assert not released
+
+
+def test_error_callback_of_first_update(clock):
+    released = []
+
+    coalescer = ResizeCoalescer(
+        lambda ssr, on_error: released.append((ssr.desired_nodes, on_error)),
+        window=2.0, max_delay=10.0)
+
+    # each callback rolls back to the size before its update
+    coalescer.submit(get_ssr(2), on_error='rollback to 1')
+    coalescer.submit(get_ssr(3), on_error='rollback to 2')
+    coalescer.submit(get_ssr(4), on_error='rollback to 3')
+
+    clock.now += 2.0
+    coalescer.release_due(clock.now)
+
+    assert released == [(4, 'rollback to 1')]
+
+    # next burst starts from the released size
+    coalescer.submit(get_ssr(5), on_error='rollback to 4')
+
+    clock.now += 2.0
+    coalescer.release_due(clock.now)
+
+    assert released[-1] == (5, 'rollback to 4')
+
+
+def test_forget_while_releasing(clock):
+    coalescer, released = get_coalescer()
+
+    coalescer.submit(get_ssr(1))
+
+    assert coalescer.is_held('ss1')
+
+    # taken for release, then deleted before reaching the sink
+    clock.now += 2.0
+    with coalescer._cond:
+        due = coalescer._take_due(clock.now)
+
+    coalescer.forget('ss1')
+
+    coalescer._emit(due)
+
+    assert not released
+
+    assert not coalescer.is_held('ss1')
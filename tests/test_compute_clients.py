@@ -0,0 +1,82 @@
+# Copyright 2008-2018 Univa Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Per-thread cache of Compute Engine clients"""
+
+import os
+import threading
+
+import mock
+import pytest
+
+from tortuga.resourceAdapter.gceadapter import gce
+
+
+@pytest.fixture
+def build_mock():
+    with mock.patch.object(gce, '_build_compute_client',
+                           side_effect=lambda filename: mock.Mock()) as m:
+        # clients cached by earlier tests in this thread
+        gce._compute_clients.__dict__.clear()
+
+        yield m
+
+        gce._compute_clients.__dict__.clear()
+
+
+def test_client_reused(build_mock, tmpdir):
+    keyfile = tmpdir.join('key.json')
+    keyfile.write('{}')
+
+    client = gce.gceAuthorize_from_json(str(keyfile))
+
+    assert gce.gceAuthorize_from_json(str(keyfile)) is client
+
+    assert build_mock.call_count == 1
+
+
+def test_client_rebuilt_when_credentials_change(build_mock, tmpdir):
+    keyfile = tmpdir.join('key.json')
+    keyfile.write('{}')
+
+    client = gce.gceAuthorize_from_json(str(keyfile))
+
+    stat = os.stat(str(keyfile))
+    os.utime(str(keyfile), (stat.st_atime, stat.st_mtime + 10))
+
+    assert gce.gceAuthorize_from_json(str(keyfile)) is not client
+
+    assert build_mock.call_count == 2
+
+    # client of the previous credentials is released
+    assert len(gce._compute_clients.clients) == 1
+
+
+def test_client_per_thread(build_mock, tmpdir):
+    keyfile = tmpdir.join('key.json')
+    keyfile.write('{}')
+
+    client = gce.gceAuthorize_from_json(str(keyfile))
+
+    clients = []
+
+    thread = threading.Thread(
+        target=lambda: clients.append(
+            gce.gceAuthorize_from_json(str(keyfile))))
+    thread.start()
+    thread.join()
+
+    assert clients[0] is not client
+
+    assert build_mock.call_count == 2
@@ -139,3 +139,71 @@ def test_multiple_networks_config_advanced(private_dns_zone_mock):
         assert val5 == 'region4/subnet5'
 
         assert val6 == 'external;primary'
+
+
+@mock.patch('tortuga.resourceAdapter.gceadapter.gce.Gce.private_dns_zone',
+            new_callable=mock.PropertyMock)
+def test_config_cache(private_dns_zone_mock):
+    private_dns_zone_mock.return_value = 'example.com'
+
+    config = dict(COMMON_CONFIG.items())
+
+    with mock.patch.object(
+            Gce, '_load_config_from_database',
+            side_effect=lambda *args, **kwargs: dict(config)) as load_mock:
+        adapter = Gce()
+
+        result = adapter.get_config()
+
+        load_count = load_mock.call_count
+
+        # cached profile is neither loaded nor resolved again
+        with mock.patch(
+                'tortuga.resourceAdapter.resourceAdapter.ResourceAdapter'
+                '.get_config') as resolve_mock:
+            cached = adapter.get_config()
+
+        resolve_mock.assert_not_called()
+
+        assert load_mock.call_count == load_count
+
+        assert cached == result
+
+        # callers get their own copy
+        cached['zone'] = 'us-west1-a'
+        cached['networks'].append(('other', None, None))
+
+        assert adapter.get_config() == result
+
+    # profile changes are picked up once the cached entry expires
+    with mock.patch.object(
+            Gce, '_load_config_from_database',
+            side_effect=lambda *args, **kwargs: dict(config)), \
+            mock.patch(
+                'tortuga.resourceAdapter.gceadapter.gce.CONFIG_CACHE_TTL', 0):
+        adapter = Gce()
+
+        assert adapter.get_config()['type'] == 'the_type'
+
+        config['type'] = 'n1-standard-8'
+
+        assert adapter.get_config()['type'] == 'n1-standard-8'
+
+        # a changed profile replaces its cached entry
+        assert len(adapter._Gce__config_cache) == 1
+
+    # ... or immediately when invalidated in this process
+    with mock.patch.object(
+            Gce, '_load_config_from_database',
+            side_effect=lambda *args, **kwargs: dict(config)):
+        adapter = Gce()
+
+        assert adapter.get_config()['type'] == 'n1-standard-8'
+
+        config['type'] = 'n1-standard-16'
+
+        assert adapter.get_config()['type'] == 'n1-standard-8'
+
+        Gce.invalidate_config_cache()
+
+        assert adapter.get_config()['type'] == 'n1-standard-16'
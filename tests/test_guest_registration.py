@@ -0,0 +1,397 @@
+# Copyright 2008-2018 Univa Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Registration of VMs by the guest startup script against a local stub of
+the Tortuga webservice
+"""
+
+import http.client
+import http.server
+import json
+import os
+import threading
+import time
+
+import pytest
+
+
+STARTUP_SCRIPT = os.path.join(
+    os.path.dirname(__file__), '..', 'tortuga_kits', 'gceadapter', 'files',
+    'startup_script.py')
+
+SETTINGS = '''\
+installerHostName = 'localhost'
+installerIpAddress = '127.0.0.1'
+port = 0
+override_dns_domain = False
+dns_options = None
+dns_search = None
+dns_nameservers = []
+bake_image = False
+insertnode_request = b'token'
+'''
+
+
+def load_startup_script() -> dict:
+    """Return namespace of startup script with settings injected as done
+    by the resource adapter
+    """
+
+    with open(STARTUP_SCRIPT) as fp:
+        source = fp.read().replace('### SETTINGS', SETTINGS)
+
+    namespace = {'__name__': 'startup_script'}
+
+    exec(compile(source, STARTUP_SCRIPT, 'exec'), namespace)
+
+    return namespace
+
+
+class StubInstallerHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+
+        with self.server.lock:
+            self.server.stats['connections'] += 1
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        pass
+
+    def send(self, status: int, body: dict, headers: dict = None):
+        data = json.dumps(body).encode()
+
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+
+        self.end_headers()
+
+        self.wfile.write(data)
+
+    def do_POST(self):
+        length = int(self.headers['Content-Length'])
+        request = json.loads(self.rfile.read(length).decode())
+
+        server = self.server
+
+        with server.lock:
+            server.stats['requests'] += 1
+
+            rejected = server.stats['requests'] <= server.reject_first
+
+        # admission control of the webservice: requests beyond the
+        # concurrency limit are rejected with a retry hint
+        if rejected or not server.slots.acquire(blocking=False):
+            with server.lock:
+                server.stats['throttled'] += 1
+
+            self.send(server.throttle_status, {
+                'error': {
+                    'message': 'Too many concurrent node registrations',
+                    'retry_after': server.retry_after,
+                },
+            }, {'Retry-After': str(server.retry_after)}
+                if server.retry_after_header else None)
+
+            return
+
+        try:
+            time.sleep(server.handle_time)
+
+            with server.lock:
+                server.registered.add(
+                    request['node_details']['metadata']['instance_name'])
+        finally:
+            server.slots.release()
+
+        self.send(200, {'node': request['node_details']['name']})
+
+
+class StubInstaller(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, *, concurrency: int, handle_time: float,
+                 retry_after: int, throttle_status: int = 503,
+                 retry_after_header: bool = True, reject_first: int = 0):
+        super().__init__(('127.0.0.1', 0), StubInstallerHandler)
+
+        self.slots = threading.BoundedSemaphore(concurrency)
+        self.handle_time = handle_time
+        self.retry_after = retry_after
+        self.throttle_status = throttle_status
+        self.retry_after_header = retry_after_header
+        self.reject_first = reject_first
+
+        self.lock = threading.Lock()
+        self.registered = set()
+        self.stats = {'connections': 0, 'requests': 0, 'throttled': 0}
+
+
+def start_installer(**kwargs) -> StubInstaller:
+    server = StubInstaller(**kwargs)
+
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    return server
+
+
+@pytest.fixture
+def installer():
+    server = start_installer(concurrency=10, handle_time=0.01, retry_after=1)
+
+    yield server
+
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def rejecting_installer():
+    """Rejects the first request with 400 and the retry delay in the
+    error response only
+    """
+
+    server = start_installer(
+        concurrency=10, handle_time=0.01, retry_after=1,
+        throttle_status=400, retry_after_header=False, reject_first=1)
+
+    yield server
+
+    server.shutdown()
+    server.server_close()
+
+
+def register(script: dict, server: StubInstaller, idx: int = 0, **kwargs):
+    client = script['InstallerClient'](
+        '127.0.0.1', server.server_address[1],
+        connection_class=http.client.HTTPConnection)
+
+    try:
+        return script['request_with_retry'](
+            client, 'POST', '/v1/node-token/token', json.dumps({
+                'node_details': {
+                    'name': 'compute-{}'.format(idx),
+                    'metadata': {'instance_name': 'vm-{}'.format(idx)},
+                },
+            }), {'Content-Type': 'application/json'}, **kwargs)
+    finally:
+        client.close()
+
+
+def test_get_retry_after():
+    script = load_startup_script()
+
+    get_retry_after = script['get_retry_after']
+
+    assert get_retry_after(503, {'Retry-After': '7'}, b'') == 7
+
+    assert get_retry_after(
+        400, {}, b'{"error": {"message": "x", "retry_after": 12}}') == 12
+
+    # the message is not parsed
+    assert get_retry_after(
+        503, {}, b'{"error": {"message": "retry after 12 seconds"}}') is None
+
+    assert get_retry_after(400, {}, b'{"error": {"retry_after": "12"}}') \
+        is None
+
+    assert get_retry_after(500, {}, b'error') is None
+
+
+def test_backoff_is_jittered_and_capped():
+    script = load_startup_script()
+
+    delays = []
+    delay = script['BACKOFF_BASE']
+
+    for _ in range(50):
+        delay = script['get_backoff'](delay)
+
+        delays.append(delay)
+
+    assert all(script['BACKOFF_BASE'] <= value <= script['BACKOFF_CAP']
+               for value in delays)
+
+    assert len(set(delays)) > 1
+
+
+def test_connection_reuse(installer):
+    script = load_startup_script()
+
+    client = script['InstallerClient'](
+        '127.0.0.1', installer.server_address[1],
+        connection_class=http.client.HTTPConnection)
+
+    for idx in range(5):
+        status, _, _ = client.request(
+            'POST', '/v1/node-token/token', json.dumps({
+                'node_details': {
+                    'name': 'compute-{}'.format(idx),
+                    'metadata': {'instance_name': 'vm-{}'.format(idx)},
+                },
+            }), {'Content-Type': 'application/json'})
+
+        assert status == 200
+
+    client.close()
+
+    assert installer.stats['connections'] == 1
+
+
+def test_registration_storm(installer):
+    """Register 500 VMs at once; all must complete despite throttling"""
+
+    count = 500
+
+    script = load_startup_script()
+
+    # scaled down so the storm completes in a few seconds
+    script['BACKOFF_BASE'] = 0.05
+    script['BACKOFF_CAP'] = 2.0
+
+    errors = []
+
+    def register(idx):
+        client = script['InstallerClient'](
+            '127.0.0.1', installer.server_address[1],
+            connection_class=http.client.HTTPConnection)
+
+        try:
+            status, _, _ = script['request_with_retry'](
+                client, 'POST', '/v1/node-token/token', json.dumps({
+                    'node_details': {
+                        'name': 'compute-{}'.format(idx),
+                        'metadata': {'instance_name': 'vm-{}'.format(idx)},
+                    },
+                }), {'Content-Type': 'application/json'}, timeout=120)
+
+            assert status == 200
+        except Exception as ex:  # noqa pylint: disable=broad-except
+            errors.append(ex)
+        finally:
+            client.close()
+
+    threads = [threading.Thread(target=register, args=(idx,))
+               for idx in range(count)]
+
+    for thread in threads:
+        thread.start()
+
+    for thread in threads:
+        thread.join()
+
+    assert not errors
+    assert len(installer.registered) == count
+
+    # throttled VMs retry on the connection they were rejected on
+    assert installer.stats['connections'] < installer.stats['requests']
+
+
+def test_retry_hint_in_body_of_client_error(rejecting_installer):
+    script = load_startup_script()
+
+    status, _, _ = register(script, rejecting_installer, timeout=30)
+
+    assert status == 200
+
+    assert rejecting_installer.stats['throttled'] == 1
+    assert rejecting_installer.registered == {'vm-0'}
+
+
+def test_client_error_without_retry_hint_not_retried():
+    script = load_startup_script()
+
+    requests = []
+
+    class Client:
+        def request(self, *args):
+            requests.append(args)
+
+            return 400, {}, b'{"error": {"message": "invalid request"}}'
+
+    status, _, _ = script['request_with_retry'](
+        Client(), 'POST', '/v1/node-token/token', '{}', {}, timeout=30)
+
+    assert status == 400
+
+    assert len(requests) == 1
+
+
+def test_bake_failure_reported_and_vm_stopped():
+    script = load_startup_script()
+
+    attributes = {}
+    commands = []
+
+    def install_ca():
+        raise Exception('Unable to download Tortuga CA')
+
+    script['install_ca'] = install_ca
+    script['set_guest_attribute'] = attributes.__setitem__
+    script['tryCommand'] = lambda command, **kwargs: commands.append(command)
+
+    script['bake']('7')
+
+    assert attributes['bake-status'] == \
+        'failed: Unable to download Tortuga CA'
+
+    assert commands[-1] == 'poweroff'
+
+
+def test_install_ca_replaces_stale_ca(tmp_path):
+    script = load_startup_script()
+
+    ca_path = str(tmp_path / 'tortuga-ca.pem')
+
+    with open(ca_path, 'w') as fp:
+        fp.write('stale')
+
+    commands = []
+
+    def try_command(command, **kwargs):
+        commands.append(command)
+
+        if command.startswith('curl'):
+            with open(ca_path + '.new', 'w') as fp:
+                fp.write(current_ca)
+
+        return 0
+
+    script['CA_PATH'] = ca_path
+    script['tryCommand'] = try_command
+
+    current_ca = 'current'
+
+    script['install_ca']()
+
+    with open(ca_path) as fp:
+        assert fp.read() == 'current'
+
+    assert commands[-1] == 'update-ca-trust'
+
+    # unchanged CA does not rebuild the trust store
+    del commands[:]
+
+    script['install_ca']()
+
+    assert 'update-ca-trust' not in commands
+    assert not os.path.exists(ca_path + '.new')
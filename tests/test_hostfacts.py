@@ -0,0 +1,76 @@
+# Copyright 2008-2018 Univa Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+
+import mock
+
+from tortuga.resourceAdapter.gceadapter import hostfacts
+
+
+def make_host(tmpdir, vendor, boot_id='boot-1'):
+    tmpdir.join('bios_vendor').write(vendor + '\n')
+    tmpdir.join('boot_id').write(boot_id + '\n')
+
+    return {
+        'path': str(tmpdir.join('host-facts.json')),
+        'dmi_paths': [str(tmpdir.join('bios_vendor'))],
+        'boot_id_path': str(tmpdir.join('boot_id')),
+    }
+
+
+def test_detect_from_sysfs(tmpdir):
+    kwargs = make_host(tmpdir, 'Google')
+
+    with mock.patch.object(hostfacts, 'run_dmidecode') as dmidecode_mock:
+        assert hostfacts.detect_running_on_gce(**kwargs)
+
+    dmidecode_mock.assert_not_called()
+
+    assert json.loads(tmpdir.join('host-facts.json').read()) == {
+        'boot_id': 'boot-1',
+        'running_on_gce': True,
+    }
+
+
+def test_detect_not_gce(tmpdir):
+    assert not hostfacts.detect_running_on_gce(
+        **make_host(tmpdir, 'Amazon EC2'))
+
+
+def test_cached_result_is_used(tmpdir):
+    kwargs = make_host(tmpdir, 'Google')
+
+    assert hostfacts.detect_running_on_gce(**kwargs)
+
+    # DMI data is not read again
+    tmpdir.join('bios_vendor').write('Other')
+
+    assert hostfacts.detect_running_on_gce(**kwargs)
+
+    # ... until the next boot
+    tmpdir.join('boot_id').write('boot-2')
+
+    assert not hostfacts.detect_running_on_gce(**kwargs)
+
+
+def test_dmidecode_fallback(tmpdir):
+    kwargs = make_host(tmpdir, 'Google')
+    kwargs['dmi_paths'] = [str(tmpdir.join('missing'))]
+
+    with mock.patch.object(
+            hostfacts, 'run_dmidecode', return_value=True) as dmidecode_mock:
+        assert hostfacts.detect_running_on_gce(**kwargs)
+
+    dmidecode_mock.assert_called_once_with()
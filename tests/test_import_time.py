@@ -0,0 +1,82 @@
+# Copyright 2008-2018 Univa Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import subprocess
+import sys
+
+
+MODULE = 'tortuga.resourceAdapter.gceadapter.gce'
+
+# Libraries that must only be imported on first use of the GCE API
+LAZY_MODULES = (
+    'apiclient',
+    'gevent',
+    'google.auth',
+    'google.oauth2',
+    'googleapiclient',
+)
+
+# Budget (microseconds) for the modules of this kit, excluding Tortuga
+# core and third-party libraries
+IMPORT_TIME_BUDGET_US = int(
+    os.getenv('GCE_IMPORT_TIME_BUDGET_US', '250000'))
+
+
+def get_import_times(module: str) -> dict:
+    """Return {module: self time (us)} reported by 'python -X importtime'
+    """
+
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import ' + module],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+        check=True,
+    )
+
+    times = {}
+
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+
+        self_us, _, name = line[len('import time:'):].split('|')
+
+        times[name.strip()] = int(self_us)
+
+    return times
+
+
+def test_gce_import_does_not_load_client_libraries():
+    times = get_import_times(MODULE)
+
+    assert MODULE in times
+
+    loaded = [name for name in times
+              if any(name == lazy or name.startswith(lazy + '.')
+                     for lazy in LAZY_MODULES)]
+
+    assert not loaded
+
+
+def test_gce_import_time_budget():
+    times = get_import_times(MODULE)
+
+    kit_time = sum(
+        self_us for name, self_us in times.items()
+        if name.startswith('tortuga.resourceAdapter.gceadapter')
+    )
+
+    assert kit_time < IMPORT_TIME_BUDGET_US
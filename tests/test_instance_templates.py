@@ -0,0 +1,216 @@
+# Copyright 2008-2018 Univa Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import mock
+import pytest
+from googleapiclient.errors import HttpError
+
+from tortuga.resourceAdapter.gceadapter.gce import (
+    Gce, get_shared_instance_template_name, is_instance_template_not_found,
+    is_shared_instance_template)
+
+
+INSERTNODE_REQUEST = {
+    'softwareProfile': 'Compute',
+    'hardwareProfile': 'Compute',
+    'resource_adapter_configuration': 'default',
+}
+
+
+def get_properties(insertnode_request=b'encrypted1',
+                   machine_type='n1-standard-1'):
+    return {
+        'machineType': machine_type,
+        'metadata': {
+            'kind': 'compute#metadata',
+            'items': [
+                {
+                    'key': 'startup-script',
+                    'value': 'port = 8443\n'
+                             'insertnode_request = {}\n'
+                             'main()\n'.format(insertnode_request),
+                },
+            ],
+        },
+    }
+
+
+def test_shared_template_name_ignores_encrypted_request():
+    name1 = get_shared_instance_template_name(
+        get_properties(b'encrypted1'), INSERTNODE_REQUEST, b'key')
+
+    name2 = get_shared_instance_template_name(
+        get_properties(b'encrypted2'), INSERTNODE_REQUEST, b'key')
+
+    assert name1 == name2
+
+    assert is_shared_instance_template(name1)
+
+    # instance template names are limited to 63 characters
+    assert len(name1) <= 63
+
+
+def test_shared_template_name_depends_on_content():
+    name1 = get_shared_instance_template_name(
+        get_properties(), INSERTNODE_REQUEST, b'key')
+
+    name2 = get_shared_instance_template_name(
+        get_properties(machine_type='n1-standard-2'),
+        INSERTNODE_REQUEST, b'key')
+
+    assert name1 != name2
+
+    name3 = get_shared_instance_template_name(
+        get_properties(),
+        dict(INSERTNODE_REQUEST, softwareProfile='Other'), b'key')
+
+    assert name1 != name3
+
+    name4 = get_shared_instance_template_name(
+        get_properties(), INSERTNODE_REQUEST, b'otherkey')
+
+    assert name1 != name4
+
+
+def test_is_shared_instance_template():
+    assert not is_shared_instance_template('scale-set-1234')
+
+
+TEMPLATE = 'tortuga-tmpl-0123456789abcdef'
+
+
+def get_session() -> dict:
+    return {
+        'connection': mock.Mock(svc=mock.Mock()),
+        'config': {'project': 'the_project'},
+    }
+
+
+@pytest.fixture
+def lock_mock():
+    with mock.patch.object(Gce, '_Gce__lock_instance_templates') as m:
+        yield m
+
+
+def get_not_found_error(template: str) -> HttpError:
+    return HttpError(
+        mock.Mock(status=404),
+        '{{"error": {{"message": "The resource \'projects/the_project/'
+        'global/instanceTemplates/{}\' was not found"}}}}'.format(
+            template).encode())
+
+
+def test_is_instance_template_not_found():
+    assert is_instance_template_not_found(
+        get_not_found_error(TEMPLATE), TEMPLATE)
+
+    assert not is_instance_template_not_found(
+        get_not_found_error('other'), TEMPLATE)
+
+    assert not is_instance_template_not_found(
+        HttpError(mock.Mock(status=403), b'forbidden'), TEMPLATE)
+
+
+@mock.patch.object(Gce, '_known_instance_templates', new_callable=set)
+def test_release_instance_template_in_use(known_mock, lock_mock):
+    known_mock.add(('the_project', TEMPLATE))
+
+    session = get_session()
+
+    # GCE refuses to delete templates used by instance groups
+    session['connection'].svc.instanceTemplates.return_value.delete.\
+        return_value.execute.side_effect = HttpError(
+            mock.Mock(status=400), b'in use')
+
+    assert not Gce()._Gce__release_instance_template(session, TEMPLATE)
+
+    assert ('the_project', TEMPLATE) in known_mock
+
+    # instance group inserts in all processes are held off
+    lock_mock.return_value.__enter__.assert_called_once_with()
+
+    # references are not counted
+    session['connection'].svc.instanceGroupManagers.assert_not_called()
+
+
+@mock.patch.object(Gce, '_known_instance_templates', new_callable=set)
+def test_release_instance_template_unused(known_mock, lock_mock):
+    known_mock.add(('the_project', TEMPLATE))
+
+    session = get_session()
+
+    assert Gce()._Gce__release_instance_template(session, TEMPLATE)
+
+    session['connection'].svc.instanceTemplates.return_value.delete.\
+        assert_called_once_with(project='the_project',
+                                instanceTemplate=TEMPLATE)
+
+    assert ('the_project', TEMPLATE) not in known_mock
+
+
+@mock.patch.object(Gce, '_known_instance_templates', new_callable=set)
+def test_release_instance_template_gone(known_mock, lock_mock):
+    known_mock.add(('the_project', TEMPLATE))
+
+    session = get_session()
+
+    session['connection'].svc.instanceTemplates.return_value.delete.\
+        return_value.execute.side_effect = HttpError(
+            mock.Mock(status=404), b'not found')
+
+    assert not Gce()._Gce__release_instance_template(session, TEMPLATE)
+
+    assert ('the_project', TEMPLATE) not in known_mock
+
+
+@mock.patch.object(Gce, '_known_instance_templates', new_callable=set)
+def test_create_scale_set_recreates_deleted_template(known_mock,
+                                                    lock_mock):
+    """Shared template deleted by another process after being looked up"""
+
+    known_mock.add(('the_project', TEMPLATE))
+
+    session = get_session()
+    session['config'].update(scale_set_regional=False)
+
+    igm_api = mock.Mock()
+    igm_api.insert.return_value.execute.side_effect = [
+        get_not_found_error(TEMPLATE),
+        {'name': 'operation-1'},
+    ]
+
+    adapter = Gce()
+
+    with mock.patch.object(adapter, 'get_gce_session',
+                           return_value=session), \
+            mock.patch.object(adapter, 'create_instance_template',
+                              return_value={'name': TEMPLATE}) \
+            as create_mock, \
+            mock.patch.object(
+                adapter, '_Gce__get_instance_group_manager_api',
+                return_value=(igm_api, {'project': 'the_project',
+                                        'zone': 'us-east1-b'})), \
+            mock.patch.object(adapter, '_Gce__get_scale_set_location'), \
+            mock.patch.object(Gce, 'scale_set_locations',
+                              new_callable=mock.PropertyMock):
+        response = adapter.create_scale_set(
+            'test', 'default', 2, 'Compute', 'Compute')
+
+    assert response == {'name': 'operation-1'}
+
+    assert create_mock.call_count == 2
+    assert igm_api.insert.call_count == 2
+
+    # not trusted anymore
+    assert ('the_project', TEMPLATE) not in known_mock
@@ -0,0 +1,77 @@
+# Copyright 2008-2018 Univa Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import pytest
+
+from tortuga.resourceAdapter.gceadapter.gce import (get_min_launch_success,
+                                                    is_extra_arg_set)
+from tortuga.resourceAdapter.gceadapter.settings import SETTINGS
+from tortuga.resourceAdapterConfiguration.settings import \
+    SettingValidationError
+
+
+@pytest.mark.parametrize('count,min_launch_success,expected', [
+    # partial nodes are rounded up
+    (10, 50, 5),
+    (10, 55, 6),
+    (3, 50, 2),
+    (7, 1, 1),
+    (1000, 99, 990),
+    # all nodes must launch
+    (10, 100, 10),
+    (1, 100, 1),
+])
+def test_get_min_launch_success(count, min_launch_success, expected):
+    assert get_min_launch_success(count, min_launch_success) == expected
+
+
+@pytest.mark.parametrize('min_launch_success', [None, 0])
+def test_get_min_launch_success_best_effort(min_launch_success):
+    # launch succeeds as long as any node launches
+    assert get_min_launch_success(10, min_launch_success) == 1
+    assert get_min_launch_success(1, min_launch_success) == 1
+
+
+@pytest.mark.parametrize('name', ['min_launch_success',
+                                  'preemptible_fraction'])
+@pytest.mark.parametrize('value', ['0', '50', '100'])
+def test_percentage_setting(name, value):
+    SETTINGS[name].validate(value)
+
+
+@pytest.mark.parametrize('name', ['min_launch_success',
+                                  'preemptible_fraction'])
+@pytest.mark.parametrize('value', ['-1', '101', '1000'])
+def test_percentage_setting_out_of_range(name, value):
+    with pytest.raises(SettingValidationError):
+        SETTINGS[name].validate(value)
+
+
+@pytest.mark.parametrize('extra_args,expected', [
+    (None, False),
+    ({}, False),
+    ({'other': 'true'}, False),
+    # given without a value
+    ({'best_effort': None}, True),
+    ({'best_effort': ''}, True),
+    ({'best_effort': True}, True),
+    ({'best_effort': 'true'}, True),
+    ({'best_effort': '1'}, True),
+    ({'best_effort': False}, False),
+    ({'best_effort': 'false'}, False),
+    ({'best_effort': '0'}, False),
+    ({'best_effort': 'no'}, False),
+])
+def test_is_extra_arg_set(extra_args, expected):
+    assert is_extra_arg_set(extra_args, 'best_effort') is expected
@@ -0,0 +1,144 @@
+# Copyright 2008-2018 Univa Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+
+import mock
+import pytest
+
+from tortuga.exceptions.resourceNotFound import ResourceNotFound
+from tortuga.resourceAdapter.gceadapter import gce
+from tortuga.resourceAdapter.gceadapter.gce import Gce
+from tortuga.resourceAdapter.gceadapter.machine_types import (
+    get_instance_sizes, get_machine_type_vcpus, parse_custom_machine_type)
+
+
+def test_parse_custom_machine_type():
+    assert parse_custom_machine_type('custom-4-5120') == 4
+    assert parse_custom_machine_type('n2-custom-8-16384') == 8
+    assert parse_custom_machine_type('custom-2-15360-ext') == 2
+    assert parse_custom_machine_type('n1-standard-4') is None
+
+
+def test_get_instance_sizes(tmpdir):
+    path = tmpdir.join('gce-instance-sizes.csv')
+    path.write('n1-standard-1,1\nn1-standard-2,2\n# comment\nbogus\n')
+
+    table = get_instance_sizes(str(path))
+
+    assert table == {'n1-standard-1': 1, 'n1-standard-2': 2}
+
+    # parsed once
+    assert get_instance_sizes(str(path)) is table
+
+    path.write('n1-standard-1,1\nn1-standard-2,2\nn1-standard-4,4\n')
+
+    # mtime granularity may be coarse; make sure the change is noticed
+    stat = os.stat(str(path))
+    os.utime(str(path), (stat.st_atime, stat.st_mtime + 10))
+
+    assert get_instance_sizes(str(path))['n1-standard-4'] == 4
+
+
+def test_get_instance_sizes_missing_file(tmpdir):
+    assert get_instance_sizes(str(tmpdir.join('missing.csv'))) == {}
+
+
+def test_get_machine_type_vcpus():
+    table = {'n1-standard-4': 4}
+
+    assert get_machine_type_vcpus('n1-standard-4', table) == 4
+    assert get_machine_type_vcpus('custom-6-8192', table) == 6
+    assert get_machine_type_vcpus('n1-unknown-4', table) is None
+
+
+def make_node(name: str) -> mock.Mock:
+    node = mock.Mock(instance=None)
+    node.name = name
+
+    return node
+
+
+def get_vcpus_adapter(vcpus: int) -> Gce:
+    adapter = Gce()
+    adapter.session = mock.Mock()
+    adapter.session.query.return_value.filter.return_value.options.\
+        return_value.all.return_value = [make_node('compute-01')]
+
+    adapter.get_node_resource_adapter_config = mock.Mock(
+        return_value={'type': 'n1-standard-4', 'vcpus': vcpus})
+
+    return adapter
+
+
+@mock.patch.object(Gce, '_node_vcpus', new_callable=dict)
+@mock.patch.object(Gce, 'machine_type_catalog',
+                   new_callable=mock.PropertyMock)
+def test_node_vcpus_cache_expires(catalog_mock):
+    catalog_mock.return_value.synced_at = 1.0
+
+    adapter = get_vcpus_adapter(4)
+
+    with mock.patch.object(gce.time, 'monotonic', return_value=100.0):
+        assert adapter.get_node_vcpus('compute-01') == 4
+
+    adapter.get_node_resource_adapter_config.return_value = {'vcpus': 8}
+
+    # cached
+    with mock.patch.object(gce.time, 'monotonic',
+                           return_value=100.0 + gce.NODE_VCPUS_TTL - 1):
+        assert adapter.get_node_vcpus('compute-01') == 4
+
+    # expired; node may have been replaced by another process
+    with mock.patch.object(gce.time, 'monotonic',
+                           return_value=100.0 + gce.NODE_VCPUS_TTL):
+        assert adapter.get_node_vcpus('compute-01') == 8
+
+
+@mock.patch.object(Gce, '_node_vcpus', new_callable=dict)
+@mock.patch.object(Gce, 'machine_type_catalog',
+                   new_callable=mock.PropertyMock)
+def test_node_vcpus_cache_catalog_sync(catalog_mock):
+    catalog_mock.return_value.synced_at = 1.0
+
+    adapter = get_vcpus_adapter(4)
+
+    assert adapter.get_node_vcpus('compute-01') == 4
+
+    adapter.get_node_resource_adapter_config.return_value = {'vcpus': 8}
+
+    assert adapter.get_node_vcpus('compute-01') == 4
+
+    # machine types synced
+    catalog_mock.return_value.synced_at = 2.0
+
+    assert adapter.get_node_vcpus('compute-01') == 8
+
+
+@mock.patch.object(Gce, '_node_vcpus', new_callable=dict)
+@mock.patch.object(Gce, 'machine_type_catalog',
+                   new_callable=mock.PropertyMock)
+def test_node_vcpus_missing_node(catalog_mock):
+    catalog_mock.return_value.synced_at = 1.0
+
+    adapter = get_vcpus_adapter(4)
+
+    with pytest.raises(ResourceNotFound):
+        adapter.get_node_vcpus('compute-02')
+
+    # deleted nodes are not using any cpus
+    assert adapter.get_nodes_vcpus(['compute-01', 'compute-02']) == {
+        'compute-01': 4,
+        'compute-02': 0,
+    }
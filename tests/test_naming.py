@@ -0,0 +1,129 @@
+# Copyright 2008-2018 Univa Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import random
+import re
+import time
+
+import mock
+
+from tortuga.resourceAdapter.gceadapter.naming import (
+    NameFormat, NameReservations, allocate_node_names, escape_like,
+    get_name_index, parse_name_format)
+
+
+def test_parse_name_format():
+    assert parse_name_format('compute-#NN') == NameFormat('compute-', 2, '')
+    assert parse_name_format('gpu#NNNN-x') == NameFormat('gpu', 4, '-x')
+    assert parse_name_format('*') is None
+    assert parse_name_format('compute') is None
+    assert parse_name_format('a#NN-#NN') is None
+    assert parse_name_format(None) is None
+
+
+def test_get_name_index():
+    name_format = parse_name_format('compute-#NN')
+
+    assert get_name_index(name_format, 'compute-07') == 7
+    assert get_name_index(name_format, 'compute-123') == 123
+    assert get_name_index(name_format, 'compute-01-ahebx') == 1
+    assert get_name_index(name_format, 'compute-xx') is None
+    assert get_name_index(name_format, 'other-01') is None
+
+
+def test_allocate_node_names():
+    name_format = parse_name_format('compute-#NN')
+
+    result = allocate_node_names(
+        name_format, 3,
+        ['compute-01.example.com', 'compute-04', 'unrelated-99'],
+        domain='example.com'
+    )
+
+    assert result == [
+        'compute-05.example.com',
+        'compute-06.example.com',
+        'compute-07.example.com',
+    ]
+
+
+def test_allocate_node_names_randomized():
+    name_format = parse_name_format('compute-#NN')
+
+    result = allocate_node_names(
+        name_format, 1000, [], randomize=True, rng=random.Random(0))
+
+    assert len(set(result)) == 1000
+
+    assert all(re.match(r'compute-\d{2,}-[a-z]{5}$', name)
+               for name in result)
+
+
+def test_allocate_node_names_from_start():
+    name_format = parse_name_format('compute-#NN')
+
+    # continues from the name generated by Tortuga, skipping names in use
+    result = allocate_node_names(
+        name_format, 3, ['compute-01', 'compute-03', 'compute-04'], start=2)
+
+    assert result == ['compute-02', 'compute-05', 'compute-06']
+
+
+def test_escape_like():
+    assert escape_like('compute-') == 'compute-'
+    assert escape_like('gpu_node%') == 'gpu\\_node\\%'
+    assert escape_like('a\\b') == 'a\\\\b'
+
+
+def test_name_reservations():
+    reservations = NameReservations(ttl=60)
+
+    now = time.monotonic()
+
+    with mock.patch('time.monotonic', return_value=now):
+        reservations.reserve(['compute-01', 'compute-02'])
+
+    with mock.patch('time.monotonic', return_value=now + 59):
+        assert sorted(reservations.names()) == ['compute-01', 'compute-02']
+
+    with mock.patch('time.monotonic', return_value=now + 60):
+        assert reservations.names() == []
+
+    reservations.reserve(['compute-01', 'compute-02'])
+
+    # committed
+    reservations.release(['compute-01', 'compute-03'])
+
+    assert reservations.names() == ['compute-02']
+
+
+def test_reserved_names_not_allocated_twice():
+    name_format = parse_name_format('compute-#NN')
+
+    reservations = NameReservations()
+
+    # concurrent requests before either has committed its nodes
+    allocated = []
+
+    for _ in range(2):
+        with reservations.lock:
+            names = allocate_node_names(
+                name_format, 2, reservations.names(), start=1)
+
+            reservations.reserve(names)
+
+        allocated.extend(names)
+
+    assert allocated == ['compute-01', 'compute-02', 'compute-03',
+                         'compute-04']
@@ -0,0 +1,167 @@
+# Copyright 2008-2018 Univa Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+import time
+
+import mock
+import pytest
+
+from tortuga.resourceAdapter.gceadapter.operations import (
+    OperationCache, make_operation_handle, parse_operation_handle)
+
+
+def test_operation_handle_roundtrip():
+    handle = make_operation_handle('project1', 'us-east1-b', 'operation-1')
+
+    assert parse_operation_handle(handle) == \
+        ('project1', 'us-east1-b', 'operation-1')
+
+    handle = make_operation_handle('project1', None, 'operation-2')
+
+    assert parse_operation_handle(handle) == \
+        ('project1', None, 'operation-2')
+
+    with pytest.raises(ValueError):
+        parse_operation_handle('azure:a:b:c')
+
+
+def test_operation_cache_refresh():
+    cache = OperationCache(refresh_interval=3600)
+
+    cache.add('handle1', {'name': 'operation-1', 'status': 'RUNNING'})
+
+    # freshly added operation does not need to be refreshed
+    assert not cache.needs_refresh('handle1')
+
+    # unknown operations always need to be queried
+    assert cache.needs_refresh('handle2')
+
+    cache.update('handle1', {'name': 'operation-1', 'status': 'DONE'})
+
+    assert cache.get('handle1')['status'] == 'DONE'
+
+    assert not cache.needs_refresh('handle1')
+
+
+def test_operation_cache_get_current():
+    cache = OperationCache(refresh_interval=5)
+
+    with mock.patch('time.monotonic', return_value=1000.0):
+        cache.add('handle1', {'name': 'operation-1', 'status': 'RUNNING'})
+
+        assert cache.get_current('handle1')['status'] == 'RUNNING'
+
+        assert cache.get_current('handle2') is None
+
+    # stale
+    with mock.patch('time.monotonic', return_value=1005.0):
+        assert cache.get_current('handle1') is None
+
+        cache.update('handle1', {'name': 'operation-1', 'status': 'DONE'})
+
+    # completed operations are not refreshed
+    with mock.patch('time.monotonic', return_value=2000.0):
+        assert cache.get_current('handle1')['status'] == 'DONE'
+
+
+def test_operation_cache_subscribe():
+    cache = OperationCache()
+
+    completed = []
+
+    cache.add('handle1', {'name': 'operation-1', 'status': 'PENDING'})
+
+    cache.subscribe('handle1', lambda handle, op: completed.append(handle))
+
+    assert not completed
+
+    cache.update('handle1', {'name': 'operation-1', 'status': 'DONE'})
+
+    assert completed == ['handle1']
+
+    # subscribing to a completed operation calls back immediately
+    cache.subscribe('handle1', lambda handle, op: completed.append(handle))
+
+    assert completed == ['handle1', 'handle1']
+
+
+def test_operation_cache_subscribe_unknown():
+    cache = OperationCache()
+
+    with pytest.raises(KeyError):
+        cache.subscribe('handle1', lambda handle, op: None)
+
+
+def test_operation_cache_poll_once():
+    cache = OperationCache(refresh_interval=0)
+
+    fetch = mock.Mock(side_effect=[
+        {'name': 'operation-1', 'status': 'RUNNING'},
+        {'name': 'operation-1', 'status': 'DONE'},
+    ])
+
+    completed = []
+
+    cache.add('handle1', {'name': 'operation-1', 'status': 'PENDING'},
+              fetch=fetch)
+
+    # operations without subscribers are not polled
+    assert cache.poll_once() == 0
+
+    with mock.patch.object(threading.Thread, 'start'):
+        cache.subscribe(
+            'handle1', lambda handle, op: completed.append(op['status']))
+
+    assert cache.poll_once() == 1
+    assert not completed
+
+    assert cache.poll_once() == 1
+    assert completed == ['DONE']
+
+    # no subscribers left
+    assert cache.poll_once() == 0
+
+
+def test_operation_cache_poller():
+    cache = OperationCache(refresh_interval=0.01)
+
+    done = threading.Event()
+
+    cache.add('handle1', {'name': 'operation-1', 'status': 'PENDING'},
+              fetch=lambda: {'name': 'operation-1', 'status': 'DONE'})
+
+    # completes without clients polling for status
+    cache.subscribe('handle1', lambda handle, op: done.set())
+
+    assert done.wait(10)
+
+
+def test_operation_cache_expires_by_age():
+    cache = OperationCache(ttl=60)
+
+    with mock.patch('time.monotonic', return_value=1000.0):
+        cache.add('handle1', {'name': 'operation-1', 'status': 'PENDING'})
+
+        with mock.patch.object(threading.Thread, 'start'):
+            cache.subscribe('handle1', lambda handle, op: None)
+
+    # expired although not completed
+    with mock.patch('time.monotonic', return_value=1061.0):
+        assert cache.get('handle1') is None
+
+        with pytest.raises(KeyError):
+            cache.subscribe('handle1', lambda handle, op: None)
+
+        assert cache.poll_once() == 0
@@ -0,0 +1,93 @@
+# Copyright 2008-2018 Univa Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from tortuga.resourceAdapter.gceadapter.placement import (
+    ZonePlacementEngine, is_zone_capacity_error)
+
+
+ZONES = ['us-east1-b', 'us-east1-c', 'us-east1-d']
+
+
+def test_plan_spreads_evenly():
+    engine = ZonePlacementEngine()
+
+    result = engine.plan(ZONES, 7)
+
+    assert len(result) == 7
+
+    counts = sorted(result.count(zone) for zone in ZONES)
+
+    assert counts == [2, 2, 3]
+
+    # zones are interleaved
+    assert result[:3] == ZONES
+
+
+def test_plan_avoids_exhausted_zone():
+    engine = ZonePlacementEngine()
+
+    engine.record('us-east1-b', False, capacity_error=True)
+
+    result = engine.plan(ZONES, 10)
+
+    assert 'us-east1-b' not in result
+
+    assert engine.next_zone(ZONES, exclude=['us-east1-c']) == 'us-east1-d'
+
+
+def test_plan_all_zones_exhausted():
+    engine = ZonePlacementEngine()
+
+    for zone in ZONES:
+        engine.record(zone, False, capacity_error=True)
+
+    assert len(engine.plan(ZONES, 3)) == 3
+
+    # no zone to retry in
+    assert engine.next_zone(ZONES) is None
+
+
+def test_success_rate():
+    engine = ZonePlacementEngine(decay=0.5)
+
+    assert engine.success_rate('us-east1-b') == 1.0
+
+    engine.record('us-east1-b', False)
+
+    assert engine.success_rate('us-east1-b') == 0.5
+
+    engine.record('us-east1-b', True)
+
+    assert engine.success_rate('us-east1-b') == 0.75
+
+    # zone with the better track record is preferred
+    assert engine.next_zone(['us-east1-b', 'us-east1-c']) == 'us-east1-c'
+
+
+def test_is_zone_capacity_error():
+    assert not is_zone_capacity_error(None)
+
+    assert not is_zone_capacity_error({'status': 'DONE'})
+
+    assert is_zone_capacity_error({
+        'error': {
+            'errors': [{'code': 'ZONE_RESOURCE_POOL_EXHAUSTED'}],
+        },
+    })
+
+    assert not is_zone_capacity_error({
+        'error': {
+            'errors': [{'code': 'QUOTA_EXCEEDED'}],
+        },
+    })
@@ -0,0 +1,213 @@
+# Copyright 2008-2018 Univa Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Scale set reconciler; the reconciler thread is not started, queued
+resizes are flushed explicitly
+"""
+
+import mock
+
+from tortuga_kits.gceadapter.events.reconciler import ScaleSetReconciler
+
+
+def get_ssr(desired: int, ssr_id: str = 'ss1') -> mock.Mock:
+    return mock.Mock(id=ssr_id, desired_nodes=desired,
+                     resourceadapter_name='GCP',
+                     resourceadapter_profile_name='default',
+                     adapter_arguments={})
+
+
+def get_not_found_error() -> Exception:
+    ex = Exception('not found')
+    ex.resp = mock.Mock(status=404)
+
+    return ex
+
+
+def test_defer_while_busy():
+    busy = {'ss1'}
+
+    reconciler = ScaleSetReconciler(
+        mock.Mock(), mock.Mock(), is_busy=lambda ssr_id: ssr_id in busy)
+
+    adapter = mock.Mock()
+
+    reconciler.request_resize(get_ssr(3))
+    reconciler.request_resize(get_ssr(4, 'ss2'))
+
+    assert reconciler.flush(adapter) == 1
+
+    adapter.update_scale_set.assert_called_once_with(
+        name='ss2', resourceAdapterProfile='default', desiredCount=4,
+        adapter_args={})
+
+    # resize requested while deferred replaces the deferred one
+    reconciler.request_resize(get_ssr(5))
+
+    busy.clear()
+
+    adapter.reset_mock()
+
+    assert reconciler.flush(adapter) == 0
+
+    adapter.update_scale_set.assert_called_once_with(
+        name='ss1', resourceAdapterProfile='default', desiredCount=5,
+        adapter_args={})
+
+    assert reconciler.stats['resizes_sent'] == 2
+    assert reconciler.stats['resizes_coalesced'] == 1
+
+
+def test_defer_until_created():
+    reconciler = ScaleSetReconciler(mock.Mock(), mock.Mock())
+
+    on_error = mock.Mock()
+
+    adapter = mock.Mock()
+    adapter.update_scale_set.side_effect = [get_not_found_error(), None]
+
+    reconciler.track(get_ssr(2))
+
+    reconciler.request_resize(get_ssr(3), on_error=on_error)
+
+    # instance group insert not completed
+    assert reconciler.flush(adapter) == 1
+
+    assert reconciler.flush(adapter) == 0
+
+    assert adapter.update_scale_set.call_count == 2
+
+    on_error.assert_not_called()
+
+    assert reconciler.stats['resize_errors'] == 0
+
+
+def test_not_found_after_created():
+    reconciler = ScaleSetReconciler(mock.Mock(), mock.Mock())
+
+    on_error = mock.Mock()
+
+    ex = get_not_found_error()
+
+    adapter = mock.Mock()
+    adapter.get_scale_set.return_value = {
+        'targetSize': 2, 'status': {'isStable': False}}
+    adapter.update_scale_set.side_effect = ex
+
+    store = mock.Mock()
+    store.list.return_value = [get_ssr(2)]
+
+    reconciler.track(get_ssr(2))
+
+    # instance group seen
+    reconciler.reconcile(adapter, store)
+
+    reconciler.request_resize(get_ssr(3), on_error=on_error)
+
+    assert reconciler.flush(adapter) == 0
+
+    on_error.assert_called_once_with(ex)
+
+
+def test_reconcile_drift():
+    reconciler = ScaleSetReconciler(mock.Mock(), mock.Mock())
+
+    adapter = mock.Mock()
+    adapter.get_scale_set.return_value = {
+        'targetSize': 2, 'status': {'isStable': True}}
+
+    store = mock.Mock()
+    store.list.return_value = [get_ssr(4)]
+
+    reconciler.reconcile(adapter, store)
+
+    assert reconciler.stats['drift_corrections'] == 1
+
+    assert reconciler.flush(adapter) == 0
+
+    adapter.update_scale_set.assert_called_once_with(
+        name='ss1', resourceAdapterProfile='default', desiredCount=4,
+        adapter_args={})
+
+
+def test_reconcile_drift_callback():
+    on_drift = mock.Mock()
+
+    reconciler = ScaleSetReconciler(
+        mock.Mock(), mock.Mock(), on_drift=on_drift)
+
+    adapter = mock.Mock()
+    adapter.get_scale_set.return_value = {
+        'targetSize': 2, 'status': {'isStable': True}}
+
+    ssr = get_ssr(4)
+
+    store = mock.Mock()
+    store.list.return_value = [ssr]
+
+    reconciler.reconcile(adapter, store)
+
+    # correction is left to the callback, nothing queued here
+    on_drift.assert_called_once_with(ssr, 2)
+
+    assert reconciler.flush(adapter) == 0
+
+    adapter.update_scale_set.assert_not_called()
+
+
+def test_reconcile_skips_busy():
+    reconciler = ScaleSetReconciler(
+        mock.Mock(), mock.Mock(), is_busy=lambda ssr_id: True)
+
+    adapter = mock.Mock()
+
+    store = mock.Mock()
+    store.list.return_value = [get_ssr(4)]
+
+    reconciler.reconcile(adapter, store)
+
+    adapter.get_scale_set.assert_not_called()
+
+    assert reconciler.stats['drift_corrections'] == 0
+
+
+def test_forget_drops_pending_and_error_callback():
+    reconciler = ScaleSetReconciler(mock.Mock(), mock.Mock())
+
+    on_error = mock.Mock()
+
+    adapter = mock.Mock()
+
+    reconciler.request_resize(get_ssr(3), on_error=on_error)
+
+    reconciler.forget('ss1')
+
+    assert reconciler.flush(adapter) == 0
+
+    adapter.update_scale_set.assert_not_called()
+
+    # deleted while the resize is in progress
+    def update_scale_set(**kwargs):
+        reconciler.forget('ss1')
+
+        raise get_not_found_error()
+
+    adapter.update_scale_set.side_effect = update_scale_set
+
+    reconciler.request_resize(get_ssr(3), on_error=on_error)
+
+    assert reconciler.flush(adapter) == 0
+
+    on_error.assert_not_called()
@@ -0,0 +1,172 @@
+# Copyright 2008-2018 Univa Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+import time
+
+import pytest
+
+from tortuga.resourceAdapter.gceadapter.registration import (
+    AdmissionController, MicroBatcher, RegistrationThrottled)
+
+
+def run_concurrently(batcher, names, func, key='zone'):
+    results = {}
+
+    def worker(name):
+        try:
+            results[name] = batcher.submit(key, name, None, func)
+        except Exception as ex:  # noqa pylint: disable=broad-except
+            results[name] = ex
+
+    threads = [threading.Thread(target=worker, args=(name,))
+               for name in names]
+
+    for thread in threads:
+        thread.start()
+
+    for thread in threads:
+        thread.join()
+
+    return results
+
+
+def test_concurrent_requests_are_batched():
+    calls = []
+
+    def func(items):
+        calls.append(sorted(items))
+
+        return {name: name.upper() for name in items}
+
+    batcher = MicroBatcher(window=0.5, max_batch=10)
+
+    names = ['vm-{:03d}'.format(idx) for idx in range(100)]
+
+    results = run_concurrently(batcher, names, func)
+
+    assert results == {name: name.upper() for name in names}
+
+    assert batcher.stats['requests'] == 100
+
+    # batches are closed as soon as they are full
+    assert len(calls) == batcher.stats['batches'] == 10
+    assert sorted(name for call in calls for name in call) == names
+
+
+def test_missing_result():
+    batcher = MicroBatcher(window=0)
+
+    assert batcher.submit('zone', 'vm-001', None, lambda items: {}) is None
+
+
+def test_error_is_raised_in_every_request():
+    def func(items):
+        raise RuntimeError('quota exceeded')
+
+    batcher = MicroBatcher(window=0.2)
+
+    results = run_concurrently(batcher, ['vm-001', 'vm-002'], func)
+
+    assert all(isinstance(result, RuntimeError)
+               for result in results.values())
+
+    with pytest.raises(RuntimeError):
+        batcher.submit('zone', 'vm-003', None, func)
+
+
+def test_admission_bounds_concurrency():
+    admission = AdmissionController(max_concurrent=2, max_wait=5)
+
+    lock = threading.Lock()
+    active = []
+    peak = []
+
+    def worker():
+        with admission.admit():
+            with lock:
+                active.append(1)
+                peak.append(len(active))
+
+            time.sleep(0.05)
+
+            with lock:
+                active.pop()
+
+    threads = [threading.Thread(target=worker) for _ in range(10)]
+
+    for thread in threads:
+        thread.start()
+
+    for thread in threads:
+        thread.join()
+
+    assert max(peak) == 2
+    assert admission.stats['admitted'] == 10
+    assert admission.stats['throttled'] == 0
+
+
+def test_admission_throttles_with_retry_after():
+    admission = AdmissionController(max_concurrent=1, max_wait=0.1)
+
+    with admission.admit():
+        with pytest.raises(RegistrationThrottled) as excinfo:
+            with admission.admit():
+                pass
+
+    assert excinfo.value.retry_after >= 1
+    assert 'retry after {} seconds'.format(excinfo.value.retry_after) in \
+        str(excinfo.value)
+
+    assert admission.stats['throttled'] == 1
+
+    # slot is released after the registration completes
+    with admission.admit():
+        pass
+
+
+def test_admission_does_not_block():
+    admission = AdmissionController(max_concurrent=1)
+
+    with admission.admit():
+        start = time.monotonic()
+
+        with pytest.raises(RegistrationThrottled):
+            with admission.admit():
+                pass
+
+        assert time.monotonic() - start < 0.5
+
+    # waits are bounded regardless of configuration
+    admission.configure(max_wait=30)
+
+    assert admission.max_wait <= 1
+
+
+def test_admission_spreads_retries():
+    admission = AdmissionController(max_concurrent=1, max_retry_after=1000)
+
+    retry_after = []
+
+    with admission.admit():
+        for _ in range(5):
+            with pytest.raises(RegistrationThrottled) as excinfo:
+                with admission.admit():
+                    pass
+
+            retry_after.append(excinfo.value.retry_after)
+
+    # later registrations are asked to retry later
+    assert retry_after == sorted(retry_after)
+    assert retry_after[-1] > retry_after[0]
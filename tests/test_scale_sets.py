@@ -0,0 +1,163 @@
+# Copyright 2008-2018 Univa Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import threading
+
+from tortuga.resourceAdapter.gceadapter.scale_sets import (
+    ScaleSetLocation, ScaleSetLocationStore, file_lock,
+    find_scale_set_location, get_igm_api, parse_scope)
+
+
+class FakeRequest:
+    def __init__(self, pages, page):
+        self.pages = pages
+        self.page = page
+
+    def execute(self):
+        return self.pages[self.page]
+
+
+class FakeInstanceGroupManagers:
+    def __init__(self, pages):
+        self.pages = pages
+        self.filters = []
+
+    def aggregatedList(self, project, filter):  # pylint: disable=redefined-builtin
+        self.filters.append(filter)
+
+        return FakeRequest(self.pages, 0)
+
+    def aggregatedList_next(self, previous_request, previous_response):
+        page = previous_request.page + 1
+
+        return FakeRequest(self.pages, page) \
+            if page < len(self.pages) else None
+
+
+class FakeSvc:
+    def __init__(self, pages=None):
+        self.zonal = FakeInstanceGroupManagers(pages or [{}])
+        self.regional = object()
+
+    def instanceGroupManagers(self):
+        return self.zonal
+
+    def regionInstanceGroupManagers(self):
+        return self.regional
+
+
+def make_page(scope, name):
+    return {
+        'items': {
+            'zones/us-east1-c': {'warning': {'code': 'NO_RESULTS_ON_PAGE'}},
+            scope: {'instanceGroupManagers': [{'name': name}]},
+        }
+    }
+
+
+def test_parse_scope():
+    assert parse_scope('zones/us-east1-b') == \
+        ScaleSetLocation(regional=False, location='us-east1-b')
+
+    assert parse_scope('regions/us-east1') == \
+        ScaleSetLocation(regional=True, location='us-east1')
+
+    assert parse_scope('global') is None
+
+
+def test_find_zonal_scale_set():
+    svc = FakeSvc([{}, make_page('zones/us-east1-b', 'scale-set-a')])
+
+    assert find_scale_set_location(svc, 'project', 'scale-set-a') == \
+        ScaleSetLocation(regional=False, location='us-east1-b')
+
+    assert svc.zonal.filters == ['name = "scale-set-a"']
+
+
+def test_find_regional_scale_set():
+    svc = FakeSvc([make_page('regions/us-east1', 'scale-set-a')])
+
+    assert find_scale_set_location(svc, 'project', 'scale-set-a') == \
+        ScaleSetLocation(regional=True, location='us-east1')
+
+
+def test_find_missing_scale_set():
+    svc = FakeSvc([make_page('zones/us-east1-b', 'scale-set-other')])
+
+    assert find_scale_set_location(svc, 'project', 'scale-set-a') is None
+
+
+def test_get_igm_api():
+    svc = FakeSvc()
+
+    api, location = get_igm_api(
+        svc, 'project', ScaleSetLocation(regional=False, location='us-east1-b'))
+
+    assert api is svc.zonal
+    assert location == {'project': 'project', 'zone': 'us-east1-b'}
+
+    api, location = get_igm_api(
+        svc, 'project', ScaleSetLocation(regional=True, location='us-east1'))
+
+    assert api is svc.regional
+    assert location == {'project': 'project', 'region': 'us-east1'}
+
+
+def test_location_store(tmpdir):
+    path = os.path.join(str(tmpdir), 'gce-scale-sets.json')
+
+    store = ScaleSetLocationStore(path)
+
+    assert store.get('project', 'scale-set-a') is None
+
+    store.set('project', 'scale-set-a',
+              ScaleSetLocation(regional=True, location='us-east1'))
+    store.set('project', 'scale-set-b',
+              ScaleSetLocation(regional=False, location='us-east1-b'))
+
+    # read by another process
+    store = ScaleSetLocationStore(path)
+
+    assert store.get('project', 'scale-set-a') == \
+        ScaleSetLocation(regional=True, location='us-east1')
+    assert store.get('project', 'scale-set-b') == \
+        ScaleSetLocation(regional=False, location='us-east1-b')
+    assert store.get('other', 'scale-set-a') is None
+
+    store.discard('project', 'scale-set-a')
+    store.discard('project', 'scale-set-missing')
+
+    assert store.get('project', 'scale-set-a') is None
+    assert store.get('project', 'scale-set-b') is not None
+
+
+def test_file_lock_excludes_other_threads(tmpdir):
+    path = str(tmpdir.join('test.lock'))
+
+    acquired = threading.Event()
+
+    def lock():
+        with file_lock(path):
+            acquired.set()
+
+    with file_lock(path):
+        thread = threading.Thread(target=lock)
+        thread.start()
+
+        assert not acquired.wait(0.2)
+
+    thread.join()
+
+    assert acquired.is_set()
@@ -0,0 +1,224 @@
+# Copyright 2008-2018 Univa Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+
+from tortuga.resourceAdapter.gceadapter import telemetry
+from tortuga.resourceAdapter.gceadapter.telemetry import (
+    BootTelemetryCollector, LatencyHistogram, build_histograms,
+    get_boot_latencies, get_guest_attribute, parse_boot_phases)
+
+
+class FakeRequest:
+    def __init__(self, response):
+        self.response = response
+
+    def execute(self):
+        return self.response
+
+
+class FakeInstances:
+    def __init__(self, vm, guest_attributes):
+        self.vm = vm
+        self.guest_attributes = guest_attributes
+        self.query_paths = []
+
+    def get(self, project, zone, instance):
+        return FakeRequest(self.vm)
+
+    def getGuestAttributes(self, project, zone, instance, queryPath):
+        self.query_paths.append(queryPath)
+
+        return FakeRequest(self.guest_attributes)
+
+
+class FakeSvc:
+    def __init__(self, vm, guest_attributes):
+        self._instances = FakeInstances(vm, guest_attributes)
+
+    def instances(self):
+        return self._instances
+
+
+def make_guest_attributes(phases):
+    return {
+        'queryValue': {
+            'items': [
+                {
+                    'namespace': 'tortuga',
+                    'key': 'bootstrap-mode',
+                    'value': 'prebaked',
+                },
+                {
+                    'namespace': 'tortuga',
+                    'key': 'boot-phases',
+                    'value': json.dumps(phases),
+                },
+            ]
+        }
+    }
+
+
+def test_get_guest_attribute():
+    response = make_guest_attributes({'started': 1.0})
+
+    assert get_guest_attribute(response, 'tortuga', 'boot-phases') == \
+        '{"started": 1.0}'
+
+    assert get_guest_attribute(response, 'tortuga', 'missing') is None
+
+    assert get_guest_attribute({}, 'tortuga', 'boot-phases') is None
+
+
+def test_parse_boot_phases():
+    assert parse_boot_phases(
+        '{"started": 100, "registered": 130.5, "unknown": 1,'
+        ' "puppet_done": "x"}'
+    ) == {'started': 100.0, 'registered': 130.5}
+
+    assert parse_boot_phases('not json') == {}
+    assert parse_boot_phases('[1, 2]') == {}
+
+
+def test_get_boot_latencies():
+    assert get_boot_latencies(
+        1000.0, {'started': 1020.25, 'puppet_done': 1300.0}
+    ) == {'started': 20.25, 'puppet_done': 300.0}
+
+    # guest clock slightly behind
+    assert get_boot_latencies(1000.0, {'started': 999.5}) == \
+        {'started': 0.0}
+
+
+def test_histogram():
+    histogram = LatencyHistogram()
+
+    assert histogram.percentile(50) is None
+
+    for value in (5, 15, 25, 25, 50, 70, 100, 200, 250, 5000):
+        histogram.add(value)
+
+    assert histogram.count == 10
+    assert histogram.max == 5000
+
+    assert histogram.percentile(50) == 60.0
+    assert histogram.percentile(90) == 300.0
+
+    # overflow bucket reports the maximum
+    assert histogram.percentile(100) == 5000
+
+
+def test_build_histograms():
+    histograms = build_histograms([
+        ('Default', {'started': 20.0, 'puppet_done': 200.0}),
+        ('Default', {'started': 30.0}),
+        ('gpu', {'started': 40.0}),
+    ])
+
+    assert sorted(histograms) == ['Default', 'gpu']
+    assert histograms['Default']['started'].count == 2
+    assert histograms['Default']['puppet_done'].count == 1
+    assert histograms['gpu']['started'].max == 40.0
+
+
+def test_get_phases():
+    svc = FakeSvc(
+        {'creationTimestamp': '2018-06-01T12:00:00.000-00:00'},
+        make_guest_attributes({'started': 1527854430.0}),
+    )
+
+    collector = BootTelemetryCollector(None, None)
+
+    created, phases, mode = collector.get_phases(
+        svc, 'project', 'us-east1-b', 'compute-01')
+
+    assert created == 1527854400.0
+    assert phases == {'started': 1527854430.0}
+    assert mode == 'prebaked'
+    assert svc.instances().query_paths == ['tortuga/']
+
+    assert get_boot_latencies(created, phases) == {'started': 30.0}
+
+
+class FakeItem:
+    def __init__(self, key, value):
+        self.key = key
+        self.value = value
+
+
+class FakeProfile:
+    def __init__(self, name):
+        self.name = name
+
+
+class FakeMapping:
+    def __init__(self, instance, metadata):
+        self.instance = instance
+        self.instance_metadata = [
+            FakeItem(key, value) for key, value in metadata.items()]
+        self.resource_adapter_configuration = FakeProfile('Default')
+
+
+class FakeSession:
+    def commit(self):
+        pass
+
+
+class FakeConnection:
+    svc = None
+
+
+class FakeAdapter:
+    def get_gce_session(self, profile):  # pylint: disable=unused-argument
+        return {'connection': FakeConnection()}
+
+
+class FailingCollector(BootTelemetryCollector):
+    def __init__(self, mappings):
+        super().__init__(FakeAdapter(), FakeSession())
+
+        self.mappings = mappings
+
+    def get_pending(self):
+        return self.mappings
+
+    def get_phases(self, svc, project, zone, instance):
+        raise Exception('VM [{}] not found'.format(instance))
+
+
+def test_collect_once_timeout_on_error(monkeypatch):
+    mapping = FakeMapping('compute-01', {
+        'project': 'project',
+        'zone': 'us-east1-b',
+        'gcp:scheduling': 'standard',
+    })
+
+    collector = FailingCollector([mapping])
+
+    def get_keys():
+        return [item.key for item in mapping.instance_metadata]
+
+    monkeypatch.setattr(telemetry.time, 'time', lambda: 1000.0)
+
+    assert collector.collect_once() == 0
+    assert telemetry.FIRST_ERROR_KEY in get_keys()
+    assert collector.stats['errors'] == 1
+
+    # VM still cannot be retrieved after the timeout
+    monkeypatch.setattr(
+        telemetry.time, 'time',
+        lambda: 1001.0 + telemetry.COLLECT_TIMEOUT)
+
+    assert collector.collect_once() == 1
+    assert telemetry.COLLECTED_KEY in get_keys()
@@ -0,0 +1,95 @@
+# Copyright 2008-2018 Univa Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+
+from tortuga_kits.gceadapter.events.workers import KeyedWorkerPool
+
+
+TIMEOUT = 10
+
+
+def test_keyed_ordering():
+    pool = KeyedWorkerPool(workers=4)
+    pool.start()
+
+    lock = threading.Lock()
+    order = []
+    done = threading.Event()
+
+    def task(key, idx):
+        with lock:
+            order.append((key, idx))
+
+            if len(order) == 100:
+                done.set()
+
+    for idx in range(50):
+        pool.submit('ss1', task, 'ss1', idx)
+        pool.submit('ss2', task, 'ss2', idx)
+
+    assert done.wait(TIMEOUT)
+
+    for key in ('ss1', 'ss2'):
+        assert [idx for task_key, idx in order if task_key == key] == \
+            list(range(50))
+
+
+def test_same_key_serialized_other_keys_parallel():
+    pool = KeyedWorkerPool(workers=2)
+    pool.start()
+
+    first_started = threading.Event()
+    release_first = threading.Event()
+    second_started = threading.Event()
+    other_done = threading.Event()
+
+    def first():
+        first_started.set()
+
+        assert release_first.wait(TIMEOUT)
+
+    pool.submit('ss1', first)
+    pool.submit('ss1', second_started.set)
+    pool.submit('ss2', other_done.set)
+
+    assert first_started.wait(TIMEOUT)
+
+    # runs while the first task of 'ss1' is blocked
+    assert other_done.wait(TIMEOUT)
+
+    assert pool.is_busy('ss1')
+
+    assert not second_started.is_set()
+
+    release_first.set()
+
+    assert second_started.wait(TIMEOUT)
+
+
+def test_failed_task_does_not_block_key():
+    pool = KeyedWorkerPool(workers=1)
+    pool.start()
+
+    done = threading.Event()
+
+    def fail():
+        raise RuntimeError('failed')
+
+    pool.submit('ss1', fail)
+    pool.submit('ss1', done.set)
+
+    assert done.wait(TIMEOUT)
+
+    assert pool.stats['failed'] == 1
@@ -0,0 +1,229 @@
+#############################################################################
+#
+# This code is the Property, a Trade Secret and the Confidential Information
+# of Univa Corporation.
+#
+# Copyright 2008-2018 Univa Corporation. All Rights Reserved. Access is Restricted.
+#
+# It is provided to you under the terms of the
+# Univa Term Software License Agreement.
+#
+# If you have any questions, please contact our Support Department.
+#
+# http://www.univa.com
+#
+#############################################################################
+import logging
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from tortuga.resources.types import ScaleSetResourceRequest
+
+logger = logging.getLogger(__name__)
+
+#: Seconds without a new update before a resize is released
+DEFAULT_WINDOW = 2.0
+
+#: Upper bound (seconds) on how long a continuously updated scale set can
+#: be held back
+DEFAULT_MAX_DELAY = 10.0
+
+ResizeSink = Callable[[ScaleSetResourceRequest, Optional[Callable]], None]
+
+
+class ResizeCoalescer:
+    """
+    Debounces scale set update events.
+
+    Updates for a scale set are held until no further update arrives for
+    'window' seconds (or 'max_delay' seconds have passed since the first
+    held update). Only the latest desired size is released to the sink;
+    superseded updates are counted in stats['resizes_saved']. The error
+    callback of the first held update is released with it, so a failed
+    resize is rolled back to the size before the coalesced updates.
+
+    Every update is stamped with a per-scale-set sequence number. Updates
+    are released in sequence order, and an update older than one already
+    released is dropped, so a stale size can never overwrite a newer one.
+
+    Forgetting a deleted scale set drops its held update, including one
+    already due but not yet passed to the sink.
+    """
+
+    def __init__(self, sink: ResizeSink, *,
+                 window: float = DEFAULT_WINDOW,
+                 max_delay: float = DEFAULT_MAX_DELAY):
+        self._sink = sink
+        self.window = window
+        self.max_delay = max_delay
+
+        self._cond = threading.Condition()
+        self._sequence: Dict[str, int] = {}
+        self._released: Dict[str, int] = {}
+        self._held: Dict[str, dict] = {}
+        self._releasing: Dict[str, dict] = {}
+        self._thread: Optional[threading.Thread] = None
+
+        self.stats = {
+            'updates_received': 0,
+            'resizes_released': 0,
+            'resizes_saved': 0,
+            'stale_dropped': 0,
+        }
+
+    def start(self) -> None:
+        with self._cond:
+            if self._thread is not None:
+                return
+
+            self._thread = threading.Thread(
+                target=self._run, name='gce-scale-set-coalescer',
+                daemon=True)
+
+        self._thread.start()
+
+    def next_sequence(self, ssr_id: str) -> int:
+        """Allocate sequence number for an update as it is received"""
+
+        with self._cond:
+            seq = self._sequence.get(ssr_id, 0) + 1
+            self._sequence[ssr_id] = seq
+
+            return seq
+
+    def submit(self, ssr: ScaleSetResourceRequest, *,
+               sequence: Optional[int] = None,
+               on_error: Optional[Callable] = None) -> None:
+        if sequence is None:
+            sequence = self.next_sequence(ssr.id)
+
+        now = time.monotonic()
+
+        with self._cond:
+            self.stats['updates_received'] += 1
+
+            if sequence <= self._released.get(ssr.id, 0):
+                self.stats['stale_dropped'] += 1
+
+                logger.debug(
+                    'Dropping stale update #%d for scale set [%s]',
+                    sequence, ssr.id
+                )
+
+                return
+
+            held = self._held.get(ssr.id)
+            if held is not None:
+                if sequence < held['sequence']:
+                    # a newer update is already held
+                    self.stats['stale_dropped'] += 1
+
+                    return
+
+                self.stats['resizes_saved'] += 1
+
+            self._held[ssr.id] = {
+                'ssr': ssr,
+                'sequence': sequence,
+                'on_error': held['on_error'] if held else on_error,
+                'first': held['first'] if held else now,
+                'last': now,
+            }
+
+            self._cond.notify_all()
+
+    def is_held(self, ssr_id: str) -> bool:
+        """Return True if an update for the scale set is held"""
+
+        with self._cond:
+            return ssr_id in self._held or ssr_id in self._releasing
+
+    def forget(self, ssr_id: str) -> None:
+        with self._cond:
+            self._held.pop(ssr_id, None)
+            self._releasing.pop(ssr_id, None)
+            self._sequence.pop(ssr_id, None)
+            self._released.pop(ssr_id, None)
+
+    def _due(self, held: dict, now: float) -> float:
+        return min(held['last'] + self.window, held['first'] + self.max_delay)
+
+    def _take_due(self, now: float) -> List[dict]:
+        # must be called with lock held
+        released = []
+
+        for ssr_id in [ssr_id for ssr_id, held in self._held.items()
+                       if self._due(held, now) <= now]:
+            held = self._held.pop(ssr_id)
+            self._released[ssr_id] = held['sequence']
+            self._releasing[ssr_id] = held
+            self.stats['resizes_released'] += 1
+            released.append(held)
+
+        return released
+
+    def _emit(self, released: List[dict]) -> None:
+        for held in released:
+            ssr_id = held['ssr'].id
+
+            # the sink is called with the lock held, so that a scale set
+            # forgotten in the meantime is not passed on
+            with self._cond:
+                if self._releasing.get(ssr_id) is not held:
+                    continue
+
+                del self._releasing[ssr_id]
+
+                try:
+                    self._sink(held['ssr'], held['on_error'])
+                except Exception:  # noqa pylint: disable=broad-except
+                    logger.exception(
+                        'Error releasing resize for scale set [%s]', ssr_id
+                    )
+
+    def release_due(self, now: Optional[float] = None) -> int:
+        """Release held updates that are due; return number released"""
+
+        with self._cond:
+            released = self._take_due(
+                time.monotonic() if now is None else now)
+
+        self._emit(released)
+
+        return len(released)
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while True:
+                    now = time.monotonic()
+
+                    released = self._take_due(now)
+                    if released:
+                        break
+
+                    timeout = min(
+                        [self._due(held, now) - now
+                         for held in self._held.values()] or [None])
+
+                    self._cond.wait(timeout)
+
+            self._emit(released)
+
+
+_coalescer: Optional[ResizeCoalescer] = None
+_coalescer_lock = threading.Lock()
+
+
+def get_coalescer(sink: ResizeSink) -> ResizeCoalescer:
+    """Return the (started) scale set update coalescer for this process"""
+
+    global _coalescer  # pylint: disable=global-statement
+
+    with _coalescer_lock:
+        if _coalescer is None:
+            _coalescer = ResizeCoalescer(sink)
+            _coalescer.start()
+
+    return _coalescer
@@ -13,8 +13,10 @@
 # http://www.univa.com
 #
 #############################################################################
+import copy
 import logging
-from typing import Optional
+import threading
+from typing import Callable, Optional
 
 from tortuga.events.listeners.base import BaseListener
 from tortuga.events.types import (ResourceRequestCreated,
@@ -31,23 +33,124 @@ from tortuga.resourceAdapter.resourceAdapterFactory import get_api
 from tortuga.resourceAdapter.resourceAdapter import ResourceAdapter
 
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm.session import Session
 from tortuga.web_service.database import dbm
 
+from ..coalescer import ResizeCoalescer, get_coalescer
+from ..pool import AdapterPool
+from ..workers import KeyedWorkerPool, get_workers
+from ..reconciler import ScaleSetReconciler, get_reconciler
+
 logger = logging.getLogger(__name__)
 
 
+def get_reconciler_adapter_factory(
+        adapter_name: str) -> Callable[[], ResourceAdapter]:
+    """
+    Return factory for resource adapters used by the scale set reconciler
+    thread. The reconciler gets its own database session; it must not
+    share the listener session across threads.
+    """
+    session = None
+
+    def factory() -> ResourceAdapter:
+        nonlocal session
+
+        if session is None:
+            Session = sessionmaker(bind=dbm.engine)
+            session = Session()
+        else:
+            # release the connection held since the previous pass so that
+            # profile changes are picked up
+            session.close()
+
+        adapter = get_api(adapter_name)
+        adapter.session = session
+        return adapter
+
+    return factory
+
+
 class GceScaleSetListenerMixin:
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self._store: ResourceRequestStore = ResourceRequestStoreManager.get()
-        Session = sessionmaker(bind=dbm.engine)
-        self.session = Session()
         self._adapter_name = 'GCP'
+        #
+        # The adapter (with its Compute Engine client and configuration
+        # cache) and database session are reused across events. Events
+        # are handled on worker threads; every thread has its own pool,
+        # as sessions must not be shared across threads.
+        #
+        self._adapter_pools = threading.local()
+
+    def _get_adapter_pool(self) -> AdapterPool:
+        pool = getattr(self._adapter_pools, 'pool', None)
+        if pool is None:
+            pool = self._adapter_pools.pool = AdapterPool(
+                lambda: get_api(self._adapter_name),
+                sessionmaker(bind=dbm.engine)
+            )
+
+        return pool
+
+    @property
+    def session(self) -> Session:
+        return self._get_adapter_pool().session
 
     def get_resource_adapter(self) -> ResourceAdapter:
-        adapter = get_api(self._adapter_name)
-        adapter.session = self.session
-        return adapter
+        return self._get_adapter_pool().get()
+
+    def get_workers(self) -> KeyedWorkerPool:
+        return get_workers()
+
+    def get_reconciler(self) -> ScaleSetReconciler:
+        return get_reconciler(
+            get_reconciler_adapter_factory(self._adapter_name),
+            ResourceRequestStoreManager.get,
+            is_busy=self.get_workers().is_busy,
+            on_drift=self._correct_drift)
+
+    def get_coalescer(self) -> ResizeCoalescer:
+        reconciler = self.get_reconciler()
+
+        def sink(ssr: ScaleSetResourceRequest, on_error):
+            reconciler.request_resize(ssr, on_error=on_error)
+
+        return get_coalescer(sink)
+
+    def _rollback(self, ssr: ScaleSetResourceRequest) -> None:
+        # a request deleted in the meantime must not be re-created
+        if self._store.get(ssr.id) is None:
+            logger.debug('Not rolling back deleted scale set request %s',
+                         ssr.id)
+
+            return
+
+        self._store.rollback(ssr)
+
+    def _correct_drift(self, ssr: ScaleSetResourceRequest,
+                       actual: int) -> None:
+        #
+        # Called by the reconciler when the managed instance group size
+        # differs from the request. The correction is debounced with any
+        # updates of the request; if it fails, the request is rolled back
+        # to the actual size.
+        #
+        coalescer = self.get_coalescer()
+
+        if coalescer.is_held(ssr.id):
+            # the held update resizes the scale set
+            return
+
+        old = copy.copy(ssr)
+        old.desired_nodes = actual
+
+        def on_error(ex: Exception):
+            logger.error("Error correcting scale set size: %s", ex)
+            self._rollback(old)
+
+        coalescer.submit(ssr, on_error=on_error)
 
     def is_valid_request(self, resource_request: BaseResourceRequest) -> bool:
         #
@@ -122,6 +225,12 @@ class GceScaleSetCreatedListener(GceScaleSetListenerMixin, BaseListener):
         # Validate scale set request
         self._validate_scale_set_request(ssr)
 
+        # Creating the scale set blocks until GCE has created the instance
+        # template; run it on a worker so the event bus is not held up.
+        # Events for the same scale set are handled in order.
+        self.get_workers().submit(ssr.id, self._create_scale_set, ssr)
+
+    def _create_scale_set(self, ssr: ScaleSetResourceRequest):
         # Load the resource adapter for this request
         try:
             adapter = self.get_resource_adapter()
@@ -146,6 +255,10 @@ class GceScaleSetCreatedListener(GceScaleSetListenerMixin, BaseListener):
             self._store.delete(ssr.id)
             raise
 
+        # Follow the managed instance group until it reaches the
+        # desired size
+        self.get_reconciler().track(ssr)
+
     def _validate_scale_set_request(self, ssr: ScaleSetResourceRequest):
         err_msg = None
         if ssr.instance_template_name:
@@ -177,29 +290,28 @@ class GceScaleSetUpdatedListener(GceScaleSetListenerMixin, BaseListener):
         ssr = self.get_scale_set_request(event)
         if ssr is None:
             return
+        #
+        # Stamp the event, so that updates are applied in the order they
+        # were received
+        #
+        coalescer = self.get_coalescer()
+        sequence = coalescer.next_sequence(ssr.id)
 
         logger.warning('Scale set update request for %s: %s',
                        self._adapter_name, ssr.id)
 
-        # Load the resource adapter for this request
-        try:
-            adapter = self.get_resource_adapter()
-        except Exception as ex:
-            logger.warning('Resource adapter is not installed: %s', ex)
-            return
+        old = self.get_previous_scale_set_request(event)
 
-        try:
-            # Now create the scale set
-            adapter.update_scale_set(
-                name=ssr.id,
-                resourceAdapterProfile=ssr.resourceadapter_profile_name,
-                desiredCount=ssr.desired_nodes,
-                adapter_args=ssr.adapter_arguments
-            )
-        except Exception as ex:
+        def on_error(ex: Exception):
             logger.error("Error updating resource request: %s", ex)
-            old = self.get_previous_scale_set_request(event)
-            self._store.rollback(old)
+            self._rollback(old)
+
+        # Rapid successive updates are coalesced into a single resize to
+        # the latest desired size; if it fails, the request is rolled back
+        # to its state before the first coalesced update. The reconciler
+        # sends the resize and follows it until the managed instance group
+        # converges.
+        coalescer.submit(ssr, sequence=sequence, on_error=on_error)
 
 
 class GceScaleSetDeletedListener(GceScaleSetListenerMixin, BaseListener):
@@ -217,6 +329,15 @@ class GceScaleSetDeletedListener(GceScaleSetListenerMixin, BaseListener):
         logger.warning('Scale set delete request for %s: %s',
                        self._adapter_name, ssr.id)
 
+        # Drop pending resizes right away, so that none is sent (or rolled
+        # back) after the delete
+        self.get_coalescer().forget(ssr.id)
+        self.get_reconciler().forget(ssr.id)
+
+        # Runs after any pending create of the same scale set
+        self.get_workers().submit(ssr.id, self._delete_scale_set, ssr)
+
+    def _delete_scale_set(self, ssr: ScaleSetResourceRequest):
         # Load the resource adapter for this request
         try:
             adapter = self.get_resource_adapter()
@@ -234,3 +355,4 @@ class GceScaleSetDeletedListener(GceScaleSetListenerMixin, BaseListener):
         except Exception as ex:
             logger.error("Error deleting resource request: %s", ex)
             self._store.rollback(ssr)
+            return
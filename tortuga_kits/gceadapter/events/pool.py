@@ -0,0 +1,166 @@
+#############################################################################
+#
+# This code is the Property, a Trade Secret and the Confidential Information
+# of Univa Corporation.
+#
+# Copyright 2008-2018 Univa Corporation. All Rights Reserved. Access is Restricted.
+#
+# It is provided to you under the terms of the
+# Univa Term Software License Agreement.
+#
+# If you have any questions, please contact our Support Department.
+#
+# http://www.univa.com
+#
+#############################################################################
+import logging
+import threading
+import time
+from typing import Callable, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm.session import Session
+
+from tortuga.resourceAdapter.resourceAdapter import ResourceAdapter
+
+logger = logging.getLogger(__name__)
+
+#: Number of events handled with one database session before it is
+#: replaced
+DEFAULT_MAX_USES = 1000
+
+#: Maximum age (seconds) of a database session
+DEFAULT_MAX_AGE = 900
+
+#: Sessions idle for longer than this (seconds) are checked before use
+DEFAULT_HEALTH_CHECK_INTERVAL = 30
+
+
+class AdapterPool:
+    """
+    Keeps a resource adapter and its database session for reuse across
+    events handled by one listener.
+
+    The transaction of the previous event is rolled back before the
+    session is reused. The session is replaced after 'max_uses' events or
+    'max_age' seconds, or when a health check of a session idle for
+    'health_check_interval' seconds fails (for example, after the database
+    connection was dropped). The adapter is replaced along with its
+    session.
+    """
+
+    def __init__(self, adapter_factory: Callable[[], ResourceAdapter],
+                 session_factory: Callable[[], Session], *,
+                 max_uses: int = DEFAULT_MAX_USES,
+                 max_age: float = DEFAULT_MAX_AGE,
+                 health_check_interval: float =
+                 DEFAULT_HEALTH_CHECK_INTERVAL):
+        self._adapter_factory = adapter_factory
+        self._session_factory = session_factory
+        self.max_uses = max_uses
+        self.max_age = max_age
+        self.health_check_interval = health_check_interval
+
+        self._lock = threading.Lock()
+        self._session: Optional[Session] = None
+        self._adapter: Optional[ResourceAdapter] = None
+        self._created = 0.0
+        self._last_used = 0.0
+        self._uses = 0
+
+        self.stats = {
+            'sessions_created': 0,
+            'adapters_created': 0,
+            'health_check_failures': 0,
+            'reuses': 0,
+        }
+
+    @property
+    def session(self) -> Session:
+        """Current pooled session; unlike get(), this does not end the
+        current transaction
+        """
+
+        with self._lock:
+            if self._session is None:
+                self._new_session(time.monotonic())
+
+            return self._session
+
+    def get(self) -> ResourceAdapter:
+        """Return pooled resource adapter bound to the pooled session"""
+
+        with self._lock:
+            now = time.monotonic()
+
+            session = self._get_session(now)
+
+            if self._adapter is None:
+                # adapter may raise if it is not installed; the session
+                # is kept
+                self._adapter = self._adapter_factory()
+                self._adapter.session = session
+
+                self.stats['adapters_created'] += 1
+            else:
+                self.stats['reuses'] += 1
+
+            self._uses += 1
+            self._last_used = now
+
+            return self._adapter
+
+    def recycle(self) -> None:
+        """Discard pooled session and adapter"""
+
+        with self._lock:
+            self._recycle()
+
+    def _get_session(self, now: float) -> Session:
+        # must be called with lock held
+        if self._session is not None and (
+                self._uses >= self.max_uses or
+                now - self._created >= self.max_age or
+                not self._is_healthy(
+                    now - self._last_used >= self.health_check_interval)):
+            self._recycle()
+
+        if self._session is None:
+            self._new_session(now)
+
+        return self._session
+
+    def _new_session(self, now: float) -> None:
+        self._session = self._session_factory()
+        self._created = now
+        self._last_used = now
+        self._uses = 0
+
+        self.stats['sessions_created'] += 1
+
+    def _is_healthy(self, check_connection: bool) -> bool:
+        try:
+            # end the transaction of the previous event; this also
+            # recovers the session after a failed event
+            self._session.rollback()
+
+            if check_connection:
+                self._session.execute(text('SELECT 1'))
+        except Exception as ex:  # noqa pylint: disable=broad-except
+            logger.warning('Discarding unusable database session: %s', ex)
+
+            self.stats['health_check_failures'] += 1
+
+            return False
+
+        return True
+
+    def _recycle(self) -> None:
+        if self._session is not None:
+            try:
+                self._session.close()
+            except Exception:  # noqa pylint: disable=broad-except
+                logger.exception('Error closing database session')
+
+        self._session = None
+        self._adapter = None
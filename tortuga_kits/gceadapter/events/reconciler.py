@@ -0,0 +1,412 @@
+#############################################################################
+#
+# This code is the Property, a Trade Secret and the Confidential Information
+# of Univa Corporation.
+#
+# Copyright 2008-2018 Univa Corporation. All Rights Reserved. Access is Restricted.
+#
+# It is provided to you under the terms of the
+# Univa Term Software License Agreement.
+#
+# If you have any questions, please contact our Support Department.
+#
+# http://www.univa.com
+#
+#############################################################################
+import logging
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+from tortuga.resourceAdapter.resourceAdapter import ResourceAdapter
+from tortuga.resources.store import ResourceRequestStore
+from tortuga.resources.types import ScaleSetResourceRequest
+
+logger = logging.getLogger(__name__)
+
+#: Seconds between full comparisons of scale set requests with the
+#: managed instance groups in GCE
+DEFAULT_RECONCILE_INTERVAL = 30
+
+#: Seconds before retrying resizes deferred because the scale set is busy
+DEFER_INTERVAL = 1
+
+#: Seconds resizes of a newly created scale set are deferred while its
+#: managed instance group does not exist yet
+CREATE_TIMEOUT = 600
+
+ErrorCallback = Callable[[Exception], None]
+
+StoreFactory = Callable[[], ResourceRequestStore]
+
+#: Called with a scale set request and the actual size of its managed
+#: instance group when they differ
+DriftCallback = Callable[[ScaleSetResourceRequest, int], None]
+
+
+def is_not_found(ex: Exception) -> bool:
+    """Return True if API error reports a missing resource"""
+
+    resp = getattr(ex, 'resp', None)
+
+    return resp is not None and resp.status == 404
+
+
+class ScaleSetReconciler:
+    """
+    Drives GCE managed instance groups towards the desired size of their
+    scale set resource requests.
+
+    Resize requests are queued and sent by a background thread. Requests
+    for the same scale set that arrive before the queue is flushed are
+    coalesced into a single resize to the latest desired size. Every
+    'interval' seconds all GCP scale set requests are compared with the
+    actual managed instance groups, and drift is corrected.
+
+    Drift is passed to 'on_drift' if set, so that corrections go through
+    the same path (and debouncing) as updates of the request; otherwise
+    the resize is queued directly.
+
+    Scale sets that were created or resized are tracked until GCE reports
+    the managed instance group as stable at the desired size; the elapsed
+    time is recorded as the convergence latency.
+
+    Resizes of scale sets for which 'is_busy' returns True (for example,
+    while the scale set is still being created) are deferred. Resizes of
+    newly created scale sets rejected because the managed instance group
+    insert has not completed yet are deferred as well.
+
+    Forgetting a deleted scale set drops its queued resize, and the
+    error callback of a resize in progress is not called.
+
+    The reconciler thread reads scale set requests through the store
+    returned by 'store_factory'.
+    """
+
+    def __init__(self, adapter_factory: Callable[[], ResourceAdapter],
+                 store_factory: StoreFactory, *,
+                 adapter_name: str = 'GCP',
+                 interval: int = DEFAULT_RECONCILE_INTERVAL,
+                 is_busy: Optional[Callable[[str], bool]] = None,
+                 on_drift: Optional[DriftCallback] = None):
+        self._adapter_factory = adapter_factory
+        self._store_factory = store_factory
+        self._adapter_name = adapter_name
+        self.interval = interval
+        self._is_busy = is_busy
+        self._on_drift = on_drift
+
+        self._cond = threading.Condition()
+        self._pending: Dict[str, dict] = {}
+        self._in_flight: Dict[str, dict] = {}
+        self._converging: Dict[str, dict] = {}
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = False
+
+        self.stats = {
+            'resizes_requested': 0,
+            'resizes_sent': 0,
+            'resizes_coalesced': 0,
+            'resize_errors': 0,
+            'drift_corrections': 0,
+            'converged': 0,
+            'last_convergence_latency': None,
+            'max_convergence_latency': None,
+            'total_convergence_latency': 0.0,
+        }
+
+    def start(self) -> None:
+        with self._cond:
+            if self._thread is not None:
+                return
+
+            self._stopped = False
+
+            self._thread = threading.Thread(
+                target=self._run, name='gce-scale-set-reconciler',
+                daemon=True)
+
+        self._thread.start()
+
+    def stop(self) -> None:
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def track(self, ssr: ScaleSetResourceRequest) -> None:
+        """Follow a newly created scale set until it converges"""
+
+        with self._cond:
+            self._converging[ssr.id] = {
+                'profile': ssr.resourceadapter_profile_name,
+                'desired': ssr.desired_nodes,
+                'since': time.monotonic(),
+                # managed instance group insert may still be in progress
+                'creating': True,
+            }
+
+            self._cond.notify_all()
+
+    def request_resize(self, ssr: ScaleSetResourceRequest, *,
+                       on_error: Optional[ErrorCallback] = None) -> None:
+        """Queue resize of scale set to ssr.desired_nodes
+
+        A resize already queued for the same scale set is replaced, so only
+        the latest desired size is sent. 'on_error' is called from the
+        reconciler thread if GCE rejects the resize.
+        """
+
+        with self._cond:
+            self.stats['resizes_requested'] += 1
+
+            previous = self._pending.get(ssr.id)
+            if previous is not None:
+                self.stats['resizes_coalesced'] += 1
+
+            self._pending[ssr.id] = {
+                'profile': ssr.resourceadapter_profile_name,
+                'desired': ssr.desired_nodes,
+                'adapter_args': ssr.adapter_arguments,
+                'on_error': on_error,
+                'since': previous['since'] if previous else time.monotonic(),
+            }
+
+            self._cond.notify_all()
+
+    def forget(self, ssr_id: str) -> None:
+        """Stop tracking deleted scale set"""
+
+        with self._cond:
+            self._pending.pop(ssr_id, None)
+            self._converging.pop(ssr_id, None)
+
+            request = self._in_flight.get(ssr_id)
+            if request is not None:
+                request['forgotten'] = True
+
+    def _run(self) -> None:
+        next_reconcile = time.monotonic()
+
+        while True:
+            with self._cond:
+                while not self._stopped and not self._pending and \
+                        time.monotonic() < next_reconcile:
+                    self._cond.wait(
+                        max(0, next_reconcile - time.monotonic()))
+
+                if self._stopped:
+                    return
+
+            try:
+                adapter = self._adapter_factory()
+
+                if self.flush(adapter):
+                    # avoid spinning on deferred resizes
+                    with self._cond:
+                        self._cond.wait(DEFER_INTERVAL)
+
+                if time.monotonic() >= next_reconcile:
+                    self.reconcile(adapter, self._store_factory())
+
+                    next_reconcile = time.monotonic() + self.interval
+            except Exception:  # noqa pylint: disable=broad-except
+                logger.exception('Error reconciling scale sets')
+
+                # avoid spinning on persistent failures
+                next_reconcile = time.monotonic() + self.interval
+
+                with self._cond:
+                    self._cond.wait(self.interval)
+
+    def flush(self, adapter: ResourceAdapter) -> int:
+        """Send all queued resizes; return number of deferred resizes"""
+
+        with self._cond:
+            pending, self._pending = self._pending, {}
+
+        deferred = 0
+
+        for ssr_id, request in pending.items():
+            if self._is_busy is not None and self._is_busy(ssr_id):
+                with self._cond:
+                    # keep a newer request queued in the meantime
+                    self._pending.setdefault(ssr_id, request)
+
+                deferred += 1
+
+                continue
+
+            with self._cond:
+                self._in_flight[ssr_id] = request
+
+            try:
+                adapter.update_scale_set(
+                    name=ssr_id,
+                    resourceAdapterProfile=request['profile'],
+                    desiredCount=request['desired'],
+                    adapter_args=request['adapter_args']
+                )
+            except Exception as ex:  # noqa pylint: disable=broad-except
+                with self._cond:
+                    self._in_flight.pop(ssr_id, None)
+
+                if request.get('forgotten', False):
+                    # scale set deleted in the meantime; nothing to roll
+                    # back
+                    logger.debug(
+                        'Ignoring failed resize of deleted scale set [%s]',
+                        ssr_id
+                    )
+
+                    continue
+
+                if is_not_found(ex) and self._is_creating(ssr_id):
+                    logger.debug(
+                        'Managed instance group for scale set [%s] not'
+                        ' created yet; deferring resize', ssr_id
+                    )
+
+                    with self._cond:
+                        self._pending.setdefault(ssr_id, request)
+
+                    deferred += 1
+
+                    continue
+
+                logger.error(
+                    'Error resizing scale set [%s] to %d: %s',
+                    ssr_id, request['desired'], ex
+                )
+
+                with self._cond:
+                    self.stats['resize_errors'] += 1
+
+                if request['on_error'] is not None:
+                    request['on_error'](ex)
+
+                continue
+
+            with self._cond:
+                self._in_flight.pop(ssr_id, None)
+
+                self.stats['resizes_sent'] += 1
+
+                if request.get('forgotten', False):
+                    continue
+
+                self._converging[ssr_id] = {
+                    'profile': request['profile'],
+                    'desired': request['desired'],
+                    'since': request['since'],
+                }
+
+        return deferred
+
+    def _is_creating(self, ssr_id: str) -> bool:
+        with self._cond:
+            converging = self._converging.get(ssr_id)
+
+            return converging is not None and \
+                converging.get('creating', False) and \
+                time.monotonic() - converging['since'] < CREATE_TIMEOUT
+
+    def reconcile(self, adapter: ResourceAdapter,
+                  store: ResourceRequestStore) -> None:
+        """Compare scale set requests with managed instance groups"""
+
+        for ssr in store.list():
+            if not isinstance(ssr, ScaleSetResourceRequest) or \
+                    ssr.resourceadapter_name != self._adapter_name:
+                continue
+
+            if self._is_busy is not None and self._is_busy(ssr.id):
+                # create or delete in progress
+                continue
+
+            igm = adapter.get_scale_set(
+                ssr.id, ssr.resourceadapter_profile_name)
+            if igm is None:
+                # managed instance group insert may still be in progress
+                logger.debug(
+                    'Managed instance group for scale set [%s] not found',
+                    ssr.id
+                )
+
+                continue
+
+            with self._cond:
+                converging = self._converging.get(ssr.id)
+                is_pending = ssr.id in self._pending
+
+                if converging is not None:
+                    converging['creating'] = False
+
+            if igm['targetSize'] != ssr.desired_nodes and not is_pending and \
+                    (converging is None or
+                     converging['desired'] != ssr.desired_nodes):
+                logger.info(
+                    'Scale set [%s] target size %d does not match desired'
+                    ' size %d', ssr.id, igm['targetSize'], ssr.desired_nodes
+                )
+
+                with self._cond:
+                    self.stats['drift_corrections'] += 1
+
+                if self._on_drift is not None:
+                    self._on_drift(ssr, igm['targetSize'])
+                else:
+                    self.request_resize(ssr)
+
+                continue
+
+            if converging is not None and \
+                    igm['targetSize'] == converging['desired'] and \
+                    igm.get('status', {}).get('isStable', False):
+                self._record_convergence(ssr.id, converging)
+
+    def _record_convergence(self, ssr_id: str, converging: dict) -> None:
+        latency = time.monotonic() - converging['since']
+
+        with self._cond:
+            if self._converging.get(ssr_id) is not converging:
+                return
+
+            del self._converging[ssr_id]
+
+            self.stats['converged'] += 1
+            self.stats['last_convergence_latency'] = latency
+            self.stats['total_convergence_latency'] += latency
+            self.stats['max_convergence_latency'] = max(
+                latency, self.stats['max_convergence_latency'] or 0)
+
+        logger.info(
+            'Scale set [%s] converged to %d node(s) in %.1fs',
+            ssr_id, converging['desired'], latency
+        )
+
+
+_reconciler: Optional[ScaleSetReconciler] = None
+_reconciler_lock = threading.Lock()
+
+
+def get_reconciler(adapter_factory: Callable[[], ResourceAdapter],
+                   store_factory: StoreFactory, *,
+                   is_busy: Optional[Callable[[str], bool]] = None,
+                   on_drift: Optional[DriftCallback] = None) \
+        -> ScaleSetReconciler:
+    """Return the (started) scale set reconciler for this process"""
+
+    global _reconciler  # pylint: disable=global-statement
+
+    with _reconciler_lock:
+        if _reconciler is None:
+            _reconciler = ScaleSetReconciler(
+                adapter_factory, store_factory, is_busy=is_busy,
+                on_drift=on_drift)
+            _reconciler.start()
+
+    return _reconciler
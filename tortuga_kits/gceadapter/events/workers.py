@@ -0,0 +1,180 @@
+#############################################################################
+#
+# This code is the Property, a Trade Secret and the Confidential Information
+# of Univa Corporation.
+#
+# Copyright 2008-2018 Univa Corporation. All Rights Reserved. Access is Restricted.
+#
+# It is provided to you under the terms of the
+# Univa Term Software License Agreement.
+#
+# If you have any questions, please contact our Support Department.
+#
+# http://www.univa.com
+#
+#############################################################################
+import collections
+import logging
+import queue
+import threading
+import time
+from typing import Callable, Deque, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+#: Number of scale sets handled in parallel
+DEFAULT_WORKERS = 4
+
+
+class _Task:
+    def __init__(self, key: str, func: Callable, args: tuple, kwargs: dict):
+        self.key = key
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.submitted = time.monotonic()
+
+
+class KeyedWorkerPool:
+    """
+    Runs tasks on a pool of worker threads.
+
+    Tasks with the same key (scale set id) run one at a time in the order
+    they were submitted; tasks with different keys run in parallel.
+
+    stats holds the number of tasks and the time tasks spent queued
+    ('queue_wait') and running ('handle_time').
+    """
+
+    def __init__(self, workers: int = DEFAULT_WORKERS):
+        self.workers = workers
+
+        self._lock = threading.Lock()
+        self._tasks: Dict[str, Deque[_Task]] = {}
+        self._ready: queue.Queue = queue.Queue()
+        self._threads: List[threading.Thread] = []
+
+        self.stats = {
+            'submitted': 0,
+            'completed': 0,
+            'failed': 0,
+            'queue_wait': self._new_timing(),
+            'handle_time': self._new_timing(),
+        }
+
+    @staticmethod
+    def _new_timing() -> dict:
+        return {'last': None, 'max': 0.0, 'total': 0.0}
+
+    def start(self) -> None:
+        with self._lock:
+            if self._threads:
+                return
+
+            for idx in range(self.workers):
+                thread = threading.Thread(
+                    target=self._run,
+                    name='gce-scale-set-worker-{}'.format(idx),
+                    daemon=True)
+
+                self._threads.append(thread)
+
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, key: str, func: Callable, *args, **kwargs) -> None:
+        task = _Task(key, func, args, kwargs)
+
+        with self._lock:
+            self.stats['submitted'] += 1
+
+            tasks = self._tasks.get(key)
+            if tasks is not None:
+                # a task for this key is queued or running; run after it
+                tasks.append(task)
+
+                return
+
+            self._tasks[key] = collections.deque([task])
+
+        self._ready.put(key)
+
+    def is_busy(self, key: str) -> bool:
+        """Return True if a task for key is queued or running"""
+
+        with self._lock:
+            return key in self._tasks
+
+    def pending(self) -> int:
+        with self._lock:
+            return sum(len(tasks) for tasks in self._tasks.values())
+
+    def _record(self, name: str, value: float) -> None:
+        # must be called with lock held
+        timing = self.stats[name]
+        timing['last'] = value
+        timing['max'] = max(timing['max'], value)
+        timing['total'] += value
+
+    def _run(self) -> None:
+        while True:
+            key = self._ready.get()
+
+            with self._lock:
+                task = self._tasks[key][0]
+
+                queue_wait = time.monotonic() - task.submitted
+
+                self._record('queue_wait', queue_wait)
+
+            started = time.monotonic()
+            failed = False
+
+            try:
+                task.func(*task.args, **task.kwargs)
+            except Exception:  # noqa pylint: disable=broad-except
+                failed = True
+
+                logger.exception('Error handling event for scale set [%s]',
+                                 key)
+
+            handle_time = time.monotonic() - started
+
+            logger.debug(
+                'Handled event for scale set [%s]: queued %.3fs,'
+                ' handled in %.3fs', key, queue_wait, handle_time
+            )
+
+            with self._lock:
+                self._record('handle_time', handle_time)
+
+                self.stats['failed' if failed else 'completed'] += 1
+
+                tasks = self._tasks[key]
+                tasks.popleft()
+
+                if not tasks:
+                    del self._tasks[key]
+
+                    key = None
+
+            if key is not None:
+                # next task for this scale set
+                self._ready.put(key)
+
+
+_workers: Optional[KeyedWorkerPool] = None
+_workers_lock = threading.Lock()
+
+
+def get_workers() -> KeyedWorkerPool:
+    """Return the (started) scale set worker pool for this process"""
+
+    global _workers  # pylint: disable=global-statement
+
+    with _workers_lock:
+        if _workers is None:
+            _workers = KeyedWorkerPool()
+            _workers.start()
+
+    return _workers
@@ -1,4 +1,4 @@
-#!/usr/bin/env python
+#!/usr/bin/env python3
 
 # Copyright 2008-2018 Univa Corporation
 #
@@ -15,96 +15,366 @@
 # limitations under the License.
 
 import base64
+import http.client
 import json
 import os
-import platform
 import shutil
+import ssl
 import subprocess
 import sys
+import threading
 import time
-import urllib2
+import traceback
+import urllib.error
+import urllib.request
 import itertools
 import random
+import re
 
 
 ### SETTINGS
 
-def get_instance_data(path):
-    url = 'http://169.254.169.254/computeMetadata/v1/instance' + path
+CA_PATH = '/etc/pki/ca-trust/source/anchors/tortuga-ca.pem'
+
+# Packages required to bootstrap Puppet; preinstalled in prebaked images
+PACKAGES = ('git', 'puppet-agent')
+
+METADATA_URL = 'http://169.254.169.254/computeMetadata/v1/instance/'
+
+# Retries of webservice requests wait between BACKOFF_BASE and BACKOFF_CAP
+# seconds (decorrelated jitter), so that VMs booted together do not retry
+# in lockstep
+BACKOFF_BASE = 1.0
+BACKOFF_CAP = 60.0
+
+# Registration is retried for up to this many seconds
+REGISTRATION_TIMEOUT = 1800
 
-    req = urllib2.Request(url)
+# Instance metadata tree; fetched once
+instance_metadata = None
+metadata_lock = threading.Lock()
+
+def _metadata_request(url, retries=5):
+    req = urllib.request.Request(url)
     req.add_header('Metadata-Flavor', 'Google')
 
-    for nCount in range(5):
+    for nCount in range(retries):
         try:
-            response = urllib2.urlopen(req)
-            break
-        except urllib2.URLError as ex:
-            pass
-        except urllib2.HTTPError as ex:
+            with urllib.request.urlopen(req, timeout=10) as response:
+                return response.read()
+        except urllib.error.HTTPError as ex:
             if ex.code == 404:
                 raise
+        except urllib.error.URLError as ex:
+            pass
 
-            time.sleep(2 ** (nCount + 1))
-    else:
-        raise Exception('Unable to communicate with metadata webservice')
+        # the metadata server is local; transient errors clear quickly
+        time.sleep(0.1 * 2 ** nCount + random.uniform(0, 0.1))
+
+    raise Exception('Unable to communicate with metadata webservice')
+
+def get_instance_metadata():
+    global instance_metadata
+
+    with metadata_lock:
+        if instance_metadata is None:
+            instance_metadata = json.loads(
+                _metadata_request(METADATA_URL + '?recursive=true&alt=json'))
+
+        return instance_metadata
+
+def get_instance_data(path):
+    """Return value of instance metadata path (i.e. '/hostname') from the
+    cached metadata tree"""
+
+    value = get_instance_metadata()
+
+    parts = [part for part in path.split('/') if part]
+
+    for idx, part in enumerate(parts):
+        if isinstance(value, list) and part.isdigit() and \
+                int(part) < len(value):
+            value = value[int(part)]
+
+            continue
+
+        # recursive listings use camel case names, except for attributes
+        if idx == 0 or parts[idx - 1] != 'attributes':
+            part = re.sub(r'-([a-z])', lambda m: m.group(1).upper(), part)
+
+        if not isinstance(value, dict) or part not in value:
+            raise Exception('Unable to read %s' % path)
+
+        value = value[part]
+
+    return value
+
+# Bootstrap step timings (in seconds), reported to the installer through
+# the 'tortuga/bootstrap-timings' guest attribute
+timings = {}
+timings_lock = threading.Lock()
+
+# Boot phase timestamps (epoch time), reported to the installer through the
+# 'tortuga/boot-phases' guest attribute as each phase completes
+phases = {}
+
+def timed(name, func, *args):
+    start = time.time()
+
+    try:
+        return func(*args)
+    finally:
+        with timings_lock:
+            timings[name] = round(time.time() - start, 3)
+
+def set_guest_attribute(key, value):
+    url = 'http://169.254.169.254/computeMetadata/v1/instance/' \
+        'guest-attributes/tortuga/' + key
+
+    req = urllib.request.Request(url, data=value.encode(), method='PUT')
+    req.add_header('Metadata-Flavor', 'Google')
+
+    try:
+        urllib.request.urlopen(req, timeout=10).close()
+    except urllib.error.URLError as ex:
+        # guest attributes not enabled for this instance
+        print('Unable to set guest attribute [%s]: %s' % (key, ex))
+
+def report_timings():
+    print('Bootstrap timings: ' + json.dumps(timings, sort_keys=True))
+
+    set_guest_attribute('bootstrap-timings', json.dumps(timings))
+
+def mark(phase):
+    with timings_lock:
+        phases[phase] = round(time.time(), 3)
+
+        value = json.dumps(phases, sort_keys=True)
 
-    if response.code != 200:
-        raise Exception('Unable to read %s' % path)
-    return response.read()
+    print('Boot phase [%s] completed' % (phase))
 
-def addNode():
+    set_guest_attribute('boot-phases', value)
+
+class Step(threading.Thread):
+    """Bootstrap step running in parallel to other steps"""
+
+    def __init__(self, name, func, *args):
+        threading.Thread.__init__(self, name=name)
+
+        self.func = func
+        self.args = args
+        self.error = None
+
+    def run(self):
+        try:
+            timed(self.name, self.func, *self.args)
+        except BaseException:
+            self.error = sys.exc_info()
+
+def install_ca():
+    # the CA of prebaked images may be stale (installer CA regenerated
+    # since the image was baked); always fetch it and only rebuild the
+    # trust store when it has changed
     tryCommand("mkdir -p /etc/pki/ca-trust/source/anchors/")
-    tryCommand("curl http://%s:8008/ca.pem > /etc/pki/ca-trust/source/anchors/tortuga-ca.pem" % installerIpAddress)
+
+    tmpname = CA_PATH + '.new'
+
+    retval = tryCommand("curl -sf -o %s http://%s:8008/ca.pem" % (
+        tmpname, installerIpAddress), retry_limit=5)
+    if retval != 0:
+        raise Exception('Unable to download Tortuga CA')
+
+    with open(tmpname, 'rb') as fp:
+        ca = fp.read()
+
+    current = None
+    if os.path.exists(CA_PATH):
+        with open(CA_PATH, 'rb') as fp:
+            current = fp.read()
+
+    if ca == current:
+        os.unlink(tmpname)
+
+        return
+
+    os.rename(tmpname, CA_PATH)
+
     tryCommand("update-ca-trust")
-    instance_id = get_instance_data('/name')
-    local_hostname = get_instance_data('/hostname')
+
+class InstallerClient(object):
+    """HTTPS client for the Tortuga webservice; the connection is kept
+    open and reused across requests"""
+
+    def __init__(self, host, port, timeout=30,
+                 connection_class=http.client.HTTPSConnection):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.connection_class = connection_class
+
+        self._conn = None
+
+    def _connect(self):
+        if self.connection_class is http.client.HTTPSConnection:
+            # created on first use; the Tortuga CA is installed by then
+            return self.connection_class(
+                self.host, self.port, timeout=self.timeout,
+                context=ssl.create_default_context())
+
+        return self.connection_class(
+            self.host, self.port, timeout=self.timeout)
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+
+            self._conn = None
+
+    def request(self, method, path, body=None, headers=None):
+        """Return (status, headers, body) of response"""
+
+        if self._conn is None:
+            self._conn = self._connect()
+
+        try:
+            self._conn.request(method, path, body, headers or {})
+
+            response = self._conn.getresponse()
+
+            data = response.read()
+        except (http.client.HTTPException, OSError):
+            self.close()
+
+            raise
+
+        if response.will_close:
+            self.close()
+
+        return response.status, response.headers, data
+
+def get_backoff(previous):
+    """Return next retry delay (decorrelated jitter)"""
+
+    return min(BACKOFF_CAP, random.uniform(BACKOFF_BASE, previous * 3))
+
+def get_retry_after(status, headers, body):
+    """Return retry delay (in seconds) requested by webservice, or None
+    """
+
+    value = headers.get('Retry-After') if headers else None
+    if value and value.isdigit():
+        return int(value)
+
+    # throttled registrations carry the delay in the error response
+    try:
+        error = json.loads(body.decode('utf-8', 'replace')).get('error')
+    except (ValueError, AttributeError):
+        return None
+
+    value = error.get('retry_after') if isinstance(error, dict) else None
+    if isinstance(value, int) and not isinstance(value, bool) and \
+            value >= 0:
+        return value
+
+    return None
+
+def request_with_retry(client, method, path, body=None, headers=None,
+                       timeout=REGISTRATION_TIMEOUT):
+    """
+    Send request, retrying connection errors, 429/5xx responses and
+    other error responses carrying a retry delay (for example, throttled
+    registrations reported as 400) until timeout. Delays requested by the
+    webservice are honored, with jitter added so throttled VMs do not
+    return at the same time.
+
+    Returns (status, headers, body) of first response not retried.
+    """
+
+    deadline = time.time() + timeout
+    delay = BACKOFF_BASE
+
+    while True:
+        try:
+            status, response_headers, data = client.request(
+                method, path, body, headers)
+
+            if 200 <= status < 300:
+                return status, response_headers, data
+
+            retry_after = get_retry_after(status, response_headers, data)
+
+            if retry_after is None and status != 429 and status < 500:
+                return status, response_headers, data
+
+            reason = 'HTTP status %d' % (status)
+        except (http.client.HTTPException, OSError) as ex:
+            retry_after = None
+
+            reason = str(ex)
+
+        delay = get_backoff(delay)
+
+        if retry_after is not None:
+            delay = retry_after + random.uniform(0, min(delay, retry_after))
+
+        if time.time() + delay >= deadline:
+            raise Exception(
+                'Unable to communicate with Tortuga webservice: %s' % (
+                    reason))
+
+        print('Request failed (%s); retrying in %.1f seconds' % (
+            reason, delay))
+
+        time.sleep(delay)
+
+def addNode(instance_id, local_hostname):
     data = {
             'node_details': {
                 'name': local_hostname,
                 'metadata': {
                     'instance_name': instance_id,
+                    # VMs of regional scale sets run in any zone
+                    'zone': os.path.basename(get_instance_data('/zone')),
                 }
             }
            }
     # Add nodes workflow must print insertnode_request as JSON with specified
     # prefix so other tools can read this information
     print('Instance details: ' + json.dumps(data))
-    url = 'https://%s:%s/v1/node-token/%s' % (installerHostName, port, insertnode_request)
-    req = urllib2.Request(url)
 
-    req.add_header('Content-Type', 'application/json')
+    token = insertnode_request.decode() \
+        if isinstance(insertnode_request, bytes) else insertnode_request
 
-    for nCount in range(5):
-        try:
-            response = urllib2.urlopen(req, json.dumps(data))
-            break
-        except urllib2.URLError as ex:
-            pass
-        except urllib2.HTTPError as ex:
-            if ex.code == 401:
-                raise Exception(
-                    'Invalid Tortuga webservice credentials')
-            elif ex.code == 404:
-                # Unrecoverable
-                raise Exception(
-                    'URI not found; invalid Tortuga webservice'
-                    ' configuration')
-
-            time.sleep(2 ** (nCount + 1))
-    else:
-        raise Exception('Unable to communicate with Tortuga webservice')
+    client = InstallerClient(installerHostName, port)
+
+    try:
+        status, _, body = request_with_retry(
+            client, 'POST', '/v1/node-token/%s' % (token),
+            json.dumps(data), {'Content-Type': 'application/json'})
+    finally:
+        client.close()
 
-    d = json.load(response)
+    if status == 401:
+        raise Exception('Invalid Tortuga webservice credentials')
+    elif status == 404:
+        # Unrecoverable
+        raise Exception(
+            'URI not found; invalid Tortuga webservice configuration')
 
-    if response.code != 200:
+    try:
+        d = json.loads(body.decode())
+    except ValueError:
+        d = {}
+
+    if status != 200:
         if 'error' in d:
             errmsg = 'Tortuga webservice error: msg=[%s]' % (
-                error['message'])
+                d['error']['message'])
         else:
             errmsg = 'Tortuga webservice internal error'
 
         raise Exception(errmsg)
+
     print(d)
 
 def tryCommand(command, good_return_values=(0,), retry_limit=0,
@@ -120,7 +390,7 @@ def tryCommand(command, good_return_values=(0,), retry_limit=0,
             return returned
 
         seed = min(max_sleep_time, sleep_interval * 2 ** retries)
-        sleep_for = (seed / 2 + random.randint(0, seed / 2)) / 1000.0
+        sleep_for = (seed // 2 + random.randint(0, seed // 2)) / 1000.0
         total_sleep_time += sleep_for
 
         time.sleep(sleep_for)
@@ -142,7 +412,7 @@ def _isPackageInstalled(pkgName):
     return tryCommand('rpm -q --quiet %s' % pkgName) == 0
 
 
-def install_puppet(vers):
+def install_puppet_repo(vers):
     pkgname = 'puppet5-release'
 
     url = 'http://yum.puppetlabs.com/puppet5/%s-el-%s.noarch.rpm' % (pkgname, vers)
@@ -157,9 +427,45 @@ def install_puppet(vers):
 
             sys.exit(1)
 
-    # Attempt to install puppet
-    if not _isPackageInstalled('puppet-agent'):
-        _installPackage('puppet-agent')
+def install_packages(vers):
+    timed('install_puppet_repo', install_puppet_repo, vers)
+
+    # install all missing packages in one transaction
+    pkgs = [pkg for pkg in PACKAGES if not _isPackageInstalled(pkg)]
+
+    if pkgs:
+        timed('yum_install', _installPackage, ' '.join(pkgs))
+
+    mark('puppet_installed')
+
+def is_prebaked():
+    """Return True if image already contains the Tortuga CA and all
+    packages required to bootstrap Puppet"""
+
+    return os.path.exists(CA_PATH) and \
+        all(_isPackageInstalled(pkg) for pkg in PACKAGES)
+
+def bake(vers):
+    # Prepare VM for use as prebaked image (see 'gce-bake-image'); the
+    # image is created from the boot disk after the VM is stopped. The
+    # outcome is reported in the 'bake-status' guest attribute so that
+    # failures are not mistaken for completion.
+    try:
+        timed('install_ca', install_ca)
+
+        install_packages(vers)
+
+        tryCommand('yum clean all')
+    except BaseException as ex:
+        traceback.print_exc()
+
+        set_guest_attribute('bake-status', 'failed: %s' % (ex,))
+    else:
+        set_guest_attribute('bake-status', 'done')
+
+    report_timings()
+
+    tryCommand('poweroff')
 
 def update_resolv_conf():
     found_nameserver = False
@@ -187,8 +493,10 @@ def update_resolv_conf():
 
                     fpOut.write(inbuf)
 
-    shutil.move(fn, fn + '.orig')
-    shutil.copyfile(fn + '.tortuga', fn)
+    # replace atomically; package installs may be resolving names
+    shutil.copyfile(fn, fn + '.orig')
+    shutil.copyfile(fn + '.tortuga', fn + '.new')
+    os.rename(fn + '.new', fn)
 
 def bootstrap_puppet():
     tryCommand("touch /tmp/puppet_bootstrap.log")
@@ -202,24 +510,92 @@ def bootstrap_puppet():
 def register_compute():
     tryCommand('echo "%s" >> /.tortuga_execd' %(installerHostName))
 
-def main():
-    if insertnode_request is not None:
-        addNode()
+def register_node(instance_id, local_hostname):
+    timed('install_ca', install_ca)
+
+    mark('ca_trusted')
 
-    register_compute()
-    vals = platform.dist()
+    if insertnode_request is not None:
+        timed('add_node', addNode, instance_id, local_hostname)
 
-    distro_maj_vers = vals[1].split('.')[0]
+    timed('register_compute', register_compute)
 
     if override_dns_domain:
-        update_resolv_conf()
+        timed('update_resolv_conf', update_resolv_conf)
+
+    mark('registered')
+
+def get_distro_major_version():
+    with open('/etc/os-release') as fp:
+        for line in fp:
+            if line.startswith('VERSION_ID='):
+                return line.split('=', 1)[1].strip().strip('"').split('.')[0]
+
+    raise Exception('Unable to determine OS version')
+
+def main():
+    start = time.time()
+
+    distro_maj_vers = get_distro_major_version()
+
+    if bake_image:
+        bake(distro_maj_vers)
+
+        return
+
+    mark('started')
+
+    prebaked = is_prebaked()
+
+    mode = 'prebaked' if prebaked else 'standard'
+
+    print('Bootstrap mode: %s' % (mode))
+
+    set_guest_attribute('bootstrap-mode', mode)
+
+    instance_id = get_instance_data('/name')
+    local_hostname = get_instance_data('/hostname')
+
+    mark('metadata_fetched')
+
+    if prebaked:
+        # packages are part of the image; the CA is refreshed on
+        # registration
+        mark('puppet_installed')
+
+        steps = [
+            Step('register', register_node, instance_id, local_hostname),
+        ]
+    else:
+        # Node registration and package installation are independent;
+        # run them in parallel. Puppet needs both.
+        steps = [
+            Step('register', register_node, instance_id, local_hostname),
+            Step('packages', install_packages, distro_maj_vers),
+        ]
+
+    for step in steps:
+        step.start()
+
+    for step in steps:
+        step.join()
+
+    for step in steps:
+        if step.error is not None:
+            traceback.print_exception(*step.error)
+
+            timings['total'] = round(time.time() - start, 3)
+            report_timings()
+
+            raise step.error[1].with_traceback(step.error[2])
+
+    timed('bootstrap_puppet', bootstrap_puppet)
 
-    if not _isPackageInstalled('git'):
-        _installPackage('git')
+    mark('puppet_done')
 
-    install_puppet(distro_maj_vers)
+    timings['total'] = round(time.time() - start, 3)
 
-    bootstrap_puppet()
+    report_timings()
 
 
 if __name__ == '__main__':